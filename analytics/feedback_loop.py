@@ -1,5 +1,7 @@
+from typing import Iterable, Optional
+
 import pandas as pd
-from metrics import EngagementMetrics
+from metrics import EngagementMetrics, MetricsAccumulator
 
 
 class FeedbackEngine:
@@ -12,6 +14,15 @@ class FeedbackEngine:
         self.metrics = EngagementMetrics(dataframe)
         self.results = self.metrics.metrics_by_message_type()
 
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame], max_workers: Optional[int] = None):
+        """
+        Build the engine from a stream of engagement-history chunks
+        (e.g. pd.read_sql(query, con, chunksize=100_000)) with constant memory.
+        """
+        accumulator = MetricsAccumulator.from_chunks(chunks, ("message_type",), max_workers=max_workers)
+        return cls(accumulator.to_frame())
+
     def adjust_strategy(self):
 
         if "flirty" not in self.results or "utility" not in self.results:
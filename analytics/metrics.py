@@ -1,5 +1,15 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
 import pandas as pd
 
+COUNT_COLUMNS = ["sent", "opened", "clicked", "reactivated"]
+
+# Engagement score weights: open rate, CTR, reactivation rate
+SCORE_WEIGHTS = (0.4, 0.3, 0.3)
+
 
 class EngagementMetrics:
     """
@@ -9,11 +19,44 @@ class EngagementMetrics:
     - Click Through Rate (CTR)
     - Reactivation Rate
     - Engagement Score
+
+    Rows may be individual messages (0/1 flags) or pre-aggregated
+    counts such as the engagement_rollups table; all metrics are sums.
+
+    With categorical=True, string columns (message_type, segment, tone,
+    channel, ...) are stored as pandas categoricals, which cuts memory on
+    large frames and speeds up grouping.
     """
 
-    def __init__(self, dataframe: pd.DataFrame):
+    def __init__(self, dataframe: pd.DataFrame, categorical: bool = False):
+        if categorical:
+            text_columns = dataframe.select_dtypes(include=["object", "string"]).columns
+            dataframe = dataframe.astype({column: "category" for column in text_columns})
         self.df = dataframe
 
+    @classmethod
+    def from_rollup(cls, connection, days: int = None):
+        """
+        Load metrics from the daily engagement_rollups table.
+
+        Args:
+            connection: SQLAlchemy engine or connection
+            days: Only include the last N calendar days (all history if None)
+        """
+        from sqlalchemy import text
+
+        query = (
+            "SELECT day, message_type, tone, segment, sent, opened, clicked, reactivated "
+            "FROM engagement_rollups"
+        )
+        params = None
+        if days is not None:
+            query += " WHERE day >= :start_day"
+            start_day = datetime.utcnow().date() - timedelta(days=days - 1)
+            params = {"start_day": start_day}
+
+        return cls(pd.read_sql(text(query), connection, params=params))
+
     # -----------------------------
     # Overall Metrics
     # -----------------------------
@@ -34,47 +77,153 @@ class EngagementMetrics:
         return total_reactivated / total_sent if total_sent else 0
 
     def overall_summary(self):
+        totals = self.df[COUNT_COLUMNS].sum()
+        sent, opened, clicked, reactivated = (totals[c] for c in COUNT_COLUMNS)
         return {
-            "open_rate": round(self.open_rate(), 3),
-            "ctr": round(self.click_through_rate(), 3),
-            "reactivation_rate": round(self.reactivation_rate(), 3)
+            "open_rate": round(opened / sent if sent else 0, 3),
+            "ctr": round(clicked / opened if opened else 0, 3),
+            "reactivation_rate": round(reactivated / sent if sent else 0, 3)
         }
 
     # -----------------------------
-    # Metrics By Message Type
+    # Grouped Metrics
     # -----------------------------
 
-    def metrics_by_message_type(self):
-        results = {}
+    def metrics_by(self, *group_keys: str) -> pd.DataFrame:
+        """
+        Compute all rates and the engagement score for every group at once.
+
+        A single groupby-sum over the count columns, followed by vectorized
+        rate arithmetic on the (small) aggregated frame.
+
+        Args:
+            group_keys: Column names to group by (e.g. "message_type", "segment", "day")
+
+        Returns:
+            DataFrame indexed by the group keys with open_rate, ctr,
+            reactivation_rate and engagement_score columns
+        """
+        totals = self.df.groupby(list(group_keys), observed=True, sort=False)[COUNT_COLUMNS].sum()
+
+        sent = totals["sent"].to_numpy(dtype=float)
+        opened = totals["opened"].to_numpy(dtype=float)
+        clicked = totals["clicked"].to_numpy(dtype=float)
+        reactivated = totals["reactivated"].to_numpy(dtype=float)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            open_rate = np.where(sent > 0, opened / sent, 0.0)
+            ctr = np.where(opened > 0, clicked / opened, 0.0)
+            reactivation = np.where(sent > 0, reactivated / sent, 0.0)
+
+        open_weight, ctr_weight, reactivation_weight = SCORE_WEIGHTS
+        engagement_score = (
+            open_weight * open_rate +
+            ctr_weight * ctr +
+            reactivation_weight * reactivation
+        )
+
+        return pd.DataFrame({
+            "open_rate": open_rate,
+            "ctr": ctr,
+            "reactivation_rate": reactivation,
+            "engagement_score": engagement_score
+        }, index=totals.index).round(3)
 
-        message_types = self.df["message_type"].unique()
+    # -----------------------------
+    # Metrics By Message Type
+    # -----------------------------
 
-        for msg_type in message_types:
-            subset = self.df[self.df["message_type"] == msg_type]
+    def metrics_by_message_type(self, *extra_keys: str):
+        """
+        Metrics per message type, optionally split further by extra keys
+        (segment, tone, channel, day...). With extra keys the result is
+        keyed by tuples, e.g. ("flirty", "dormant").
+        """
+        return self.metrics_by("message_type", *extra_keys).to_dict(orient="index")
 
-            total_sent = subset["sent"].sum()
-            total_opened = subset["opened"].sum()
-            total_clicked = subset["clicked"].sum()
-            total_reactivated = subset["reactivated"].sum()
 
-            open_rate = total_opened / total_sent if total_sent else 0
-            ctr = total_clicked / total_opened if total_opened else 0
-            reactivation = total_reactivated / total_sent if total_sent else 0
+def partial_totals(chunk: pd.DataFrame, group_keys: Sequence[str]) -> pd.DataFrame:
+    """Sum the count columns of one chunk per group (picklable for process pools)."""
+    return chunk.groupby(list(group_keys), observed=True, sort=False)[COUNT_COLUMNS].sum()
 
-            engagement_score = (
-                0.4 * open_rate +
-                0.3 * ctr +
-                0.3 * reactivation
-            )
 
-            results[msg_type] = {
-                "open_rate": round(open_rate, 3),
-                "ctr": round(ctr, 3),
-                "reactivation_rate": round(reactivation, 3),
-                "engagement_score": round(engagement_score, 3)
-            }
+class MetricsAccumulator:
+    """
+    Streaming metrics accumulator for engagement histories that do not fit in memory.
+
+    Each chunk (e.g. from pd.read_sql(..., chunksize=N), pd.read_csv(..., chunksize=N)
+    or Parquet row groups) is reduced to per-group count totals, and the totals
+    are merged. Memory is bounded by the number of groups, not rows, and since
+    every metric is a ratio of sums the result is exactly the in-memory result.
+    """
 
-        return results
+    def __init__(self, group_keys: Sequence[str] = ("message_type",)):
+        self.group_keys = list(group_keys)
+        self.totals: Optional[pd.DataFrame] = None
+        self.rows = 0
+
+    def add_totals(self, totals: pd.DataFrame):
+        """Merge already-reduced per-group totals (as returned by partial_totals)."""
+        if self.totals is None:
+            self.totals = totals
+        else:
+            self.totals = self.totals.add(totals, fill_value=0).astype(self.totals.dtypes.to_dict())
+        return self
+
+    def add_chunk(self, chunk: pd.DataFrame):
+        """Reduce one chunk of raw rows and merge it."""
+        self.rows += len(chunk)
+        return self.add_totals(partial_totals(chunk, self.group_keys))
+
+    def merge(self, other: "MetricsAccumulator"):
+        """Merge another accumulator over the same group keys."""
+        self.rows += other.rows
+        if other.totals is not None:
+            self.add_totals(other.totals)
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """Accumulated totals as a flat frame, usable as EngagementMetrics input."""
+        if self.totals is None:
+            return pd.DataFrame(columns=self.group_keys + COUNT_COLUMNS)
+        return self.totals.reset_index()
+
+    def metrics(self) -> EngagementMetrics:
+        return EngagementMetrics(self.to_frame())
+
+    @classmethod
+    def from_chunks(
+        cls,
+        chunks: Iterable[pd.DataFrame],
+        group_keys: Sequence[str] = ("message_type",),
+        max_workers: Optional[int] = None
+    ) -> "MetricsAccumulator":
+        """
+        Consume an iterable of chunks, optionally reducing them in a process pool.
+
+        With max_workers set, at most 2 * max_workers chunks are in flight at
+        once, so memory stays bounded even for very long chunk streams.
+        """
+        accumulator = cls(group_keys)
+
+        if not max_workers:
+            for chunk in chunks:
+                accumulator.add_chunk(chunk)
+            return accumulator
+
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pending = set()
+            for chunk in chunks:
+                accumulator.rows += len(chunk)
+                pending.add(pool.submit(partial_totals, chunk, accumulator.group_keys))
+                if len(pending) >= 2 * max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        accumulator.add_totals(future.result())
+            for future in pending:
+                accumulator.add_totals(future.result())
+
+        return accumulator
 
 
 # ---------------------------------------------
@@ -0,0 +1,243 @@
+"""
+Activity Heartbeats
+
+Active users ping their activity many times a minute. Writing each ping
+(load User, update last_active_at, commit) is wasted work, so heartbeats
+are absorbed by an in-memory last-seen map and flushed periodically as a
+single bulk UPDATE.
+
+Only real state transitions go through the synchronous /activity path:
+a heartbeat whose gap since the last seen time crosses the welcome-back
+threshold (dormant -> active) needs a welcome message written now.
+
+Note: users.last_active_at may lag by up to ACTIVITY_FLUSH_INTERVAL_MS;
+that is well under the engagement inactivity threshold.
+
+The tracker also feeds an InactivityIndex (a timing wheel of activity
+deadlines), so users who crossed the inactivity threshold or a segment
+rule's minutes_inactive threshold since the last flush are found without
+scanning the table. Those users are handed to the engagement scheduler as
+due now, and their stored segment is re-derived from the current rules.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, select, update
+
+from engagement_agent import determine_user_segment, get_rule_set
+from engagement_agent.timing_wheel import InactivityIndex, TimingWheel
+
+from . import models
+from .background import PeriodicWorker
+from .database import SessionLocal
+from .scheduler import engagement_scheduler
+from .user_state import user_state_cache
+
+logger = logging.getLogger(__name__)
+
+# Users coming back after this long get a "welcome back" message
+WELCOME_BACK_THRESHOLD_MINUTES = 2.0
+
+ACTIVITY_FLUSH_INTERVAL_MS = int(os.getenv("ACTIVITY_FLUSH_INTERVAL_MS", "5000"))
+
+
+class ActivityTracker(PeriodicWorker):
+    """
+    In-memory last-seen map with periodic bulk flush of last_active_at.
+    """
+
+    name = "activity-flusher"
+
+    def __init__(self, session_factory, flush_interval_ms: int = ACTIVITY_FLUSH_INTERVAL_MS, scheduler=None):
+        super().__init__(flush_interval_ms / 1000)
+        self.session_factory = session_factory
+        # EngagementScheduler fed the index's transitions while it runs
+        self.scheduler = scheduler
+        self.threshold = timedelta(minutes=WELCOME_BACK_THRESHOLD_MINUTES)
+
+        self._lock = threading.Lock()
+        self._last_seen: Dict[int, datetime] = {}
+        self._dirty: Dict[int, datetime] = {}
+        # Evicts last-seen entries once they pass the welcome-back threshold
+        self._idle = TimingWheel(self.threshold.total_seconds())
+        self.index = InactivityIndex()
+
+        # Monitoring
+        self.heartbeats_absorbed = 0
+        self.rows_flushed = 0
+        self.segments_updated = 0
+
+    def start(self) -> None:
+        """Rebuild the inactivity index from the database and start flushing."""
+        if self.running:
+            return
+        self._rebuild_index()
+        super().start()
+
+    def _rebuild_index(self) -> None:
+        db = self.session_factory()
+        try:
+            index = InactivityIndex.rebuild(db)
+        finally:
+            db.close()
+        with self._lock:
+            self.index = index
+
+    def last_seen(self, user_id: int) -> Optional[datetime]:
+        with self._lock:
+            return self._last_seen.get(user_id)
+
+    def seed(self, user_id: int, last_active_at: datetime) -> None:
+        """Record a last-active time read from the database (nothing to flush)."""
+        with self._lock:
+            known = self._last_seen.get(user_id)
+            if known is None or last_active_at > known:
+                self._remember(user_id, last_active_at)
+
+    def register(self, user_id: int, created_at: datetime) -> None:
+        """Start tracking inactivity deadlines for a newly created user."""
+        with self._lock:
+            self.index.record_activity(user_id, created_at)
+
+    def observe(self, user_id: int, active_at: datetime) -> None:
+        """Record activity that was already written to the database synchronously."""
+        with self._lock:
+            self._remember(user_id, active_at)
+            pending = self._dirty.get(user_id)
+            if pending is not None and pending <= active_at:
+                del self._dirty[user_id]
+
+    def heartbeat(self, user_id: int, now: datetime) -> bool:
+        """
+        Absorb a heartbeat in memory.
+        
+        Returns:
+            True if handled; False if the user is unknown or this heartbeat is a
+            dormant -> active transition that must take the synchronous path
+        """
+        with self._lock:
+            last = self._last_seen.get(user_id)
+            if last is None or now - last >= self.threshold:
+                return False
+            self._remember(user_id, now)
+            self._dirty[user_id] = now
+            self.heartbeats_absorbed += 1
+            return True
+
+    def flush(self) -> int:
+        """Write all pending last-seen times with one executemany UPDATE."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if dirty:
+            table = models.User.__table__
+            db = self.session_factory()
+            try:
+                db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("user_id"))
+                    .where(table.c.last_active_at < bindparam("active_at"))
+                    .values(last_active_at=bindparam("active_at"), churn_risk_score=0.0),
+                    [{"user_id": user_id, "active_at": active_at} for user_id, active_at in dirty.items()]
+                )
+                db.commit()
+                user_state_cache.update_many({
+                    user_id: {"last_active_at": active_at, "churn_risk_score": 0.0}
+                    for user_id, active_at in dirty.items()
+                })
+            except Exception:
+                db.rollback()
+                logger.exception(f"Failed to flush {len(dirty)} activity heartbeats; will retry")
+                with self._lock:
+                    for user_id, active_at in dirty.items():
+                        if self._dirty.get(user_id, active_at) <= active_at:
+                            self._dirty[user_id] = active_at
+                return 0
+            finally:
+                db.close()
+
+        self._expire(datetime.utcnow())
+        self.rows_flushed += len(dirty)
+        return len(dirty)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "tracked_users": len(self._last_seen),
+                "pending": len(self._dirty),
+                "heartbeats_absorbed": self.heartbeats_absorbed,
+                "rows_flushed": self.rows_flushed,
+                "indexed_users": len(self.index),
+                "segments_updated": self.segments_updated
+            }
+
+    def _remember(self, user_id: int, active_at: datetime) -> None:
+        # Caller holds the lock
+        self._last_seen[user_id] = active_at
+        self._idle.schedule(user_id, active_at)
+        self.index.record_activity(user_id, active_at)
+
+    def _expire(self, now: datetime) -> None:
+        """Evict idle last-seen entries and act on the index's transitions."""
+        thresholds = get_rule_set().inactivity_thresholds
+        if self.running and tuple(timedelta(minutes=minutes) for minutes in thresholds) != self.index.thresholds:
+            # The segment rules were reloaded with different inactivity thresholds
+            self._rebuild_index()
+
+        with self._lock:
+            # Pending writes live in _dirty, so evicting here loses nothing
+            for user_id in self._idle.advance(now):
+                self._last_seen.pop(user_id, None)
+            transitions = self.index.tick(now)
+
+        inactive, changed = transitions["inactive"], transitions["segment"]
+        if self.scheduler is not None and self.scheduler.running and (inactive or changed):
+            # Due now; the scheduler re-checks eligibility (and the new segment's tone)
+            self.scheduler.schedule_many(set(inactive).union(changed), now)
+        if changed:
+            self._reclassify(changed, now)
+
+    def _reclassify(self, user_ids: List[int], now: datetime) -> None:
+        """Store the rule set's segment for users who crossed a segment threshold."""
+        table = models.User.__table__
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                select(table.c.id, table.c.created_at, table.c.last_active_at, table.c.churn_risk_score, table.c.segment)
+                .where(table.c.id.in_(user_ids))
+            ).all()
+
+            updates = []
+            with self._lock:
+                for row in rows:
+                    # Users active since the tick were already re-queued by _remember
+                    if row.id not in self.index.segments:
+                        self.index.schedule_segment_change(row.id, row.last_active_at)
+            for row in rows:
+                segment = determine_user_segment(row.created_at, row.last_active_at, now, row.churn_risk_score)
+                if segment != row.segment:
+                    updates.append({"user_id": row.id, "segment": segment, "active_at": row.last_active_at})
+
+            if updates:
+                # Skipped for users whose activity moved since they were read
+                db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("user_id"))
+                    .where(table.c.last_active_at == bindparam("active_at"))
+                    .values(segment=bindparam("segment")),
+                    updates
+                )
+                db.commit()
+            self.segments_updated += len(updates)
+        except Exception:
+            db.rollback()
+            logger.exception(f"Failed to re-segment {len(user_ids)} users")
+        finally:
+            db.close()
+
+
+# Process-wide tracker used by the activity endpoints
+activity_tracker = ActivityTracker(SessionLocal, scheduler=engagement_scheduler)
@@ -1,18 +1,54 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Response
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import and_, func, insert, literal, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-from .database import engine, get_db, Base
+from .database import engine, get_db, get_read_db, get_async_db, get_async_read_db, Base, SessionLocal
 from . import models, schemas
+from .migrations import run_migrations
+from .engagement_cycle import run_engagement_cycle, DEFAULT_CHUNK_SIZE
+from .rollups import record_messages_sent, record_broadcast_sent, record_interaction
+from .activity import activity_tracker, WELCOME_BACK_THRESHOLD_MINUTES
+from .scheduler import engagement_scheduler
+from .churn import churn_scorer
+from .user_state import get_user_state, user_state_cache
+from .template_arms import TEMPLATE_BANDIT_ENABLED, refresh_template_bandit
+from .tracking import InteractionEvent, apply_interactions, interaction_buffer, RESULT_CODES
 from utility_messaging.reminders import process_reminder, REMINDER_TEMPLATES
-from utility_messaging.broadcasts import create_broadcast_payloads, BROADCAST_TEMPLATES
+from utility_messaging.broadcasts import (
+    BROADCAST_TEMPLATES,
+    build_broadcast_payload,
+    generate_broadcast_message,
+    select_broadcast_channel
+)
 
-# Initialize the database (Create tables if they don't exist)
+# Initialize the database (Create tables if they don't exist, then apply migrations)
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers: write-behind flushers for open/click tracking and
+    # heartbeats, churn rescoring and the continuous engagement scheduler
+    if TEMPLATE_BANDIT_ENABLED:
+        with SessionLocal() as db:
+            refresh_template_bandit(db, force=True)
+    interaction_buffer.start()
+    activity_tracker.start()
+    churn_scorer.start()
+    engagement_scheduler.start()
+    yield
+    engagement_scheduler.stop()
+    churn_scorer.stop()
+    activity_tracker.stop()
+    interaction_buffer.stop()
 
-app = FastAPI(title="Flirting Agent Backend")
+app = FastAPI(title="Flirting Agent Backend", lifespan=lifespan)
 
 # Enable CORS (Allows frontend to talk to backend)
 app.add_middleware(
@@ -21,6 +57,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # --- 1. USER MANAGEMENT ---
@@ -42,25 +79,104 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    activity_tracker.register(new_user.id, new_user.last_active_at)
     return new_user
 
+def _infer_tone(content: str) -> str:
+    """Infer the tone of an engagement message from its content."""
+    content = content.lower()
+    if "miss you" in content or "return" in content or "waiting" in content or "😉" in content:
+        return "playful"
+    elif "welcome" in content or "glad" in content or "great to see" in content or "🎉" in content:
+        return "warm"
+    return "neutral"
+
 @app.get("/users/")
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
     """
     List all users with enriched data for dashboard display.
     Returns: user info + inactive_minutes + last_message (for personalization demo)
     
     IMPORTANT: Segment is calculated dynamically based on current activity,
     NOT from the stored database value (which may be stale).
+    
+    Pagination: pass the `X-Next-Cursor` response header back as `cursor`
+    to fetch the next page. Keyset pagination on `id` costs the same at any
+    depth; `skip` is kept for backwards compatibility and ignored when a
+    cursor is given.
     """
     from engagement_agent.segmentation import determine_user_segment
     
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    
+    # Page of user IDs (keyset on id when a cursor is supplied)
+    page_query = select(models.User.id).order_by(models.User.id)
+    if cursor is not None:
+        page_query = page_query.where(models.User.id > cursor)
+    else:
+        page_query = page_query.offset(skip)
+    page = page_query.limit(limit).subquery()
+    
+    # Messages and broadcast deliveries (timed by their job) of the page's users.
+    # Message and job IDs are separate sequences, so ties at the same sent_at
+    # are broken by source first and only then by ID within the source.
+    page_ids = select(page.c.id)
+    history = union_all(
+        select(
+            models.MessageLog.user_id.label("user_id"),
+            models.MessageLog.content.label("content"),
+            models.MessageLog.sent_at.label("sent_at"),
+            literal(1).label("source"),
+            models.MessageLog.id.label("tiebreak")
+        ).where(models.MessageLog.user_id.in_(page_ids)),
+        select(
+            models.BroadcastDelivery.user_id,
+            models.BroadcastJob.content,
+            models.BroadcastJob.created_at,
+            literal(0),
+            models.BroadcastJob.id
+        ).join(
+            models.BroadcastJob, models.BroadcastJob.id == models.BroadcastDelivery.job_id
+        ).where(models.BroadcastDelivery.user_id.in_(page_ids))
+    ).subquery()
+    
+    # Latest entry per user, ranked with a window function
+    ranked_messages = select(
+        history.c.user_id,
+        history.c.content,
+        history.c.sent_at,
+        func.row_number().over(
+            partition_by=history.c.user_id,
+            order_by=(history.c.sent_at.desc(), history.c.source.desc(), history.c.tiebreak.desc())
+        ).label("rn")
+    ).subquery()
+    
+    # Users and their last message in a single round-trip
+    result = await db.execute(select(
+        models.User,
+        ranked_messages.c.content,
+        ranked_messages.c.sent_at
+    ).join(
+        page, page.c.id == models.User.id
+    ).outerjoin(
+        ranked_messages,
+        and_(ranked_messages.c.user_id == models.User.id, ranked_messages.c.rn == 1)
+    ).order_by(models.User.id))
+    rows = result.all()
+    
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1][0].id)
+    
+    # One reference time for the whole page, so segments are consistent
+    now = datetime.utcnow()
     enriched_users = []
-    for user in users:
+    for user, last_content, last_sent_at in rows:
         # Calculate inactive time
-        time_diff = datetime.utcnow() - user.last_active_at
+        time_diff = now - user.last_active_at
         # meaningful display: if < 1 hour, show minutes, else hours/days
         total_seconds = time_diff.total_seconds()
         if total_seconds < 3600:
@@ -73,29 +189,15 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
 
         
         # Calculate segment DYNAMICALLY (not from database)
-        current_segment = determine_user_segment(user.created_at, user.last_active_at)
-        
-        # Get last message sent to this user
-        last_message = db.query(models.MessageLog).filter(
-            models.MessageLog.user_id == user.id
-        ).order_by(models.MessageLog.sent_at.desc()).first()
+        current_segment = determine_user_segment(user.created_at, user.last_active_at, now, user.churn_risk_score)
         
-        # Determine tone from last message (extract from engagement messages)
+        # Last message sent to this user (already joined above)
         last_message_data = None
-        if last_message:
-            # Infer tone from message content
-            content = last_message.content.lower()
-            if "miss you" in content or "return" in content or "waiting" in content or "😉" in content:
-                tone = "playful"
-            elif "welcome" in content or "glad" in content or "great to see" in content or "🎉" in content:
-                tone = "warm"
-            else:
-                tone = "neutral"
-            
+        if last_content is not None:
             last_message_data = {
-                "content": last_message.content,
-                "tone": tone,
-                "timestamp": last_message.sent_at.isoformat()
+                "content": last_content,
+                "tone": _infer_tone(last_content),
+                "timestamp": last_sent_at.isoformat()
             }
         
         enriched_users.append({
@@ -114,24 +216,41 @@ def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     return enriched_users
 
 @app.post("/users/{user_id}/activity")
-def log_activity(user_id: int, db: Session = Depends(get_db)):
+async def log_activity(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Update the user's last_active_at timestamp. Sending welcome back message if they were dormant."""
     from message_generation.prompt_builder import generate_message
+    from engagement_agent.segmentation import determine_user_segment
     
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    # Cached state when available; the user row is only written, never loaded
+    user = await db.run_sync(get_user_state, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Check if user was inactive for a while (e.g. > 2 minutes)
     # This simulates a "Log In" after being away
     current_time = datetime.utcnow()
-    time_diff = current_time - user.last_active_at
+    # Heartbeats not yet flushed may be newer than the stored value
+    last_active_at = max(user.last_active_at, activity_tracker.last_seen(user_id) or user.last_active_at)
+    time_diff = current_time - last_active_at
     minutes_inactive = time_diff.total_seconds() / 60
     
     message_sent = None
     
     # If users come back after 2 minutes (Dormant threshold), welcome them back!
-    if minutes_inactive >= 2.0:
+    if minutes_inactive >= WELCOME_BACK_THRESHOLD_MINUTES:
+        # Credit the engagement message that brought them back
+        last_engagement = (await db.execute(
+            select(models.MessageLog).where(
+                models.MessageLog.user_id == user.id,
+                models.MessageLog.type == models.MessageType.CLIENT_ENGAGEMENT_BRAND,
+                models.MessageLog.tone != "welcome_back",
+                models.MessageLog.sent_at >= last_active_at
+            ).order_by(models.MessageLog.sent_at.desc()).limit(1)
+        )).scalar_one_or_none()
+        if last_engagement and not last_engagement.reactivated:
+            last_engagement.reactivated = True
+            await db.run_sync(record_interaction, last_engagement, reactivated=True)
+        
         # Generate Welcome Back message
         context = {"name": user.name}
         message_content = generate_message("welcome_back", context)
@@ -141,108 +260,128 @@ def log_activity(user_id: int, db: Session = Depends(get_db)):
             user_id=user.id,
             type=models.MessageType.CLIENT_ENGAGEMENT_BRAND,
             content=message_content,
-            status="sent"
+            status="sent",
+            sent_at=current_time,
+            tone="welcome_back",
+            segment="dormant"
         )
         db.add(new_message)
+        await db.run_sync(record_messages_sent, [{"sent_at": current_time, "type": new_message.type, "tone": "welcome_back", "segment": "dormant"}])
         message_sent = message_content
         # Note: We commit update to last_active_at below
     
-    # Update activity
-    user.last_active_at = current_time
-    # Reset churn risk since they are active
-    user.churn_risk_score = 0.0
+    # Update activity, reset churn risk since they are active, and restore
+    # the stored segment (the activity tracker re-segments inactive users)
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(
+            last_active_at=current_time,
+            churn_risk_score=0.0,
+            segment=determine_user_segment(user.created_at, current_time)
+        )
+    )
     
-    db.commit()
+    await db.commit()
+    activity_tracker.observe(user_id, current_time)
+    state = {"last_active_at": current_time, "churn_risk_score": 0.0}
+    if message_sent:
+        state["last_message_at"] = current_time
+    user_state_cache.update(user_id, **state)
     
     return {
         "status": "User activity logged", 
-        "last_active": user.last_active_at,
+        "last_active": current_time,
         "message_sent": message_sent
     }
 
+@app.post("/users/{user_id}/heartbeat")
+async def log_heartbeat(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Lightweight activity ping for frequent client heartbeats.
+    
+    Heartbeats are absorbed in memory and flushed periodically as one bulk
+    UPDATE. Only a dormant -> active transition (which sends a welcome back
+    message) falls through to the synchronous /activity logic.
+    """
+    current_time = datetime.utcnow()
+    
+    if activity_tracker.last_seen(user_id) is None:
+        state = await db.run_sync(get_user_state, user_id)
+        if not state:
+            raise HTTPException(status_code=404, detail="User not found")
+        activity_tracker.seed(user_id, state.last_active_at)
+    
+    if activity_tracker.heartbeat(user_id, current_time):
+        return {
+            "status": "User activity logged",
+            "last_active": current_time,
+            "message_sent": None
+        }
+    
+    return await log_activity(user_id, db)
+
 # --- 2. ENGAGEMENT TRIGGER (The Core Logic) ---
 
 @app.post("/run-engagement-cycle/")
-def trigger_engagement(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def trigger_engagement(
+    background_tasks: BackgroundTasks,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    resume: bool = True,
+    db: Session = Depends(get_db)
+):
     """
     Manually trigger the engagement cycle using the decision engine.
     
-    Process:
-    1. Fetch all users
+    Process (per keyset-ordered chunk of `chunk_size` users):
+    1. Fetch the next chunk of users
     2. Evaluate each user for engagement eligibility
-    3. Generate and send messages to eligible users
-    4. Log results
+    3. Generate messages for eligible users and bulk-insert them
+    4. Commit and checkpoint, so a failed cycle resumes where it stopped
     
-    In production, this would be called by a CRON job every hour.
+    Normally the background scheduler (backend/scheduler.py) engages users
+    as their timers expire; this endpoint forces a full pass.
     """
     import logging
-    from engagement_agent import evaluate_user_for_engagement, get_engagement_stats
-    from message_generation.prompt_builder import generate_message
     
     logger = logging.getLogger(__name__)
     logger.info("Starting engagement cycle...")
     
-    # Fetch all users
-    all_users = db.query(models.User).all()
+    result = run_engagement_cycle(db, chunk_size=chunk_size, resume=resume)
     
-    # Track statistics
-    messages_sent = 0
-    skipped_users = 0
-    segment_breakdown = {"dormant": 0, "loyal": 0, "normal": 0}
+    logger.info(f"Engagement cycle complete: {result['messages_sent']} messages sent, {result['users_skipped']} users skipped")
     
-    for user in all_users:
-        # Evaluate user using decision engine
-        evaluation = evaluate_user_for_engagement(user, db)
-        
-        if evaluation["eligible"]:
-            # User is eligible - generate and send message
-            segment = evaluation["segment"]
-            tone = evaluation["tone"]
-            
-            # Generate message content
-            context = {"name": user.name}
-            message_content = generate_message(tone, context)
-            
-            # Save message to database
-            new_message = models.MessageLog(
-                user_id=user.id,
-                type=models.MessageType.CLIENT_ENGAGEMENT_BRAND,
-                content=message_content,
-                status="sent"
-            )
-            db.add(new_message)
-            
-            # Update statistics
-            messages_sent += 1
-            segment_breakdown[segment] += 1
-            
-            logger.info(f"✓ Sent message to {user.name} (ID: {user.id}) - Segment: {segment}, Tone: {tone}")
-        else:
-            # User skipped
-            skipped_users += 1
-            logger.debug(f"✗ Skipped {user.name} (ID: {user.id}) - Reason: {evaluation['reason']}")
-    
-    # Commit all messages
-    db.commit()
+    return result
+
+@app.get("/messages/{user_id}", response_model=List[schemas.MessageLogResponse])
+async def get_user_messages(user_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """See the history of messages sent to a user, including broadcasts they received."""
+    result = await db.execute(
+        select(models.MessageLog).where(models.MessageLog.user_id == user_id)
+    )
+    messages = [schemas.MessageLogResponse.model_validate(m) for m in result.scalars()]
     
-    # Get detailed statistics
-    stats = get_engagement_stats(all_users, db)
+    # Broadcasts are stored once per job; resolve the user's deliveries against them
+    deliveries = await db.execute(
+        select(models.BroadcastJob, models.BroadcastDelivery).join(
+            models.BroadcastDelivery, models.BroadcastDelivery.job_id == models.BroadcastJob.id
+        ).where(models.BroadcastDelivery.user_id == user_id)
+    )
     
-    logger.info(f"Engagement cycle complete: {messages_sent} messages sent, {skipped_users} users skipped")
+    messages.extend(
+        schemas.MessageLogResponse(
+            content=job.content,
+            type=schemas.MessageType.USER_UTILITY_SYSTEM,
+            status=delivery.status,
+            sent_at=job.created_at,
+            broadcast_job_id=job.id,
+            opened=delivery.opened,
+            clicked=delivery.clicked
+        )
+        for job, delivery in deliveries
+    )
     
-    return {
-        "status": "Cycle complete",
-        "total_users": len(all_users),
-        "messages_sent": messages_sent,
-        "users_skipped": skipped_users,
-        "segment_breakdown": segment_breakdown,
-        "detailed_stats": stats
-    }
-
-@app.get("/messages/{user_id}", response_model=List[schemas.MessageLogResponse])
-def get_user_messages(user_id: int, db: Session = Depends(get_db)):
-    """See the history of messages sent to a user."""
-    return db.query(models.MessageLog).filter(models.MessageLog.user_id == user_id).all()
+    return sorted(messages, key=lambda m: m.sent_at)
 
 # --- 3. UTILITY MESSAGING (System to User) ---
 
@@ -255,7 +394,7 @@ def send_utility_reminder(request: schemas.UtilityReminderRequest, db: Session =
     if request.reminder_type not in REMINDER_TEMPLATES:
         raise HTTPException(status_code=400, detail=f"Invalid reminder type. Options: {list(REMINDER_TEMPLATES.keys())}")
 
-    user = db.query(models.User).filter(models.User.id == request.user_id).first()
+    user = get_user_state(db, request.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -270,10 +409,13 @@ def send_utility_reminder(request: schemas.UtilityReminderRequest, db: Session =
         user_id=user.id,
         type=models.MessageType.USER_UTILITY_SYSTEM,
         content=payload["message"],
-        status="sent"
+        status="sent",
+        sent_at=datetime.utcnow()
     )
     db.add(new_msg)
+    record_messages_sent(db, [{"sent_at": new_msg.sent_at, "type": new_msg.type}])
     db.commit()
+    user_state_cache.update(user.id, last_message_at=new_msg.sent_at)
 
     # In production, here you would call your Push Notification Service (e.g., FCM)
     return {"status": "sent", "payload": payload}
@@ -282,50 +424,111 @@ def send_utility_reminder(request: schemas.UtilityReminderRequest, db: Session =
 def send_utility_broadcast(request: schemas.BroadcastRequest, db: Session = Depends(get_db)):
     """
     Send a mass broadcast to ALL users (e.g., System Update).
+    
+    The rendered message, template and context are stored once as a
+    BroadcastJob; recipients get a compact (job_id, user_id, status) row
+    written by a single INSERT ... SELECT over the users table.
     """
     if request.broadcast_type not in BROADCAST_TEMPLATES:
         raise HTTPException(status_code=400, detail=f"Invalid type. Options: {list(BROADCAST_TEMPLATES.keys())}")
 
-    users = db.query(models.User).all()
-    payloads = create_broadcast_payloads(users, request.broadcast_type, request.context_data)
-    
-    if not payloads:
+    # Render once for all recipients
+    broadcast_data = generate_broadcast_message(request.broadcast_type, request.context_data)
+    if not broadcast_data:
         return {"status": "skipped", "count": 0}
 
-    # Log specific messages for each user 
-    # (Note: For massive scale, you'd batch insert or log only the job, not individual rows)
-    log_entries = []
-    for p in payloads:
-        log_entries.append(models.MessageLog(
-            user_id=p["user_id"],
-            type=models.MessageType.USER_UTILITY_SYSTEM,
-            content=p["message"],
-            status="sent"
-        ))
-    
-    db.add_all(log_entries)
+    channel = select_broadcast_channel(broadcast_data["priority"])
+    
+    job = models.BroadcastJob(
+        broadcast_type=request.broadcast_type,
+        template=BROADCAST_TEMPLATES[request.broadcast_type]["template"],
+        context=request.context_data,
+        content=broadcast_data["message"],
+        priority=broadcast_data["priority"],
+        channel=channel
+    )
+    db.add(job)
+    db.flush()
+    
+    # One set-based statement instead of a row per recipient built in Python
+    result = db.execute(
+        insert(models.BroadcastDelivery).from_select(
+            ["job_id", "user_id", "status"],
+            select(literal(job.id), models.User.id, literal("sent"))
+        )
+    )
+    recipient_count = result.rowcount
+    
+    if not recipient_count:
+        db.rollback()
+        return {"status": "skipped", "count": 0}
+    
+    job.recipient_count = recipient_count
+    db.flush()
+    record_broadcast_sent(db, job)
     db.commit()
+    # Every user just received a message; cheaper to reload than to patch each entry
+    user_state_cache.clear()
+    
+    first_user_id = db.query(func.min(models.BroadcastDelivery.user_id)).filter(
+        models.BroadcastDelivery.job_id == job.id
+    ).scalar()
+    sample_payload = build_broadcast_payload(first_user_id, request.broadcast_type, broadcast_data, channel)
 
-    return {"status": "broadcast_initiated", "recipient_count": len(payloads), "sample_payload": payloads[0] if payloads else None}
+    return {
+        "status": "broadcast_initiated",
+        "broadcast_job_id": job.id,
+        "recipient_count": recipient_count,
+        "sample_payload": sample_payload
+    }
 
 
 # --- ANALYTICS ENDPOINTS ---
 
+def _rates(sent: int, opened: int, clicked: int) -> dict:
+    """Open rate, click rate (of opens) and the 0.6/0.4 engagement score."""
+    open_rate = (opened / sent) if sent > 0 else 0
+    click_rate = (clicked / opened) if opened > 0 else 0
+    return {
+        "open_rate": round(open_rate, 3),
+        "click_rate": round(click_rate, 3),
+        "engagement_score": round(0.6 * open_rate + 0.4 * click_rate, 3)
+    }
+
 @app.get("/analytics/metrics")
-def get_analytics_metrics(days: int = 7, db: Session = Depends(get_db)):
+def get_analytics_metrics(days: int = 7, db: Session = Depends(get_read_db)):
     """
     Get engagement analytics metrics for the last N days.
     Returns overall metrics and breakdown by message type.
+    
+    Reads the pre-aggregated daily rollup (see backend/rollups.py), so the
+    cost depends on the number of days, not the number of messages. The
+    window covers N calendar days including today.
     """
     # Calculate date range
-    cutoff_date = datetime.utcnow() - timedelta(days=days)
+    today = datetime.utcnow().date()
+    start_day = today - timedelta(days=days - 1)
+    
+    rollup = models.EngagementRollup
+    
+    # Counts per message type
+    type_rows = db.query(
+        rollup.message_type,
+        func.sum(rollup.sent),
+        func.sum(rollup.opened),
+        func.sum(rollup.clicked)
+    ).filter(rollup.day >= start_day).group_by(rollup.message_type).all()
     
-    # Get all messages in the date range
-    messages = db.query(models.MessageLog).filter(
-        models.MessageLog.sent_at >= cutoff_date
-    ).all()
+    # Counts per day
+    day_rows = db.query(
+        rollup.day,
+        func.sum(rollup.sent),
+        func.sum(rollup.opened)
+    ).filter(rollup.day >= start_day).group_by(rollup.day).all()
     
-    if not messages:
+    total_sent = sum(sent for _, sent, _, _ in type_rows)
+    
+    if not total_sent:
         return {
             "period_days": days,
             "total_messages": 0,
@@ -338,90 +541,132 @@ def get_analytics_metrics(days: int = 7, db: Session = Depends(get_db)):
             "daily_stats": []
         }
     
-    # Calculate overall metrics
-    total_sent = len(messages)
-    total_opened = sum(1 for m in messages if m.opened)
-    total_clicked = sum(1 for m in messages if m.clicked)
-    
-    open_rate = (total_opened / total_sent) if total_sent > 0 else 0
-    click_rate = (total_clicked / total_opened) if total_opened > 0 else 0
-    engagement_score = (0.6 * open_rate + 0.4 * click_rate)
+    # Overall metrics
+    total_opened = sum(opened for _, _, opened, _ in type_rows)
+    total_clicked = sum(clicked for _, _, _, clicked in type_rows)
     
-    # Calculate metrics by message type
+    # Metrics by message type
     by_type = {}
-    for msg_type in [models.MessageType.CLIENT_ENGAGEMENT_BRAND, models.MessageType.USER_UTILITY_SYSTEM]:
-        type_messages = [m for m in messages if m.type == msg_type]
-        if type_messages:
-            type_sent = len(type_messages)
-            type_opened = sum(1 for m in type_messages if m.opened)
-            type_clicked = sum(1 for m in type_messages if m.clicked)
-            
-            type_open_rate = (type_opened / type_sent) if type_sent > 0 else 0
-            type_click_rate = (type_clicked / type_opened) if type_opened > 0 else 0
-            
-            by_type[msg_type.value] = {
+    for message_type, type_sent, type_opened, type_clicked in sorted(type_rows):
+        if type_sent:
+            by_type[message_type] = {
                 "sent": type_sent,
                 "opened": type_opened,
                 "clicked": type_clicked,
-                "open_rate": round(type_open_rate, 3),
-                "click_rate": round(type_click_rate, 3),
-                "engagement_score": round(0.6 * type_open_rate + 0.4 * type_click_rate, 3)
+                **_rates(type_sent, type_opened, type_clicked)
             }
     
-    # Calculate daily stats for chart
+    # Daily stats for chart (one entry per calendar day, oldest first)
+    by_day = {day: (sent, opened) for day, sent, opened in day_rows}
+    
     daily_stats = []
     for i in range(days):
-        day_start = datetime.utcnow() - timedelta(days=days-i-1)
-        day_end = day_start + timedelta(days=1)
-        
-        day_messages = [m for m in messages if day_start <= m.sent_at < day_end]
-        day_opened = sum(1 for m in day_messages if m.opened)
+        day = start_day + timedelta(days=i)
+        day_sent, day_opened = by_day.get(day, (0, 0))
         
         daily_stats.append({
-            "date": day_start.strftime("%Y-%m-%d"),
-            "day": day_start.strftime("%a"),
-            "sent": len(day_messages),
+            "date": day.strftime("%Y-%m-%d"),
+            "day": day.strftime("%a"),
+            "sent": day_sent,
             "opened": day_opened,
-            "engagement": round((day_opened / len(day_messages) * 100) if day_messages else 0, 1)
+            "engagement": round((day_opened / day_sent * 100) if day_sent else 0, 1)
         })
     
     return {
         "period_days": days,
         "total_messages": total_sent,
-        "overall": {
-            "open_rate": round(open_rate, 3),
-            "click_rate": round(click_rate, 3),
-            "engagement_score": round(engagement_score, 3)
-        },
+        "overall": _rates(total_sent, total_opened, total_clicked),
         "by_type": by_type,
         "daily_stats": daily_stats
     }
 
+@app.post("/analytics/track/batch")
+async def track_message_interactions_batch(
+    request: schemas.TrackBatchRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Track many open/click events in one request (e.g. buffered by the mobile SDK).
+    
+    Events are applied with one set-based UPDATE per action type, keeping
+    the "click implies open" rule. An event targets `message_id`, or a
+    broadcast delivery via `broadcast_job_id` + `user_id`. `results` holds
+    one code per input event, in order, for that event's own action:
+    1 tracked, 0 duplicate (already recorded, or by an earlier event in the
+    batch), -1 message not found, -2 invalid action or target.
+    """
+    now = datetime.utcnow()
+    events = []
+    for item in request.events:
+        timestamp = item.timestamp or now
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        events.append(InteractionEvent(item.message_id, item.action, timestamp, item.broadcast_job_id, item.user_id))
+    
+    outcomes = await db.run_sync(apply_interactions, events)
+    await db.commit()
+    
+    results = [RESULT_CODES[outcome] for outcome in outcomes]
+    
+    return {
+        "status": "tracked",
+        "received": len(events),
+        "tracked": results.count(RESULT_CODES["tracked"]),
+        "results": results
+    }
+
+@app.post("/analytics/track/broadcast/{job_id}/{user_id}")
+async def track_broadcast_interaction(
+    job_id: int,
+    user_id: int,
+    action: str,  # "open" or "click"
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Track a recipient's interaction with a broadcast (open or click).
+    
+    Broadcast deliveries have no message ID; they are keyed by the job
+    (`broadcast_job_id` in the user's message history) and the recipient.
+    Buffered the same way as /analytics/track/{message_id}.
+    """
+    event = InteractionEvent(None, action, datetime.utcnow(), job_id, user_id)
+    
+    if interaction_buffer.running:
+        interaction_buffer.submit(event)
+        return {"status": "queued", "broadcast_job_id": job_id, "user_id": user_id, "action": action}
+    
+    outcome, = await db.run_sync(apply_interactions, [event])
+    if outcome == "not_found":
+        raise HTTPException(status_code=404, detail="Broadcast delivery not found")
+    
+    await db.commit()
+    
+    return {"status": "tracked", "broadcast_job_id": job_id, "user_id": user_id, "action": action}
+
 @app.post("/analytics/track/{message_id}")
-def track_message_interaction(
+async def track_message_interaction(
     message_id: int,
     action: str,  # "open" or "click"
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Track user interaction with a message (open or click).
+    
+    With write-behind tracking running (TRACKING_DURABILITY != "sync" and
+    the app lifespan started) the event is queued and applied in the next
+    batched flush, so the response is "queued" and unknown message IDs are
+    dropped at flush time instead of returning 404.
     """
-    message = db.query(models.MessageLog).filter(models.MessageLog.id == message_id).first()
+    event = InteractionEvent(message_id, action, datetime.utcnow())
     
-    if not message:
-        raise HTTPException(status_code=404, detail="Message not found")
+    if interaction_buffer.running:
+        interaction_buffer.submit(event)
+        return {"status": "queued", "message_id": message_id, "action": action}
     
-    if action == "open" and not message.opened:
-        message.opened = True
-        message.opened_at = datetime.utcnow()
-    elif action == "click" and not message.clicked:
-        message.clicked = True
-        message.clicked_at = datetime.utcnow()
-        # Auto-mark as opened if clicked
-        if not message.opened:
-            message.opened = True
-            message.opened_at = datetime.utcnow()
+    outcome, = await db.run_sync(apply_interactions, [event])
+    if outcome == "not_found":
+        raise HTTPException(status_code=404, detail="Message not found")
     
-    db.commit()
+    await db.commit()
     
     return {"status": "tracked", "message_id": message_id, "action": action}
@@ -0,0 +1,68 @@
+"""
+Background Workers
+
+Base class for in-process workers that periodically flush buffered state
+to the database from a daemon thread (write-behind tracking, activity
+heartbeats, ...). Workers are started and stopped from the app lifespan.
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker(ABC):
+    """
+    Runs `flush()` every `interval` seconds on a daemon thread, or sooner
+    when `wake()` is called. `stop()` runs one final flush unless
+    `flush_on_stop` is False. Subclasses implement `flush()`.
+    """
+
+    name = "periodic-worker"
+    flush_on_stop = True
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    @abstractmethod
+    def flush(self) -> int:
+        """Write out buffered state. Returns the number of items handled."""
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception(f"{self.name} flush failed")
+        if self.flush_on_stop:
+            self.flush()
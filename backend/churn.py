@@ -0,0 +1,290 @@
+"""
+Churn Scoring
+
+Keeps users.churn_risk_score up to date with the logistic model in
+engagement_agent/churn.py. Users are walked in keyset-ordered chunks; each
+chunk's message history is aggregated in one grouped query, scored with
+NumPy and written back with one executemany UPDATE, then committed.
+
+Scoring is incremental: a user is rescored only when an input changed
+since users.churn_scored_at:
+- never scored, or active since the last score
+- sent, opened or clicked a message since the last score
+- scored more than CHURN_RESCORE_MINUTES ago and still inside the window
+  where the inactivity feature grows with time (it is capped at
+  MAX_INACTIVITY_RATIO dormant periods; once capped it no longer changes)
+
+Account age also grows with time, but only logarithmically, so it is
+refreshed whenever one of the inputs above changes rather than on a timer.
+
+Finding those users never scans the users table. The latest
+churn_scored_at is the watermark of the previous run, and candidates come
+from index range scans past it: unscored users, users active since the
+watermark or inside the inactivity window, and users with a message sent,
+opened or clicked since. Only the candidates are checked against the
+per-user conditions above.
+
+ChurnScorer runs this every CHURN_SCORING_INTERVAL_MS in the background.
+
+Rescore everyone:
+    python -m backend.churn
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import and_, bindparam, case, exists, func, or_, select, union, update
+from sqlalchemy.orm import Session
+
+from engagement_agent.churn import DEFAULT_CHURN_MODEL, MAX_INACTIVITY_RATIO, ChurnModel, churn_feature_arrays
+from engagement_agent.segmentation import DORMANT_THRESHOLD_MINUTES
+
+from . import models
+from .background import PeriodicWorker
+from .database import SessionLocal
+from .user_state import user_state_cache
+
+logger = logging.getLogger(__name__)
+
+CHURN_SCORING_ENABLED = os.getenv("CHURN_SCORING_ENABLED", "true").lower() in ("1", "true", "yes")
+CHURN_SCORING_INTERVAL_MS = int(os.getenv("CHURN_SCORING_INTERVAL_MS", "60000"))
+CHURN_RESCORE_MINUTES = float(os.getenv("CHURN_RESCORE_MINUTES", "10"))
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Inactivity past this no longer changes the score
+INACTIVITY_SATURATION = timedelta(minutes=MAX_INACTIVITY_RATIO * DORMANT_THRESHOLD_MINUTES)
+
+# Max IDs per IN (...) lookup (stays under SQLite's bound-parameter limit)
+LOOKUP_CHUNK_SIZE = 500
+
+_MINUTE = np.timedelta64(60 * 10**6, "us")
+
+
+def _stale_users(now: datetime, rescore_after: timedelta):
+    """WHERE clause matching users whose score is missing or out of date."""
+    users = models.User.__table__
+    logs = models.MessageLog.__table__
+    scored_at = users.c.churn_scored_at
+
+    return or_(
+        scored_at.is_(None),
+        # Inactivity still growing; the extra rescore_after of slack gives users
+        # who saturated since their last score one final rescore
+        and_(
+            scored_at < now - rescore_after,
+            users.c.last_active_at > now - INACTIVITY_SATURATION - rescore_after
+        ),
+        users.c.last_active_at > scored_at,
+        exists().where(
+            logs.c.user_id == users.c.id,
+            or_(logs.c.sent_at > scored_at, logs.c.opened_at > scored_at, logs.c.clicked_at > scored_at)
+        )
+    )
+
+
+def _candidate_ids(db: Session, since: datetime, now: datetime, rescore_after: timedelta) -> List[int]:
+    """
+    Users whose churn inputs may have changed after `since`, sorted by id.
+
+    Every branch is a range scan on an index (see migration 10), so the cost
+    is proportional to the number of changes, not to the number of users.
+    """
+    users = models.User.__table__
+    logs = models.MessageLog.__table__
+    window_start = min(since, now - INACTIVITY_SATURATION - rescore_after)
+
+    candidates = union(
+        select(users.c.id).where(users.c.churn_scored_at.is_(None)),
+        select(users.c.id).where(users.c.last_active_at > window_start),
+        select(logs.c.user_id).where(logs.c.sent_at > since),
+        select(logs.c.user_id).where(logs.c.opened_at > since),
+        select(logs.c.user_id).where(logs.c.clicked_at > since)
+    )
+    return sorted(user_id for user_id in db.execute(candidates).scalars() if user_id is not None)
+
+
+def _message_counts(db: Session, user_ids: List[int]):
+    """Engagement messages sent / opened / clicked per user."""
+    logs = models.MessageLog.__table__
+    counts = {}
+    # Stale users can be spread over the whole id space, so look up exactly
+    # the chunk's users rather than an id range
+    for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE):
+        rows = db.execute(
+            select(
+                logs.c.user_id,
+                func.count(logs.c.id),
+                func.coalesce(func.sum(case((logs.c.opened == True, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((logs.c.clicked == True, 1), else_=0)), 0)
+            )
+            .where(logs.c.user_id.in_(user_ids[start:start + LOOKUP_CHUNK_SIZE]))
+            .where(logs.c.type == models.MessageType.CLIENT_ENGAGEMENT_BRAND)
+            .group_by(logs.c.user_id)
+        )
+        counts.update((user_id, (sent, opened, clicked)) for user_id, sent, opened, clicked in rows)
+    return counts
+
+
+def score_chunk(db: Session, rows, now: datetime, model: ChurnModel = DEFAULT_CHURN_MODEL) -> np.ndarray:
+    """
+    Churn risk for a chunk of (id, created_at, last_active_at) rows.
+    """
+    counts = _message_counts(db, [row.id for row in rows])
+    history = np.array([counts.get(row.id, (0, 0, 0)) for row in rows], dtype=float).reshape(len(rows), 3)
+
+    now64 = np.datetime64(now, "us")
+    created_at = np.array([row.created_at or now for row in rows], dtype="datetime64[us]")
+    last_active_at = np.array([row.last_active_at or row.created_at or now for row in rows], dtype="datetime64[us]")
+
+    features = churn_feature_arrays(
+        (now64 - last_active_at) / _MINUTE,
+        (now64 - created_at) / _MINUTE,
+        history[:, 0], history[:, 1], history[:, 2]
+    )
+    return model.score_arrays(features)
+
+
+def refresh_churn_scores(
+    db: Session,
+    now: Optional[datetime] = None,
+    full: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    model: ChurnModel = DEFAULT_CHURN_MODEL
+) -> int:
+    """
+    Rescore users whose inputs changed (or everyone with `full`), committing per chunk.
+
+    Args:
+        db: Database session
+        now: Reference time shared by every user (defaults to utcnow)
+        full: Rescore every user, not only stale ones
+        chunk_size: Users scored and committed at a time
+        model: Churn model to apply
+
+    Returns:
+        Number of users rescored
+    """
+    now = now or datetime.utcnow()
+    rescore_after = timedelta(minutes=CHURN_RESCORE_MINUTES)
+    users = models.User.__table__
+    columns = select(users.c.id, users.c.created_at, users.c.last_active_at)
+
+    # The previous run's scoring time (an index lookup); None before any score
+    watermark = None if full else db.execute(select(func.max(users.c.churn_scored_at))).scalar()
+
+    scored = 0
+    if watermark is None:
+        # Everyone needs a score: walk the whole table in keyset order
+        last_user_id = 0
+        while True:
+            rows = db.execute(
+                columns.where(users.c.id > last_user_id).order_by(users.c.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            scored += _write_scores(db, rows, now, model)
+            last_user_id = rows[-1].id
+            if len(rows) < chunk_size:
+                break
+        return scored
+
+    # Look back one rescore period for writes that landed with an earlier
+    # timestamp (e.g. buffered opens/clicks); the per-user check drops repeats
+    candidate_ids = _candidate_ids(db, watermark - rescore_after, now, rescore_after)
+    step = min(chunk_size, LOOKUP_CHUNK_SIZE)
+    for start in range(0, len(candidate_ids), step):
+        rows = db.execute(
+            columns
+            .where(users.c.id.in_(candidate_ids[start:start + step]))
+            .where(_stale_users(now, rescore_after))
+            .order_by(users.c.id)
+        ).all()
+        if rows:
+            scored += _write_scores(db, rows, now, model)
+
+    return scored
+
+
+def _write_scores(db: Session, rows, now: datetime, model: ChurnModel) -> int:
+    """Score a chunk of users, write the scores with one executemany UPDATE and commit."""
+    users = models.User.__table__
+    scores = score_chunk(db, rows, now, model)
+    db.execute(
+        update(users)
+        .where(users.c.id == bindparam("user_id"))
+        .values(churn_risk_score=bindparam("score"), churn_scored_at=now),
+        [{"user_id": row.id, "score": float(score)} for row, score in zip(rows, scores)]
+    )
+    db.commit()
+    user_state_cache.update_many({
+        row.id: {"churn_risk_score": float(score)} for row, score in zip(rows, scores)
+    })
+    return len(rows)
+
+
+class ChurnScorer(PeriodicWorker):
+    """
+    Periodically rescores users whose churn inputs changed.
+    """
+
+    name = "churn-scorer"
+    # Scores are recomputed from the database; nothing is lost by skipping
+    flush_on_stop = False
+
+    def __init__(
+        self,
+        session_factory,
+        enabled: bool = CHURN_SCORING_ENABLED,
+        interval_ms: int = CHURN_SCORING_INTERVAL_MS
+    ):
+        super().__init__(interval_ms / 1000)
+        self.session_factory = session_factory
+        self.enabled = enabled
+
+        # Monitoring
+        self.users_scored = 0
+        self.runs = 0
+
+    def start(self) -> None:
+        if self.enabled:
+            super().start()
+
+    def flush(self) -> int:
+        db = self.session_factory()
+        try:
+            scored = refresh_churn_scores(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.runs += 1
+        self.users_scored += scored
+        if scored:
+            logger.info(f"Rescored churn risk for {scored} users")
+        return scored
+
+
+# Process-wide scorer started from the app lifespan
+churn_scorer = ChurnScorer(SessionLocal)
+
+
+if __name__ == "__main__":
+    from .database import Base, engine
+    from .migrations import run_migrations
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        count = refresh_churn_scores(db, full=True)
+        print(f"Rescored churn risk for {count} users.")
+    finally:
+        db.close()
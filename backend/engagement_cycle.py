@@ -0,0 +1,288 @@
+"""
+Chunked Engagement Cycle
+
+Walks the users table in keyset-ordered chunks (WHERE id > last_id ORDER BY id),
+so memory stays bounded no matter how many users there are:
+
+1. Load one chunk of users
+2. Evaluate the chunk with the batch decision engine
+3. Bulk-insert the chunk's messages
+4. Commit together with the run checkpoint, then expunge
+
+If a chunk fails, everything committed before it is kept and the next
+cycle resumes from the run's last committed user ID.
+
+A run is resumed only if it failed, or if it is still marked running but
+has not committed a chunk for ENGAGEMENT_RUN_STALE_SECONDS (its process
+died). Resuming claims the run with a guarded UPDATE, so two concurrent
+cycles can never pick up the same run.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, insert, or_, update
+from sqlalchemy.orm import Session
+
+from message_generation.bandit import TemplateBandit
+
+from . import models
+from .rollups import record_messages_sent
+from .template_arms import bandit_from_snapshot, get_template_bandit, record_template_sends, snapshot_arms
+from .user_state import user_state_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# A running run without a committed chunk for this long is considered dead
+ENGAGEMENT_RUN_STALE_SECONDS = float(os.getenv("ENGAGEMENT_RUN_STALE_SECONDS", "300"))
+
+
+def _merge_stats(total: Dict[str, Any], chunk: Dict[str, Any]) -> None:
+    """Add the counters of one chunk's stats into the running total (in place)."""
+    for key, value in chunk.items():
+        if isinstance(value, dict):
+            _merge_stats(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def _resumable_runs(now: datetime):
+    """WHERE clause matching runs nobody is executing: failed, or running but stale."""
+    runs = models.EngagementCycleRun
+    stale_before = now - timedelta(seconds=ENGAGEMENT_RUN_STALE_SECONDS)
+    return or_(
+        runs.status == "failed",
+        and_(runs.status == "running", or_(runs.heartbeat_at.is_(None), runs.heartbeat_at < stale_before))
+    )
+
+
+def _get_or_start_run(db: Session, resume: bool) -> models.EngagementCycleRun:
+    """Claim the latest resumable run if resuming, otherwise start a new one."""
+    runs = models.EngagementCycleRun
+    now = datetime.utcnow()
+
+    if resume:
+        candidates = db.query(runs.id).filter(_resumable_runs(now)).order_by(runs.id.desc()).all()
+        for (run_id,) in candidates:
+            # Guarded on the same condition, so only one caller wins the claim
+            claimed = db.query(runs).filter(runs.id == run_id, _resumable_runs(now)).update(
+                {"status": "running", "heartbeat_at": now}, synchronize_session=False
+            )
+            db.commit()
+            if claimed:
+                run = db.get(runs, run_id, populate_existing=True)
+                logger.info(f"Resuming engagement cycle run {run.id} after user {run.last_user_id}")
+                return run
+
+    run = models.EngagementCycleRun(status="running", last_user_id=0, heartbeat_at=now)
+    db.add(run)
+    db.commit()
+    return run
+
+
+def _run_bandit(db: Session, run: models.EngagementCycleRun) -> Optional[TemplateBandit]:
+    """The bandit a run allocates templates with: the arm counts it started with."""
+    bandit = get_template_bandit(db)
+    if bandit is None:
+        return None
+    if run.template_arms is None:
+        # New run (or one from before snapshots): freeze the current counts
+        run.template_arms = snapshot_arms(bandit)
+        db.commit()
+    return bandit_from_snapshot(run.template_arms)
+
+
+def engage_users(
+    db: Session,
+    users,
+    context=None,
+    bandit: Optional[TemplateBandit] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Evaluate a batch of users and bulk-insert messages for the eligible ones.
+    
+    Shared by the chunked cycle and the background scheduler. Does not commit.
+    
+    Args:
+        db: Database session
+        users: User objects to evaluate
+        context: EvaluationContext shared by the batch (a fresh one if omitted);
+            its `now` is also the messages' sent_at, and its cycle_id seeds
+            template selection (bandit or hash rotation, see template_arms)
+        bandit: Template bandit to allocate with (a cycle run's frozen arm
+            counts); defaults to the shared bandit, None if it is disabled
+        
+    Returns:
+        (evaluations in the same order as `users`, inserted message rows)
+    """
+    from engagement_agent import EvaluationContext, evaluate_users_for_engagement
+    from message_generation.prompt_builder import allocate_messages
+
+    context = context or EvaluationContext.create()
+    evaluations = evaluate_users_for_engagement(users, db, context)
+    sent_at = context.now
+
+    message_rows = []
+    users_by_group: Dict[Tuple[str, str], List[Any]] = defaultdict(list)
+    rows_by_group: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for user, evaluation in zip(users, evaluations):
+        if evaluation["eligible"]:
+            segment = evaluation["segment"]
+            tone = evaluation["tone"]
+
+            row = {
+                "user_id": user.id,
+                "type": models.MessageType.CLIENT_ENGAGEMENT_BRAND,
+                "content": None,
+                "status": "sent",
+                "sent_at": sent_at,
+                "tone": tone,
+                "segment": segment,
+                "template_id": None
+            }
+            message_rows.append(row)
+            rows_by_group[(segment, tone)].append(row)
+            users_by_group[(segment, tone)].append(user)
+            logger.info(f"✓ Sent message to {user.name} (ID: {user.id}) - Segment: {segment}, Tone: {tone}")
+        else:
+            logger.debug(f"✗ Skipped {user.name} (ID: {user.id}) - Reason: {evaluation['reason']}")
+
+    # Pick each user's template variant (bandit-weighted per segment and tone,
+    # skipping their recent templates) and render each group in one pass
+    if message_rows and bandit is None:
+        bandit = get_template_bandit(db)
+    history_updates = []
+    for (segment, tone), rows in rows_by_group.items():
+        group_users = users_by_group[(segment, tone)]
+        contents, template_ids, histories = allocate_messages(
+            tone,
+            [user.id for user in group_users],
+            [user.name for user in group_users],
+            context.cycle_id,
+            [user.recent_templates for user in group_users],
+            bandit=bandit,
+            segment=segment
+        )
+        for row, user, content, template_id, history in zip(rows, group_users, contents, template_ids, histories):
+            row["content"] = content
+            row["template_id"] = template_id
+            history_updates.append({"user_id": user.id, "recent_templates": history})
+
+    # Bulk insert the batch's messages and advance the users' template rings
+    # (executemany, no ORM objects)
+    if message_rows:
+        db.execute(insert(models.MessageLog), message_rows)
+        users_table = models.User.__table__
+        db.execute(
+            update(users_table)
+            .where(users_table.c.id == bindparam("user_id"))
+            .values(recent_templates=bindparam("recent_templates")),
+            history_updates
+        )
+        record_messages_sent(db, message_rows)
+        record_template_sends(db, message_rows)
+
+        # Updated before the caller commits: after a rollback the cache
+        # only over-reports recent messages, which skips a send, never doubles one
+        user_state_cache.update_many({
+            update_row["user_id"]: {"last_message_at": sent_at, "recent_templates": update_row["recent_templates"]}
+            for update_row in history_updates
+        })
+
+    return evaluations, message_rows
+
+
+def run_engagement_cycle(db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE, resume: bool = True) -> Dict[str, Any]:
+    """
+    Run one engagement cycle over all users in bounded-memory chunks.
+    
+    Args:
+        db: Database session
+        chunk_size: Number of users loaded, evaluated and committed at a time
+        resume: Continue the latest unfinished run instead of starting over
+        
+    Returns:
+        Cycle summary (counts for this invocation plus run checkpoint info)
+    """
+    from engagement_agent import EvaluationContext, summarize_evaluations
+
+    run = _get_or_start_run(db, resume)
+    run_id = run.id
+
+    # Every chunk is judged against the same instant and rules. The run ID
+    # seeds template selection and the bandit's arm counts are frozen on the
+    # run, so a user's variant does not depend on chunking or on resuming
+    context = EvaluationContext.create(cycle_id=run_id)
+    bandit = _run_bandit(db, run)
+    resumed_from = run.last_user_id
+    last_user_id = run.last_user_id
+
+    total_users = 0
+    messages_sent = 0
+    skipped_users = 0
+    segment_breakdown = dict.fromkeys(context.rules.segments, 0)
+    stats: Dict[str, Any] = {}
+
+    try:
+        while True:
+            users = db.query(models.User).filter(
+                models.User.id > last_user_id
+            ).order_by(models.User.id).limit(chunk_size).all()
+
+            if not users:
+                break
+
+            evaluations, message_rows = engage_users(db, users, context, bandit)
+            for row in message_rows:
+                segment_breakdown[row["segment"]] = segment_breakdown.get(row["segment"], 0) + 1
+
+            chunk_sent = len(message_rows)
+            chunk_skipped = len(users) - chunk_sent
+            last_user_id = users[-1].id
+
+            # Advance the checkpoint in the same transaction as the messages
+            run.last_user_id = last_user_id
+            run.users_processed += len(users)
+            run.messages_sent += chunk_sent
+            run.users_skipped += chunk_skipped
+            run.heartbeat_at = datetime.utcnow()
+            db.commit()
+
+            total_users += len(users)
+            messages_sent += chunk_sent
+            skipped_users += chunk_skipped
+            _merge_stats(stats, summarize_evaluations(evaluations, context))
+
+            # Drop the chunk from the identity map (keep the run row)
+            db.expunge_all()
+            db.add(run)
+
+            if len(users) < chunk_size:
+                break
+    except Exception:
+        db.rollback()
+        run.status = "failed"
+        db.commit()
+        logger.exception(f"Engagement cycle run {run_id} failed after user {run.last_user_id}")
+        raise
+
+    run.status = "completed"
+    run.finished_at = datetime.utcnow()
+    db.commit()
+
+    return {
+        "status": "Cycle complete",
+        "run_id": run_id,
+        "resumed_from_user_id": resumed_from,
+        "last_user_id": last_user_id,
+        "total_users": total_users,
+        "messages_sent": messages_sent,
+        "users_skipped": skipped_users,
+        "segment_breakdown": segment_breakdown,
+        "detailed_stats": stats or summarize_evaluations([], context)
+    }
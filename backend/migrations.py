@@ -0,0 +1,185 @@
+"""
+Schema migrations for the Flirting Agent database.
+
+`Base.metadata.create_all` only creates missing tables; it never alters
+existing ones. Migrations listed here are applied in order, exactly once,
+and recorded in the `schema_migrations` table so that databases created
+before a schema change catch up on startup.
+
+Every migration is idempotent, so it is also safe on a fresh database
+where `create_all` already built the latest schema.
+
+Usage:
+    python -m backend.migrations
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------
+# Helpers
+# ---------------------------------------------------
+
+def create_index(name: str, table: str, columns: str, where: str = "") -> Callable[[Connection], None]:
+    """Build a migration step that creates an index (partial with `where`) if it does not exist."""
+    def step(conn: Connection) -> None:
+        condition = f" WHERE {where}" if where else ""
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns}){condition}"))
+    return step
+
+
+def add_column(table: str, column: str, ddl: str) -> Callable[[Connection], None]:
+    """Build a migration step that adds a column if it does not exist."""
+    def step(conn: Connection) -> None:
+        existing = {c["name"] for c in inspect(conn).get_columns(table)}
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return step
+
+
+def backfill_rollups(conn: Connection) -> None:
+    """Migration step that rebuilds engagement_rollups from raw logs."""
+    from sqlalchemy.orm import Session
+    from .rollups import rebuild_rollups
+
+    session = Session(bind=conn)
+    try:
+        rebuild_rollups(session)
+        session.flush()
+    finally:
+        session.close()
+
+
+def backfill_template_arms(conn: Connection) -> None:
+    """Migration step that rebuilds template_arms from raw logs."""
+    from sqlalchemy.orm import Session
+    from .template_arms import rebuild_template_arms
+
+    session = Session(bind=conn)
+    try:
+        rebuild_template_arms(session)
+        session.flush()
+    finally:
+        session.close()
+
+
+# ---------------------------------------------------
+# Migration Registry (append only - never reorder)
+# ---------------------------------------------------
+
+MIGRATIONS: List[Tuple[int, str, List[Callable[[Connection], None]]]] = [
+    (1, "Indexes for message_logs hot queries and user inactivity scans", [
+        create_index("ix_message_logs_user_id_sent_at", "message_logs", "user_id, sent_at DESC"),
+        create_index("ix_message_logs_sent_at", "message_logs", "sent_at"),
+        create_index("ix_message_logs_type_sent_at", "message_logs", "type, sent_at"),
+        create_index("ix_users_last_active_at", "users", "last_active_at"),
+    ]),
+    (2, "Open/click tracking columns on message_logs", [
+        add_column("message_logs", "opened", "BOOLEAN DEFAULT 0"),
+        add_column("message_logs", "opened_at", "TIMESTAMP"),
+        add_column("message_logs", "clicked", "BOOLEAN DEFAULT 0"),
+        add_column("message_logs", "clicked_at", "TIMESTAMP"),
+    ]),
+    (3, "Tone/segment/reactivation on message_logs and daily engagement rollups", [
+        add_column("message_logs", "tone", "VARCHAR DEFAULT ''"),
+        add_column("message_logs", "segment", "VARCHAR DEFAULT ''"),
+        add_column("message_logs", "reactivated", "BOOLEAN DEFAULT 0"),
+        backfill_rollups,
+    ]),
+    (4, "Template variant on message_logs and per-user recent-template ring", [
+        add_column("message_logs", "template_id", "INTEGER"),
+        add_column("users", "recent_templates", "INTEGER DEFAULT 0"),
+    ]),
+    (5, "Template bandit arms backfilled from message_logs", [
+        backfill_template_arms,
+    ]),
+    (6, "Churn scoring timestamp on users", [
+        add_column("users", "churn_scored_at", "TIMESTAMP"),
+    ]),
+    (7, "Heartbeat on engagement cycle runs (atomic resume claims)", [
+        add_column("engagement_cycle_runs", "heartbeat_at", "TIMESTAMP"),
+    ]),
+    (8, "Open/click tracking columns on broadcast_deliveries", [
+        add_column("broadcast_deliveries", "opened", "BOOLEAN DEFAULT 0"),
+        add_column("broadcast_deliveries", "opened_at", "TIMESTAMP"),
+        add_column("broadcast_deliveries", "clicked", "BOOLEAN DEFAULT 0"),
+        add_column("broadcast_deliveries", "clicked_at", "TIMESTAMP"),
+    ]),
+    (9, "Template bandit arm snapshot on engagement cycle runs", [
+        add_column("engagement_cycle_runs", "template_arms", "JSON"),
+    ]),
+    (10, "Indexes for incremental churn scoring (scored_at, open/click watermarks)", [
+        create_index("ix_users_churn_scored_at", "users", "churn_scored_at"),
+        create_index("ix_message_logs_opened_at", "message_logs", "opened_at", where="opened_at IS NOT NULL"),
+        create_index("ix_message_logs_clicked_at", "message_logs", "clicked_at", where="clicked_at IS NOT NULL"),
+    ]),
+]
+
+
+# ---------------------------------------------------
+# Runner
+# ---------------------------------------------------
+
+def _ensure_version_table(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR, "
+        "applied_at TIMESTAMP)"
+    ))
+
+
+def get_applied_versions(bind: Engine = engine) -> List[int]:
+    """Return the migration versions already applied to the database."""
+    with bind.begin() as conn:
+        _ensure_version_table(conn)
+        rows = conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))
+        return [row[0] for row in rows]
+
+
+def run_migrations(bind: Engine = engine) -> List[int]:
+    """
+    Apply all pending migrations, each in its own transaction.
+
+    Returns:
+        List of versions applied by this call
+    """
+    applied = set(get_applied_versions(bind))
+    newly_applied = []
+
+    for version, description, steps in MIGRATIONS:
+        if version in applied:
+            continue
+
+        with bind.begin() as conn:
+            for step in steps:
+                step(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) "
+                     "VALUES (:version, :description, :applied_at)"),
+                {"version": version, "description": description, "applied_at": datetime.utcnow()}
+            )
+
+        logger.info(f"Applied migration {version}: {description}")
+        newly_applied.append(version)
+
+    return newly_applied
+
+
+if __name__ == "__main__":
+    from .database import Base
+    from . import models  # noqa: F401  (register tables)
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    versions = run_migrations()
+    print(f"Applied migrations: {versions}" if versions else "Database schema is up to date.")
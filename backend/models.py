@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Boolean, ForeignKey, Enum, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -18,9 +18,11 @@ class User(Base):
     phone_number = Column(String)
     
     # Engagement Logic Fields
-    last_active_at = Column(DateTime, default=datetime.utcnow)
+    last_active_at = Column(DateTime, default=datetime.utcnow, index=True)
     churn_risk_score = Column(Float, default=0.0) # 0.0 to 1.0 (Higher is riskier)
+    churn_scored_at = Column(DateTime, nullable=True, index=True) # When churn_risk_score was last computed (backend/churn.py)
     segment = Column(String, default="new_user") # e.g., "dormant", "power_user"
+    recent_templates = Column(Integer, default=0) # Packed ring of recent template IDs (message_generation.variants)
     
     # Relationship to messages
     messages = relationship("MessageLog", back_populates="user")
@@ -35,4 +37,109 @@ class MessageLog(Base):
     sent_at = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="sent") # 'sent', 'delivered', 'read'
 
+    # Decision context at send time (empty when not applicable)
+    tone = Column(String, default="") # e.g. "playful", "welcome_back"
+    segment = Column(String, default="") # e.g. "dormant", "loyal"
+    template_id = Column(Integer, nullable=True) # Engagement template variant (ENGAGEMENT_TEMPLATES ID)
+
+    # Interaction tracking (set by /analytics/track)
+    opened = Column(Boolean, default=False)
+    opened_at = Column(DateTime, nullable=True)
+    clicked = Column(Boolean, default=False)
+    clicked_at = Column(DateTime, nullable=True)
+    reactivated = Column(Boolean, default=False) # User came back after this message
+
     user = relationship("User", back_populates="messages")
+
+    # Hot paths: per-user history/frequency checks, time-range analytics and
+    # "opened/clicked since" lookups for churn scoring (partial: most rows are NULL)
+    __table_args__ = (
+        Index("ix_message_logs_user_id_sent_at", user_id, sent_at.desc()),
+        Index("ix_message_logs_sent_at", sent_at),
+        Index("ix_message_logs_type_sent_at", type, sent_at),
+        Index("ix_message_logs_opened_at", opened_at,
+              sqlite_where=opened_at.isnot(None), postgresql_where=opened_at.isnot(None)),
+        Index("ix_message_logs_clicked_at", clicked_at,
+              sqlite_where=clicked_at.isnot(None), postgresql_where=clicked_at.isnot(None)),
+    )
+
+class EngagementCycleRun(Base):
+    """Checkpoint for a chunked engagement cycle, committed with every chunk."""
+    __tablename__ = "engagement_cycle_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    status = Column(String, default="running") # 'running', 'completed', 'failed'
+    heartbeat_at = Column(DateTime, nullable=True) # Last claim or committed chunk; stale 'running' runs are resumable
+    last_user_id = Column(Integer, default=0) # Keyset position of the last committed chunk
+    users_processed = Column(Integer, default=0)
+    messages_sent = Column(Integer, default=0)
+    users_skipped = Column(Integer, default=0)
+    template_arms = Column(JSON, nullable=True) # Bandit arm counts frozen for the run: [[segment, tone, template_id, trials, successes], ...]
+
+class BroadcastJob(Base):
+    """A mass send, stored once. Per-recipient state lives in BroadcastDelivery."""
+    __tablename__ = "broadcast_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    broadcast_type = Column(String) # Key from BROADCAST_TEMPLATES
+    template = Column(String)
+    context = Column(JSON, nullable=True)
+    content = Column(String) # Rendered once for every recipient
+    priority = Column(String)
+    channel = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    recipient_count = Column(Integer, default=0)
+
+    deliveries = relationship("BroadcastDelivery", back_populates="job")
+
+class BroadcastDelivery(Base):
+    """Compact per-recipient delivery state for a BroadcastJob."""
+    __tablename__ = "broadcast_deliveries"
+
+    job_id = Column(Integer, ForeignKey("broadcast_jobs.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    status = Column(String, default="sent") # 'sent', 'delivered', 'read'
+
+    # Interaction tracking (set by /analytics/track/broadcast)
+    opened = Column(Boolean, default=False)
+    opened_at = Column(DateTime, nullable=True)
+    clicked = Column(Boolean, default=False)
+    clicked_at = Column(DateTime, nullable=True)
+
+    job = relationship("BroadcastJob", back_populates="deliveries")
+
+    __table_args__ = (
+        Index("ix_broadcast_deliveries_user_id", user_id),
+        {"sqlite_with_rowid": False},
+    )
+
+class EngagementRollup(Base):
+    """Daily engagement counters, maintained incrementally (see backend/rollups.py)."""
+    __tablename__ = "engagement_rollups"
+
+    day = Column(Date, primary_key=True) # Day the message was sent
+    message_type = Column(String, primary_key=True) # MessageType value
+    tone = Column(String, primary_key=True, default="")
+    segment = Column(String, primary_key=True, default="")
+
+    sent = Column(Integer, default=0)
+    opened = Column(Integer, default=0)
+    clicked = Column(Integer, default=0)
+    reactivated = Column(Integer, default=0)
+
+class TemplateArm(Base):
+    """Sends and opens per template variant and audience (see backend/template_arms.py)."""
+    __tablename__ = "template_arms"
+
+    segment = Column(String, primary_key=True, default="")
+    tone = Column(String, primary_key=True, default="")
+    template_id = Column(Integer, primary_key=True) # ENGAGEMENT_TEMPLATES ID
+
+    trials = Column(Integer, default=0) # Messages sent
+    successes = Column(Integer, default=0) # Messages opened
+
+    __table_args__ = (
+        {"sqlite_with_rowid": False},
+    )
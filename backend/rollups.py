@@ -0,0 +1,200 @@
+"""
+Engagement Rollups
+
+Maintains the `engagement_rollups` table: daily counters keyed by
+(day, message_type, tone, segment) -> sent / opened / clicked / reactivated.
+
+Counters are bumped in the same transaction as the write that caused them
+(message insert, open/click tracking, reactivation), so analytics can read
+a few hundred summary rows instead of scanning raw message_logs.
+Interactions are attributed to the day the message was sent, which keeps
+the rollup identical to an aggregation over the raw logs.
+
+Rebuild from raw logs (e.g. after a manual data fix):
+    python -m backend.rollups
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+RollupKey = Tuple[object, str, str, str] # (day, message_type, tone, segment)
+
+COUNTERS = ("sent", "opened", "clicked", "reactivated")
+
+
+def _type_value(message_type) -> str:
+    return message_type.value if isinstance(message_type, models.MessageType) else str(message_type)
+
+
+def rollup_key(sent_at: datetime, message_type, tone: str = "", segment: str = "") -> RollupKey:
+    """Build the rollup key for a message."""
+    return (sent_at.date(), _type_value(message_type), tone or "", segment or "")
+
+
+def apply_rollup_deltas(db: Session, deltas: Dict[RollupKey, Dict[str, int]]) -> None:
+    """
+    Add counter deltas to the rollup table with a single upsert (executemany).
+    
+    Args:
+        db: Database session (the caller commits)
+        deltas: Mapping of rollup key -> {counter: increment}
+    """
+    if not deltas:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+
+    rows = []
+    for (day, message_type, tone, segment), counts in deltas.items():
+        row = {"day": day, "message_type": message_type, "tone": tone, "segment": segment}
+        row.update({counter: counts.get(counter, 0) for counter in COUNTERS})
+        rows.append(row)
+
+    stmt = upsert(models.EngagementRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "message_type", "tone", "segment"],
+        set_={
+            counter: getattr(models.EngagementRollup, counter) + stmt.excluded[counter]
+            for counter in COUNTERS
+        }
+    )
+    db.execute(stmt, rows)
+
+
+def record_messages_sent(db: Session, messages: Iterable[dict]) -> None:
+    """
+    Count newly inserted messages.
+    
+    Args:
+        db: Database session
+        messages: Row dicts with sent_at, type and optionally tone, segment
+    """
+    deltas: Dict[RollupKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for message in messages:
+        key = rollup_key(
+            message.get("sent_at") or datetime.utcnow(),
+            message["type"],
+            message.get("tone", ""),
+            message.get("segment", "")
+        )
+        deltas[key]["sent"] += 1
+    apply_rollup_deltas(db, deltas)
+
+
+def record_broadcast_sent(db: Session, job: models.BroadcastJob) -> None:
+    """Count a broadcast job's recipients as sent utility messages."""
+    key = rollup_key(job.created_at, models.MessageType.USER_UTILITY_SYSTEM)
+    apply_rollup_deltas(db, {key: {"sent": job.recipient_count}})
+
+
+def record_interaction(db: Session, message: models.MessageLog, opened: bool = False, clicked: bool = False, reactivated: bool = False) -> None:
+    """
+    Count state transitions of a single message (pass only flags that just flipped).
+    """
+    counts = {"opened": int(opened), "clicked": int(clicked), "reactivated": int(reactivated)}
+    if not any(counts.values()):
+        return
+    key = rollup_key(message.sent_at, message.type, message.tone, message.segment)
+    apply_rollup_deltas(db, {key: counts})
+
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Rebuild the rollup table from raw message_logs and broadcast jobs/deliveries.
+    
+    The aggregation itself runs in SQL; only the grouped rows are upserted.
+    
+    Returns:
+        Number of rollup rows written
+    """
+    def flag_count(column):
+        return func.coalesce(func.sum(case((column == True, 1), else_=0)), 0)
+
+    message_day = func.date(models.MessageLog.sent_at)
+    message_rows = db.query(
+        message_day,
+        models.MessageLog.type,
+        func.coalesce(models.MessageLog.tone, ""),
+        func.coalesce(models.MessageLog.segment, ""),
+        func.count(models.MessageLog.id),
+        flag_count(models.MessageLog.opened),
+        flag_count(models.MessageLog.clicked),
+        flag_count(models.MessageLog.reactivated)
+    ).group_by(
+        message_day,
+        models.MessageLog.type,
+        func.coalesce(models.MessageLog.tone, ""),
+        func.coalesce(models.MessageLog.segment, "")
+    ).all()
+
+    job_day = func.date(models.BroadcastJob.created_at)
+    broadcast_rows = db.query(
+        job_day,
+        func.coalesce(func.sum(models.BroadcastJob.recipient_count), 0)
+    ).group_by(job_day).all()
+
+    delivery_rows = db.query(
+        job_day,
+        flag_count(models.BroadcastDelivery.opened),
+        flag_count(models.BroadcastDelivery.clicked)
+    ).join(
+        models.BroadcastJob, models.BroadcastJob.id == models.BroadcastDelivery.job_id
+    ).filter(
+        (models.BroadcastDelivery.opened == True) | (models.BroadcastDelivery.clicked == True)
+    ).group_by(job_day).all()
+
+    deltas: Dict[RollupKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for day, message_type, tone, segment, sent, opened, clicked, reactivated in message_rows:
+        key = (_as_date(day), _type_value(message_type), tone, segment)
+        counts = deltas[key]
+        counts["sent"] += sent
+        counts["opened"] += opened
+        counts["clicked"] += clicked
+        counts["reactivated"] += reactivated
+    for day, sent in broadcast_rows:
+        key = (_as_date(day), models.MessageType.USER_UTILITY_SYSTEM.value, "", "")
+        deltas[key]["sent"] += sent
+    for day, opened, clicked in delivery_rows:
+        key = (_as_date(day), models.MessageType.USER_UTILITY_SYSTEM.value, "", "")
+        deltas[key]["opened"] += opened
+        deltas[key]["clicked"] += clicked
+
+    db.query(models.EngagementRollup).delete()
+    apply_rollup_deltas(db, deltas)
+    return len(deltas)
+
+
+def _as_date(value):
+    """date() comes back as a string on SQLite and a date on PostgreSQL."""
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    return value
+
+
+if __name__ == "__main__":
+    from .database import Base, SessionLocal, engine
+    from .migrations import run_migrations
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        count = rebuild_rollups(db)
+        db.commit()
+        print(f"Rebuilt engagement rollups: {count} rows.")
+    finally:
+        db.close()
@@ -0,0 +1,267 @@
+"""
+Engagement Scheduler
+
+Runs the engagement cycle continuously in the background instead of as a
+manual /run-engagement-cycle/ call that rescans the whole users table.
+
+Every user sits in a min-heap keyed by their next eligibility time
+(last_active_at + INACTIVITY_THRESHOLD_SECONDS, last message +
+MESSAGE_FREQUENCY_MINUTES). Each tick:
+
+1. Picks up users created since the last tick (keyset on id)
+2. Pops users whose timers have expired (up to batch_size x max_batches)
+   and orders them by churn_risk_score, highest first, so at-risk users
+   are messaged first when a tick has more due users than it can send
+3. Looks those users up batch by batch (backend/user_state.py cache), re-schedules the ones whose deadline moved
+   (they were active again), and engages the rest via engage_users()
+
+Work per tick is proportional to the number of users becoming eligible,
+not to the total number of users. The full table is read once, at start.
+
+Each user has one current deadline (_deadlines); re-scheduling a user
+pushes a new heap entry and the superseded one is dropped when popped.
+Deadlines read at load time can still be stale (activity or a new message
+pushes them out), so due users are re-checked against the database and
+pushed back with their real deadline. The activity tracker also schedules
+users the moment its timing wheel sees them cross the inactivity threshold
+or a segment rule threshold (backend/activity.py).
+"""
+
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+
+from . import models
+from .background import PeriodicWorker
+from .database import SessionLocal
+from .engagement_cycle import engage_users
+from .user_state import get_user_states
+
+logger = logging.getLogger(__name__)
+
+# Off by default: when on, the server sends real messages on its own every tick
+ENGAGEMENT_SCHEDULER_ENABLED = os.getenv("ENGAGEMENT_SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+ENGAGEMENT_SCHEDULER_INTERVAL_MS = int(os.getenv("ENGAGEMENT_SCHEDULER_INTERVAL_MS", "1000"))
+ENGAGEMENT_SCHEDULER_BATCH_SIZE = int(os.getenv("ENGAGEMENT_SCHEDULER_BATCH_SIZE", "500"))
+ENGAGEMENT_SCHEDULER_MAX_BATCHES = int(os.getenv("ENGAGEMENT_SCHEDULER_MAX_BATCHES", "10"))
+
+# Rows fetched per round-trip while loading the initial schedule
+LOAD_CHUNK_SIZE = 10000
+
+
+class EngagementScheduler(PeriodicWorker):
+    """
+    Priority queue of users by next eligibility time, drained in bounded batches.
+    """
+
+    name = "engagement-scheduler"
+    # Shutting down should not send one last round of messages
+    flush_on_stop = False
+
+    def __init__(
+        self,
+        session_factory,
+        enabled: bool = ENGAGEMENT_SCHEDULER_ENABLED,
+        tick_interval_ms: int = ENGAGEMENT_SCHEDULER_INTERVAL_MS,
+        batch_size: int = ENGAGEMENT_SCHEDULER_BATCH_SIZE,
+        max_batches: int = ENGAGEMENT_SCHEDULER_MAX_BATCHES
+    ):
+        super().__init__(tick_interval_ms / 1000)
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[datetime, int]] = []
+        self._deadlines: Dict[int, datetime] = {}
+        self._last_user_id = 0
+
+        # Monitoring
+        self.users_evaluated = 0
+        self.messages_sent = 0
+        self.rescheduled = 0
+
+    def start(self) -> None:
+        """Build the schedule from the database and start ticking."""
+        if not self.enabled or self.running:
+            return
+        self.load()
+        super().start()
+
+    def schedule(self, user_id: int, eligible_at: datetime) -> None:
+        """Queue a user to be evaluated at `eligible_at` (replaces their current deadline)."""
+        self.schedule_many([user_id], eligible_at)
+
+    def schedule_many(self, user_ids: Iterable[int], eligible_at: datetime) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                if self._deadlines.get(user_id) != eligible_at:
+                    self._deadlines[user_id] = eligible_at
+                    heapq.heappush(self._heap, (eligible_at, user_id))
+
+    def load(self) -> int:
+        """Queue every user not yet scheduled (all of them on first call)."""
+        db = self.session_factory()
+        try:
+            return self._discover(db)
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        """Run one tick: discover new users, then engage due users batch by batch."""
+        db = self.session_factory()
+        try:
+            self._discover(db)
+
+            due = self._pop_due(datetime.utcnow(), self.batch_size * self.max_batches)
+            due = self._by_risk(db, due)
+
+            sent = 0
+            for start in range(0, len(due), self.batch_size):
+                try:
+                    sent += self._process(db, due[start:start + self.batch_size])
+                except Exception:
+                    # The failed batch is re-queued by _process; keep the rest too
+                    retry_at = datetime.utcnow() + timedelta(seconds=self.interval)
+                    for user_id in due[start + self.batch_size:]:
+                        self.schedule(user_id, retry_at)
+                    raise
+                db.expunge_all()
+            return sent
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": len(self._deadlines),
+                "users_evaluated": self.users_evaluated,
+                "messages_sent": self.messages_sent,
+                "rescheduled": self.rescheduled
+            }
+
+    def _discover(self, db) -> int:
+        """Schedule users with an id above the watermark (keyset, chunked)."""
+        from engagement_agent import get_recent_message_times, next_eligible_at
+
+        discovered = 0
+        while True:
+            rows = db.execute(
+                select(models.User.id, models.User.last_active_at)
+                .where(models.User.id > self._last_user_id)
+                .order_by(models.User.id)
+                .limit(LOAD_CHUNK_SIZE)
+            ).all()
+            if not rows:
+                break
+
+            recent = get_recent_message_times(db, user_id_range=(rows[0].id, rows[-1].id))
+            entries = [(next_eligible_at(row.last_active_at, recent.get(row.id)), row.id) for row in rows]
+            with self._lock:
+                for eligible_at, user_id in entries:
+                    self._deadlines[user_id] = eligible_at
+                if len(entries) > len(self._heap):
+                    # Initial load: one O(n) heapify beats n pushes
+                    self._heap.extend(entries)
+                    heapq.heapify(self._heap)
+                else:
+                    # A few new users on a later tick: O(k log n), not O(n)
+                    for entry in entries:
+                        heapq.heappush(self._heap, entry)
+
+            self._last_user_id = rows[-1].id
+            discovered += len(rows)
+            if len(rows) < LOAD_CHUNK_SIZE:
+                break
+
+        if discovered:
+            logger.info(f"Scheduled {discovered} new users for engagement")
+        return discovered
+
+    def _pop_due(self, now: datetime, limit: int) -> List[int]:
+        due = []
+        with self._lock:
+            while self._heap and len(due) < limit and self._heap[0][0] <= now:
+                eligible_at, user_id = heapq.heappop(self._heap)
+                # Skip entries superseded by a later schedule() call
+                if self._deadlines.get(user_id) == eligible_at:
+                    del self._deadlines[user_id]
+                    due.append(user_id)
+        return due
+
+    def _by_risk(self, db, user_ids: List[int]) -> List[int]:
+        """Order users by churn_risk_score, highest first (ties keep heap order)."""
+        if not user_ids:
+            return user_ids
+
+        # Also warms the state cache for _process
+        states = get_user_states(db, user_ids)
+        return sorted(
+            user_ids,
+            key=lambda user_id: -(states[user_id].churn_risk_score if user_id in states else 0.0)
+        )
+
+    def _process(self, db, user_ids: List[int]) -> int:
+        """Engage the due users whose deadline still holds; re-queue the rest."""
+        from engagement_agent import EvaluationContext, next_eligible_at
+
+        context = EvaluationContext.create()
+        now = context.now
+        # Cached user state where available; only the misses are read
+        users = list(get_user_states(db, user_ids).values())
+        recent = {
+            user.id: user.last_message_at
+            for user in users
+            if user.last_message_at is not None and user.last_message_at >= context.recent_message_cutoff
+        }
+
+        # Users active (or messaged) since they were queued have a later deadline
+        ready = []
+        last_active = {}
+        for user in users:
+            last_active[user.id] = user.last_active_at
+            eligible_at = next_eligible_at(user.last_active_at, recent.get(user.id))
+            if eligible_at > now:
+                self.schedule(user.id, eligible_at)
+                self.rescheduled += 1
+            else:
+                ready.append(user)
+
+        if not ready:
+            return 0
+
+        try:
+            # The batch's recent-message lookup is already loaded
+            _, message_rows = engage_users(db, ready, context.with_recent_message_times(recent))
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the batch back so the next tick retries it
+            retry_at = now + timedelta(seconds=self.interval)
+            for user in ready:
+                self.schedule(user.id, retry_at)
+            raise
+
+        # Users are expired after the commit; use the values read above
+        sent_at = {row["user_id"]: row["sent_at"] for row in message_rows}
+        min_retry = now + timedelta(seconds=self.interval)
+        for user in ready:
+            eligible_at = next_eligible_at(last_active[user.id], sent_at.get(user.id, recent.get(user.id)))
+            # Never re-queue into the past, or a boundary case would spin
+            self.schedule(user.id, max(eligible_at, min_retry))
+
+        self.users_evaluated += len(ready)
+        self.messages_sent += len(message_rows)
+        if message_rows:
+            logger.info(f"Scheduler sent {len(message_rows)} engagement messages ({len(ready)} users due)")
+        return len(message_rows)
+
+
+# Process-wide scheduler started from the app lifespan
+engagement_scheduler = EngagementScheduler(SessionLocal)
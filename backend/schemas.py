@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -37,8 +37,11 @@ class MessageLogCreate(MessageLogBase):
     user_id: int
 
 class MessageLogResponse(MessageLogBase):
-    id: int
+    id: Optional[int] = None # None for broadcast deliveries
     sent_at: datetime
+    broadcast_job_id: Optional[int] = None # With the user ID, the key for /analytics/track/broadcast
+    opened: Optional[bool] = None
+    clicked: Optional[bool] = None
 
     class Config:
         from_attributes = True
@@ -51,3 +54,15 @@ class UtilityReminderRequest(BaseModel):
 class BroadcastRequest(BaseModel):
     broadcast_type: str
     context_data: Optional[dict] = None
+
+# Tracking Schemas
+class TrackEvent(BaseModel):
+    message_id: Optional[int] = None
+    action: str # "open" or "click"
+    timestamp: Optional[datetime] = None # When the interaction happened on the device
+    # Broadcast deliveries have no message ID; they are keyed by job and recipient
+    broadcast_job_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+class TrackBatchRequest(BaseModel):
+    events: List[TrackEvent] = Field(..., max_length=10000)
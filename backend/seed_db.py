@@ -1,9 +1,11 @@
 from datetime import datetime, timedelta
 from .database import SessionLocal, engine, Base
 from . import models
+from .migrations import run_migrations
 
-# Ensure tables are created
+# Ensure tables are created and up to date
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 def seed_data():
     db = SessionLocal()
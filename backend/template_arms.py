@@ -0,0 +1,204 @@
+"""
+Template Arms
+
+Persists the counts behind the template bandit (message_generation/bandit.py)
+in the `template_arms` table: one row per (segment, tone, template_id) with
+trials (messages sent) and successes (messages opened).
+
+Counts are bumped with the same upsert pattern as the rollups, in the
+transaction that sent or opened the message. The in-memory bandit is loaded
+from the table at startup and re-read every TEMPLATE_BANDIT_REFRESH_SECONDS
+(one row per arm, so a few dozen rows).
+
+A chunked engagement cycle run stores the arm counts it started with
+(engagement_cycle_runs.template_arms) and allocates every chunk from them,
+so a resumed run picks the same variants it would have picked the first
+time. The background scheduler uses the shared, periodically refreshed bandit.
+
+Set TEMPLATE_BANDIT_ENABLED=false to fall back to the deterministic
+hash-based rotation (message_generation/variants.py).
+
+Rebuild from raw logs:
+    python -m backend.template_arms
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from message_generation.bandit import ArmKey, TemplateBandit
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_BANDIT_ENABLED = os.getenv("TEMPLATE_BANDIT_ENABLED", "true").lower() in ("1", "true", "yes")
+TEMPLATE_BANDIT_REFRESH_SECONDS = float(os.getenv("TEMPLATE_BANDIT_REFRESH_SECONDS", "30"))
+
+COUNTERS = ("trials", "successes")
+
+
+def arm_key(segment: str, tone: str, template_id: int) -> ArmKey:
+    return (segment or "", tone or "", template_id)
+
+
+def apply_arm_deltas(db: Session, deltas: Dict[ArmKey, Dict[str, int]]) -> None:
+    """
+    Add counter deltas to the arm table with a single upsert (executemany).
+    
+    Args:
+        db: Database session (the caller commits)
+        deltas: Mapping of arm key -> {counter: increment}
+    """
+    if not deltas:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+
+    rows = []
+    for (segment, tone, template_id), counts in deltas.items():
+        row = {"segment": segment, "tone": tone, "template_id": template_id}
+        row.update({counter: counts.get(counter, 0) for counter in COUNTERS})
+        rows.append(row)
+
+    stmt = upsert(models.TemplateArm)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["segment", "tone", "template_id"],
+        set_={
+            counter: getattr(models.TemplateArm, counter) + stmt.excluded[counter]
+            for counter in COUNTERS
+        }
+    )
+    db.execute(stmt, rows)
+
+
+def record_template_sends(db: Session, messages: Iterable[dict]) -> None:
+    """
+    Count newly inserted messages as trials of their template arm.
+    
+    Args:
+        db: Database session
+        messages: Row dicts with segment, tone and template_id (rows without
+            a template_id are ignored)
+    """
+    deltas: Dict[ArmKey, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for message in messages:
+        if message.get("template_id") is not None:
+            key = arm_key(message.get("segment"), message.get("tone"), message["template_id"])
+            deltas[key]["trials"] += 1
+    apply_arm_deltas(db, deltas)
+
+
+def load_arms(db: Session) -> Dict[ArmKey, tuple]:
+    """All arms as {(segment, tone, template_id): (trials, successes)}."""
+    table = models.TemplateArm.__table__
+    rows = db.execute(select(table.c.segment, table.c.tone, table.c.template_id, table.c.trials, table.c.successes))
+    return {(row.segment, row.tone, row.template_id): (row.trials or 0, row.successes or 0) for row in rows}
+
+
+def rebuild_template_arms(db: Session) -> int:
+    """
+    Rebuild the arm table from raw message_logs.
+    
+    Returns:
+        Number of arm rows written
+    """
+    rows = db.query(
+        func.coalesce(models.MessageLog.segment, ""),
+        func.coalesce(models.MessageLog.tone, ""),
+        models.MessageLog.template_id,
+        func.count(models.MessageLog.id),
+        func.coalesce(func.sum(case((models.MessageLog.opened == True, 1), else_=0)), 0)
+    ).filter(
+        models.MessageLog.template_id.isnot(None)
+    ).group_by(
+        func.coalesce(models.MessageLog.segment, ""),
+        func.coalesce(models.MessageLog.tone, ""),
+        models.MessageLog.template_id
+    ).all()
+
+    deltas = {
+        (segment, tone, template_id): {"trials": trials, "successes": successes}
+        for segment, tone, template_id, trials, successes in rows
+    }
+    db.query(models.TemplateArm).delete()
+    apply_arm_deltas(db, deltas)
+    return len(deltas)
+
+
+# ---------------------------------------------------
+# Shared Bandit
+# ---------------------------------------------------
+
+template_bandit = TemplateBandit()
+
+_refresh_lock = threading.Lock()
+_loaded_at: Optional[float] = None
+
+
+def refresh_template_bandit(db: Session, force: bool = False) -> None:
+    """Reload the shared bandit from the arm table if it is stale (or `force`)."""
+    global _loaded_at
+
+    now = time.monotonic()
+    if not force and _loaded_at is not None and now - _loaded_at < TEMPLATE_BANDIT_REFRESH_SECONDS:
+        return
+    with _refresh_lock:
+        if not force and _loaded_at is not None and now - _loaded_at < TEMPLATE_BANDIT_REFRESH_SECONDS:
+            return
+        template_bandit.load(load_arms(db))
+        _loaded_at = now
+
+
+def get_template_bandit(db: Session) -> Optional[TemplateBandit]:
+    """
+    The shared bandit, refreshed if stale, or None when the bandit is disabled.
+    """
+    if not TEMPLATE_BANDIT_ENABLED:
+        return None
+    refresh_template_bandit(db)
+    return template_bandit
+
+
+def snapshot_arms(bandit: TemplateBandit) -> List[list]:
+    """A bandit's arm counts as JSON rows: [segment, tone, template_id, trials, successes]."""
+    return [
+        [segment, tone, template_id, trials, successes]
+        for (segment, tone, template_id), (trials, successes) in bandit.arms.items()
+    ]
+
+
+def bandit_from_snapshot(rows: Iterable[Sequence]) -> TemplateBandit:
+    """A bandit frozen at the arm counts of a snapshot_arms() result."""
+    bandit = TemplateBandit()
+    bandit.load({
+        (segment, tone, template_id): (trials, successes)
+        for segment, tone, template_id, trials, successes in rows
+    })
+    return bandit
+
+
+if __name__ == "__main__":
+    from .database import Base, SessionLocal, engine
+    from .migrations import run_migrations
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    db = SessionLocal()
+    try:
+        count = rebuild_template_arms(db)
+        db.commit()
+        print(f"Rebuilt template arms: {count} rows.")
+    finally:
+        db.close()
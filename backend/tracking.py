@@ -0,0 +1,408 @@
+"""
+Interaction Tracking (open/click events)
+
+Two pieces:
+
+1. apply_interactions() - applies a batch of open/click events with one
+   SELECT and at most one executemany UPDATE per action type, keeping the
+   existing rules: repeated opens/clicks are no-ops (idempotent) and a
+   click implies an open. Events target a message_logs row, or a broadcast
+   delivery identified by (broadcast_job_id, user_id).
+
+2. InteractionBuffer - a write-behind buffer. The tracking endpoint only
+   appends the event; a background thread coalesces pending events and
+   applies them every TRACKING_FLUSH_INTERVAL_MS or as soon as
+   TRACKING_FLUSH_MAX_EVENTS are waiting.
+
+Durability (TRACKING_DURABILITY):
+- "sync":   no buffer, every event is applied in the request (old behaviour)
+- "memory": buffered in memory only; pending events are lost on a crash
+- "log":    also appended to an append-only local log (TRACKING_LOG_PATH),
+            replayed on startup; survives process crashes
+- "fsync":  like "log" but fsyncs each append; survives power loss
+
+Because applying is idempotent, replaying a log that was partly applied
+before a crash is safe.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .background import PeriodicWorker
+from .database import SessionLocal
+from .rollups import apply_rollup_deltas, rollup_key
+from .template_arms import apply_arm_deltas, arm_key
+
+logger = logging.getLogger(__name__)
+
+TRACKING_DURABILITY = os.getenv("TRACKING_DURABILITY", "log")
+TRACKING_FLUSH_INTERVAL_MS = int(os.getenv("TRACKING_FLUSH_INTERVAL_MS", "500"))
+TRACKING_FLUSH_MAX_EVENTS = int(os.getenv("TRACKING_FLUSH_MAX_EVENTS", "1000"))
+TRACKING_LOG_PATH = os.getenv("TRACKING_LOG_PATH", "./tracking_events.log")
+
+# Max IDs per IN (...) lookup (stays under SQLite's bound-parameter limit)
+LOOKUP_CHUNK_SIZE = 500
+
+TRACKED_ACTIONS = ("open", "click")
+
+# Compact per-item result codes for batch tracking
+RESULT_CODES = {"tracked": 1, "duplicate": 0, "not_found": -1, "invalid": -2}
+
+
+@dataclass(frozen=True)
+class InteractionEvent:
+    message_id: Optional[int]  # None for broadcast deliveries
+    action: str  # "open" or "click"
+    timestamp: datetime
+    broadcast_job_id: Optional[int] = None  # Set, with user_id, for broadcast deliveries
+    user_id: Optional[int] = None
+
+    @property
+    def key(self) -> Optional[Hashable]:
+        """
+        The tracked row: a message ID, or (broadcast_job_id, user_id) for a
+        delivery. None when the event does not identify a row.
+        """
+        if self.broadcast_job_id is not None:
+            return None if self.user_id is None else (self.broadcast_job_id, self.user_id)
+        return self.message_id
+
+
+# ---------------------------------------------------
+# Set-based Apply
+# ---------------------------------------------------
+
+def apply_interactions(db: Session, events: Sequence[InteractionEvent]) -> List[str]:
+    """
+    Apply open/click events in bulk.
+    
+    Events are coalesced per tracked row (earliest timestamp wins), current
+    flags are read in one pass, and only real transitions are written and
+    counted in the rollups. The caller commits.
+    
+    Each transition is credited to the one event that caused it: the
+    earliest open-or-click opens a row, the earliest click clicks it.
+    
+    Args:
+        db: Database session
+        events: Interaction events
+        
+    Returns:
+        One outcome per event, in order: "tracked" (the event's own action
+        changed the row), "duplicate" (already recorded, or recorded by
+        another event in the batch), "not_found", or "invalid" (unknown
+        action or target)
+    """
+    # Tracked row -> (timestamp, event index) of the event that wins the transition
+    opens: Dict[Hashable, Tuple[datetime, int]] = {}
+    clicks: Dict[Hashable, Tuple[datetime, int]] = {}
+    for index, event in enumerate(events):
+        key = event.key
+        if key is None or event.action not in TRACKED_ACTIONS:
+            continue
+        candidate = (event.timestamp, index)
+        if event.action == "click":
+            clicks[key] = min(candidate, clicks.get(key, candidate))
+        # Both opens and clicks open the message
+        opens[key] = min(candidate, opens.get(key, candidate))
+
+    # Tracked row -> transitions applied ("open", "click"); absent when not found
+    applied: Dict[Hashable, Set[str]] = {}
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    message_ids = [key for key in opens if not isinstance(key, tuple)]
+    if message_ids:
+        _apply_message_interactions(db, message_ids, opens, clicks, applied, deltas)
+    delivery_keys = [key for key in opens if isinstance(key, tuple)]
+    if delivery_keys:
+        _apply_delivery_interactions(db, delivery_keys, opens, clicks, applied, deltas)
+
+    apply_rollup_deltas(db, deltas)
+
+    outcomes = []
+    for index, event in enumerate(events):
+        key = event.key
+        if key is None or event.action not in TRACKED_ACTIONS:
+            outcomes.append("invalid")
+        elif key not in applied:
+            outcomes.append("not_found")
+        elif any(
+            action in applied[key] and winners[key][1] == index
+            for action, winners in (("open", opens), ("click", clicks))
+        ):
+            outcomes.append("tracked")
+        else:
+            outcomes.append("duplicate")
+    return outcomes
+
+
+def _apply_message_interactions(db: Session, message_ids, opens, clicks, applied, deltas) -> None:
+    table = models.MessageLog.__table__
+    open_updates = []
+    click_updates = []
+    arm_deltas = defaultdict(lambda: defaultdict(int))
+
+    for start in range(0, len(message_ids), LOOKUP_CHUNK_SIZE):
+        rows = db.execute(
+            select(
+                table.c.id, table.c.opened, table.c.clicked,
+                table.c.sent_at, table.c.type, table.c.tone, table.c.segment,
+                table.c.template_id
+            ).where(table.c.id.in_(message_ids[start:start + LOOKUP_CHUNK_SIZE]))
+        )
+        for row in rows:
+            applied[row.id] = set()
+            key = rollup_key(row.sent_at, row.type, row.tone, row.segment)
+
+            if not row.opened:
+                open_updates.append({"message_id": row.id, "ts": opens[row.id][0]})
+                deltas[key]["opened"] += 1
+                if row.template_id is not None:
+                    # An open is a success for the template bandit
+                    arm_deltas[arm_key(row.segment, row.tone, row.template_id)]["successes"] += 1
+                applied[row.id].add("open")
+            if row.id in clicks and not row.clicked:
+                click_updates.append({"message_id": row.id, "ts": clicks[row.id][0]})
+                deltas[key]["clicked"] += 1
+                applied[row.id].add("click")
+
+    # One statement per action type; the flag guard keeps repeats idempotent
+    if open_updates:
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("message_id"))
+            .where((table.c.opened == False) | (table.c.opened.is_(None)))
+            .values(opened=True, opened_at=bindparam("ts")),
+            open_updates
+        )
+    if click_updates:
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("message_id"))
+            .where((table.c.clicked == False) | (table.c.clicked.is_(None)))
+            .values(clicked=True, clicked_at=bindparam("ts")),
+            click_updates
+        )
+
+    apply_arm_deltas(db, arm_deltas)
+
+
+def _apply_delivery_interactions(db: Session, delivery_keys, opens, clicks, applied, deltas) -> None:
+    deliveries = models.BroadcastDelivery.__table__
+    jobs = models.BroadcastJob.__table__
+    open_updates = []
+    click_updates = []
+
+    user_ids_by_job: Dict[int, List[int]] = defaultdict(list)
+    for job_id, user_id in delivery_keys:
+        user_ids_by_job[job_id].append(user_id)
+
+    for job_id, user_ids in user_ids_by_job.items():
+        for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE):
+            rows = db.execute(
+                select(deliveries.c.user_id, deliveries.c.opened, deliveries.c.clicked, jobs.c.created_at)
+                .join(jobs, jobs.c.id == deliveries.c.job_id)
+                .where(deliveries.c.job_id == job_id)
+                .where(deliveries.c.user_id.in_(user_ids[start:start + LOOKUP_CHUNK_SIZE]))
+            )
+            for row in rows:
+                key = (job_id, row.user_id)
+                applied[key] = set()
+                # Counted like record_broadcast_sent: a utility message on the job's day
+                rollup = rollup_key(row.created_at, models.MessageType.USER_UTILITY_SYSTEM)
+
+                if not row.opened:
+                    open_updates.append({"job": job_id, "user": row.user_id, "ts": opens[key][0]})
+                    deltas[rollup]["opened"] += 1
+                    applied[key].add("open")
+                if key in clicks and not row.clicked:
+                    click_updates.append({"job": job_id, "user": row.user_id, "ts": clicks[key][0]})
+                    deltas[rollup]["clicked"] += 1
+                    applied[key].add("click")
+
+    if open_updates:
+        db.execute(
+            update(deliveries)
+            .where(deliveries.c.job_id == bindparam("job"), deliveries.c.user_id == bindparam("user"))
+            .where((deliveries.c.opened == False) | (deliveries.c.opened.is_(None)))
+            .values(opened=True, opened_at=bindparam("ts")),
+            open_updates
+        )
+    if click_updates:
+        db.execute(
+            update(deliveries)
+            .where(deliveries.c.job_id == bindparam("job"), deliveries.c.user_id == bindparam("user"))
+            .where((deliveries.c.clicked == False) | (deliveries.c.clicked.is_(None)))
+            .values(clicked=True, clicked_at=bindparam("ts")),
+            click_updates
+        )
+
+
+# ---------------------------------------------------
+# Write-behind Buffer
+# ---------------------------------------------------
+
+def _encode_event(event: InteractionEvent) -> str:
+    """One JSON line per event in the append-only log."""
+    fields = [event.message_id, event.action, event.timestamp.isoformat()]
+    if event.broadcast_job_id is not None:
+        fields += [event.broadcast_job_id, event.user_id]
+    return json.dumps(fields) + "\n"
+
+class InteractionBuffer(PeriodicWorker):
+    """
+    Collects interaction events and applies them in batches from a background thread.
+    """
+
+    name = "interaction-flusher"
+
+    def __init__(
+        self,
+        session_factory,
+        durability: str = TRACKING_DURABILITY,
+        flush_interval_ms: int = TRACKING_FLUSH_INTERVAL_MS,
+        max_events: int = TRACKING_FLUSH_MAX_EVENTS,
+        log_path: str = TRACKING_LOG_PATH
+    ):
+        super().__init__(flush_interval_ms / 1000)
+        self.session_factory = session_factory
+        self.durability = durability
+        self.max_events = max_events
+        self.log_path = log_path
+
+        self._lock = threading.Lock()
+        self._pending: List[InteractionEvent] = []
+        self._log = None
+
+        # Monitoring
+        self.events_received = 0
+        self.events_flushed = 0
+        self.flushes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.durability != "sync"
+
+    @property
+    def _logging(self) -> bool:
+        return self.durability in ("log", "fsync")
+
+    def start(self) -> None:
+        """Replay any logged events and start the background flusher."""
+        if not self.enabled or self.running:
+            return
+
+        if self._logging:
+            self._pending.extend(self._read_log())
+            self._log = open(self.log_path, "a", encoding="utf-8")
+            if self._pending:
+                logger.info(f"Replaying {len(self._pending)} logged interaction events")
+
+        super().start()
+
+    def stop(self) -> None:
+        """Flush everything still pending and stop the flusher."""
+        if not self.running:
+            return
+        super().stop()
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def submit(self, event: InteractionEvent) -> None:
+        """
+        Queue an event (and append it to the log, depending on durability).
+
+        Without a running flusher (outside the app lifespan, or with
+        durability "sync") nothing would ever apply or log the event, so it
+        is applied synchronously instead.
+        """
+        if not self.running:
+            self._apply([event])
+            return
+
+        with self._lock:
+            if self._log:
+                self._log.write(_encode_event(event))
+                self._log.flush()
+                if self.durability == "fsync":
+                    os.fsync(self._log.fileno())
+            self._pending.append(event)
+            self.events_received += 1
+            if len(self._pending) >= self.max_events:
+                self.wake()
+
+    def flush(self) -> int:
+        """Apply all pending events in one transaction. Returns the number applied."""
+        with self._lock:
+            events, self._pending = self._pending, []
+        if not events:
+            return 0
+
+        try:
+            self._apply(events)
+        except Exception:
+            logger.exception(f"Failed to flush {len(events)} interaction events; will retry")
+            with self._lock:
+                self._pending[:0] = events
+            return 0
+
+        with self._lock:
+            # Keep only what arrived during the flush in the log
+            if self._log:
+                self._log.truncate(0)
+                self._log.writelines(_encode_event(event) for event in self._pending)
+                self._log.flush()
+            self.events_flushed += len(events)
+            self.flushes += 1
+
+        return len(events)
+
+    def _apply(self, events: List[InteractionEvent]) -> None:
+        db = self.session_factory()
+        try:
+            apply_interactions(db, events)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "received": self.events_received,
+            "flushed": self.events_flushed,
+            "flushes": self.flushes
+        }
+
+    def _read_log(self) -> List[InteractionEvent]:
+        if not os.path.exists(self.log_path):
+            return []
+        events = []
+        with open(self.log_path, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    message_id, action, timestamp, *delivery = json.loads(line)
+                    timestamp = datetime.fromisoformat(timestamp)
+                except ValueError:
+                    continue  # Torn last line after a crash
+                events.append(InteractionEvent(message_id, action, timestamp, *delivery))
+        return events
+
+
+# Process-wide buffer used by the tracking endpoint
+interaction_buffer = InteractionBuffer(SessionLocal)
@@ -0,0 +1,254 @@
+"""
+User State Cache
+
+In-process cache of the per-user state the decision paths need, so the
+activity, heartbeat, reminder and scheduler paths can decide without
+reading users and message_logs on every call:
+
+- created_at, last_active_at, churn_risk_score, recent_templates
+- last_message_at: latest message of any type, broadcast deliveries
+  included (frequency limit)
+
+Entries are UserState objects (__slots__), kept in LRU order with a TTL
+(USER_STATE_CACHE_SIZE, USER_STATE_CACHE_TTL_SECONDS). Writers in this
+process update the cached entry after they commit (see update / update_many);
+the TTL bounds how stale an entry can get when another process writes to
+the database directly (e.g. make_users_inactive.py).
+
+With USER_STATE_CACHE_ENABLED=false every lookup reads the database.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+USER_STATE_CACHE_ENABLED = os.getenv("USER_STATE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+USER_STATE_CACHE_SIZE = int(os.getenv("USER_STATE_CACHE_SIZE", "100000"))
+USER_STATE_CACHE_TTL_SECONDS = float(os.getenv("USER_STATE_CACHE_TTL_SECONDS", "60"))
+
+# Max IDs per IN (...) lookup (stays under SQLite's bound-parameter limit)
+LOOKUP_CHUNK_SIZE = 500
+
+
+class UserState:
+    """
+    Cached decision state of one user.
+
+    Has the attributes the decision engine, template allocation and
+    reminder processing read from a User, so it can be passed in its place.
+    """
+
+    __slots__ = (
+        "id", "name", "created_at", "last_active_at", "churn_risk_score", "recent_templates",
+        "last_message_at", "_expires_at"
+    )
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        created_at: datetime,
+        last_active_at: datetime,
+        churn_risk_score: float = 0.0,
+        recent_templates: int = 0,
+        last_message_at: Optional[datetime] = None
+    ):
+        self.id = id
+        self.name = name
+        self.created_at = created_at
+        self.last_active_at = last_active_at
+        self.churn_risk_score = churn_risk_score or 0.0
+        self.recent_templates = recent_templates or 0
+        self.last_message_at = last_message_at
+        self._expires_at = 0.0
+
+    def __repr__(self) -> str:
+        return f"UserState(id={self.id}, last_active_at={self.last_active_at}, last_message_at={self.last_message_at})"
+
+
+class UserStateCache:
+    """
+    Thread-safe LRU cache of UserState with a per-entry TTL.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = USER_STATE_CACHE_ENABLED,
+        max_size: int = USER_STATE_CACHE_SIZE,
+        ttl_seconds: float = USER_STATE_CACHE_TTL_SECONDS
+    ):
+        self.enabled = enabled
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, UserState]" = OrderedDict()
+
+        # Monitoring
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[UserState]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            state = self._entries.get(user_id)
+            if state is None:
+                self.misses += 1
+                return None
+            if state._expires_at <= time.monotonic():
+                del self._entries[user_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return state
+
+    def put(self, state: UserState) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            state._expires_at = time.monotonic() + self.ttl_seconds
+            self._entries[state.id] = state
+            self._entries.move_to_end(state.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, user_id: int, **fields) -> None:
+        """Apply a committed write to the cached entry, if there is one."""
+        with self._lock:
+            state = self._entries.get(user_id)
+            if state is not None:
+                for name, value in fields.items():
+                    setattr(state, name, value)
+
+    def update_many(self, updates: Mapping[int, Mapping[str, object]]) -> None:
+        """update() for many users under one lock."""
+        with self._lock:
+            for user_id, fields in updates.items():
+                state = self._entries.get(user_id)
+                if state is not None:
+                    for name, value in fields.items():
+                        setattr(state, name, value)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+# ---------------------------------------------------
+# Loading
+# ---------------------------------------------------
+
+def load_user_states(db: Session, user_ids: List[int]) -> Dict[int, UserState]:
+    """
+    Read the state of `user_ids` from the database (three queries per chunk).
+    """
+    users = models.User.__table__
+    logs = models.MessageLog.__table__
+    deliveries = models.BroadcastDelivery.__table__
+    jobs = models.BroadcastJob.__table__
+    states: Dict[int, UserState] = {}
+
+    for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE):
+        chunk = user_ids[start:start + LOOKUP_CHUNK_SIZE]
+        rows = db.execute(
+            select(
+                users.c.id, users.c.name, users.c.created_at, users.c.last_active_at,
+                users.c.churn_risk_score, users.c.recent_templates
+            ).where(users.c.id.in_(chunk))
+        )
+        for row in rows:
+            states[row.id] = UserState(
+                row.id, row.name, row.created_at, row.last_active_at,
+                row.churn_risk_score, row.recent_templates
+            )
+
+        last_message = db.execute(
+            select(logs.c.user_id, func.max(logs.c.sent_at))
+            .where(logs.c.user_id.in_(chunk))
+            .group_by(logs.c.user_id)
+        )
+        for user_id, sent_at in last_message:
+            if user_id in states:
+                states[user_id].last_message_at = sent_at
+
+        # Broadcasts are stored once per job; a delivery counts as a message
+        last_broadcast = db.execute(
+            select(deliveries.c.user_id, func.max(jobs.c.created_at))
+            .join(jobs, jobs.c.id == deliveries.c.job_id)
+            .where(deliveries.c.user_id.in_(chunk))
+            .group_by(deliveries.c.user_id)
+        )
+        for user_id, sent_at in last_broadcast:
+            state = states.get(user_id)
+            if state is not None and (state.last_message_at is None or sent_at > state.last_message_at):
+                state.last_message_at = sent_at
+
+    return states
+
+
+def get_user_states(db: Session, user_ids: Iterable[int]) -> Dict[int, UserState]:
+    """
+    State of every existing user in `user_ids`: cached entries first, the
+    misses loaded from the database in bulk and cached.
+    """
+    states: Dict[int, UserState] = {}
+    missing = []
+    for user_id in user_ids:
+        state = user_state_cache.get(user_id)
+        if state is None:
+            missing.append(user_id)
+        else:
+            states[user_id] = state
+
+    if missing:
+        loaded = load_user_states(db, missing)
+        for state in loaded.values():
+            user_state_cache.put(state)
+        states.update(loaded)
+    return states
+
+
+def get_user_state(db: Session, user_id: int) -> Optional[UserState]:
+    """State of one user (None if the user does not exist)."""
+    return get_user_states(db, [user_id]).get(user_id)
+
+
+# Process-wide cache shared by the endpoints and background workers
+user_state_cache = UserStateCache()
@@ -0,0 +1,71 @@
+"""
+Template bandit throughput: variant decisions per second.
+
+Loads arm counts for every (segment, tone, template) and times
+TemplateBandit.select_many over --decisions users at several batch sizes
+(batch size 1 is the per-user cost), plus allocate_messages, which adds
+history blocking and rendering. Target: 100k decisions/s.
+
+    python -m benchmarks.bandit_decisions --decisions 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from message_generation.bandit import TemplateBandit
+from message_generation.prompt_builder import ENGAGEMENT_TEMPLATES, MESSAGE_TEMPLATES, allocate_messages
+from message_generation.variants import blocked_variants
+
+SEGMENTS = ("dormant", "loyal", "normal", "at_risk")
+TONE = "playful"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--decisions", type=int, default=1_000_000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000, 100_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    bandit = TemplateBandit()
+    arms = {}
+    for segment in SEGMENTS:
+        for tone in MESSAGE_TEMPLATES:
+            for template_id in ENGAGEMENT_TEMPLATES.template_ids(tone):
+                trials = int(rng.integers(100, 100_000))
+                arms[(segment, tone, template_id)] = (trials, int(trials * rng.uniform(0.02, 0.4)))
+    bandit.load(arms)
+
+    template_ids = ENGAGEMENT_TEMPLATES.template_ids(TONE)
+    user_ids = np.arange(1, args.decisions + 1)
+    histories = [0] * args.decisions
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        # Batch size 1 is slow; time fewer decisions and report the rate
+        total = min(args.decisions, 100_000) if batch_size < 100 else args.decisions
+        blocked = blocked_variants(histories[:batch_size], template_ids)
+        start = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            batch = user_ids[offset:offset + batch_size]
+            bandit.select_many("dormant", TONE, template_ids, blocked[:len(batch)], batch, 42)
+        seconds = time.perf_counter() - start
+        rows.append((f"select_many, batch {batch_size:,}", total, int(total / seconds)))
+
+    names = [f"User {i}" for i in range(1000)]
+    start = time.perf_counter()
+    for offset in range(0, args.decisions, 1000):
+        batch = user_ids[offset:offset + 1000].tolist()
+        allocate_messages(TONE, batch, names[:len(batch)], 42, histories[:len(batch)], bandit=bandit, segment="dormant")
+    seconds = time.perf_counter() - start
+    rows.append(("allocate_messages (+ render), batch 1,000", args.decisions, int(args.decisions / seconds)))
+
+    print(f"{len(bandit):,} arms, {len(template_ids)} variants per decision")
+    print_table(("path", "decisions", "decisions/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
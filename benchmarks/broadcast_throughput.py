@@ -0,0 +1,68 @@
+"""
+Broadcast write throughput (recipient rows per second).
+
+For each size, seeds a throwaway database with that many users and times
+POST /utility/broadcast, which writes one BroadcastJob plus a compact
+delivery row per recipient with a single INSERT ... SELECT. With --orm-baseline
+the original path (one MessageLog ORM object per recipient, add_all,
+commit) is timed on the same users for comparison.
+
+    python -m benchmarks.broadcast_throughput --sizes 100000,1000000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import print_table, seed_users, use_temp_database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated recipient counts")
+    parser.add_argument("--orm-baseline", action="store_true", help="Also time the per-recipient ORM path")
+    args = parser.parse_args()
+
+    use_temp_database()
+    from fastapi.testclient import TestClient
+
+    from backend import models
+    from backend.app import app
+    from backend.database import SessionLocal, engine
+
+    client = TestClient(app)
+    rows = []
+    seeded = 0
+    for size in sorted(int(value) for value in args.sizes.split(",")):
+        seed_users(engine, size - seeded, first=seeded)
+        seeded = size
+
+        start = time.perf_counter()
+        response = client.post("/utility/broadcast", json={"broadcast_type": "system_update"})
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200 and response.json()["recipient_count"] == size, response.text
+        rows.append((size, "insert-select", elapsed, size / elapsed))
+
+        if args.orm_baseline:
+            db = SessionLocal()
+            try:
+                start = time.perf_counter()
+                db.add_all(
+                    models.MessageLog(
+                        user_id=user_id,
+                        type=models.MessageType.USER_UTILITY_SYSTEM,
+                        content="We've updated our system to improve your experience.",
+                        status="sent"
+                    )
+                    for (user_id,) in db.query(models.User.id)
+                )
+                db.commit()
+                elapsed = time.perf_counter() - start
+            finally:
+                db.close()
+            rows.append((size, "orm add_all", elapsed, size / elapsed))
+
+    print_table(("recipients", "path", "seconds", "rows/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite file, never the demo database.
+backend.database reads DATABASE_URL at import time, so every script calls
+use_temp_database() before importing anything from backend.
+"""
+
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Sequence
+
+
+def use_temp_database(name: str = "benchmark.db") -> str:
+    """Point DATABASE_URL at a fresh file in a temp dir. Returns the file path."""
+    path = os.path.join(tempfile.mkdtemp(prefix="flirting-bench-"), name)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["DATABASE_READ_URL"] = os.environ["DATABASE_URL"]
+    # Benchmarks measure one component; keep the background workers quiet
+    os.environ.setdefault("ENGAGEMENT_SCHEDULER_ENABLED", "false")
+    os.environ.setdefault("CHURN_SCORING_ENABLED", "false")
+    return path
+
+
+def seed_users(engine, count: int, first: int = 0, batch_size: int = 50_000, seed: int = 0) -> None:
+    """Bulk-insert `count` users (numbered from `first`) with spread-out activity and account ages."""
+    import numpy as np
+    from sqlalchemy import insert
+
+    from backend import models
+    from backend.database import Base
+    from backend.migrations import run_migrations
+
+    # Same startup sequence as backend/app.py (no-op once the schema exists)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    rng = np.random.default_rng(seed + first)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for start in range(first, first + count, batch_size):
+            size = min(batch_size, first + count - start)
+            inactive = rng.integers(0, 60 * 24 * 14, size)
+            age = inactive + rng.integers(0, 60 * 24 * 365, size)
+            conn.execute(insert(models.User), [
+                {
+                    "name": f"User {start + i}",
+                    "email": f"user{start + i}@example.com",
+                    "last_active_at": now - timedelta(minutes=int(inactive[i])),
+                    "created_at": now - timedelta(minutes=int(age[i])),
+                    "churn_risk_score": 0.0,
+                    "segment": "normal"
+                }
+                for i in range(size)
+            ])
+
+
+def measure(fn: Callable[[], object], repeat: int = 5) -> List[float]:
+    """Wall-clock seconds of `repeat` calls to fn."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0-100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def median_ms(timings: Sequence[float]) -> float:
+    return statistics.median(timings) * 1000
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (Unix only)."""
+    import resource
+    import sys
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def print_table(headers: Sequence[str], rows: Sequence[Sequence[object]]) -> None:
+    """Print rows as a fixed-width text table."""
+    cells = [[str(h) for h in headers]] + [[_format(value) for value in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for index, row in enumerate(cells):
+        print("  ".join(value.rjust(width) for value, width in zip(row, widths)))
+        if index == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+def _format(value: object) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
@@ -0,0 +1,132 @@
+"""
+HTTP load test for the hot endpoints: p50/p99 latency and requests/second.
+
+--clients concurrent clients (default 500) each loop over a request mix
+for --duration seconds:
+
+    GET  /users/?limit=50               dashboard page
+    POST /users/{id}/activity           activity ping
+    POST /analytics/track/{id}?action=  open/click tracking
+    GET  /messages/{id}                 message history
+
+By default the app runs in-process on a throwaway database seeded with
+--users users (one message each) behind httpx's ASGI transport. Pass --url
+to load a running server instead. To compare before/after, start one
+server from a checkout of the commit before the async port and one from
+this tree (same seeded database), and run the harness against each:
+
+    python -m benchmarks.load_test --clients 500 --duration 30
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --users 1000
+
+Needs httpx (also used by FastAPI's TestClient).
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+from benchmarks.common import percentile, print_table, seed_users, use_temp_database
+
+
+def _seed(users: int) -> None:
+    from sqlalchemy import func, insert, literal, select
+
+    from backend import models
+    from backend.database import engine
+
+    seed_users(engine, users)
+    with engine.begin() as conn:
+        conn.execute(insert(models.MessageLog).from_select(
+            ["user_id", "type", "content", "sent_at", "status"],
+            select(
+                models.User.id,
+                literal(models.MessageType.CLIENT_ENGAGEMENT_BRAND.name),
+                literal("Hey, we miss you!"),
+                func.datetime("now"),
+                literal("sent")
+            )
+        ))
+
+
+def _request(rng: random.Random, users: int):
+    """One (label, method, path) from the request mix."""
+    user_id = rng.randint(1, users)
+    roll = rng.random()
+    if roll < 0.25:
+        return "GET /users/", "GET", f"/users/?limit=50&cursor={rng.randint(0, max(users - 50, 0))}"
+    if roll < 0.5:
+        return "POST /users/{id}/activity", "POST", f"/users/{user_id}/activity"
+    if roll < 0.75:
+        action = rng.choice(("open", "click"))
+        return "POST /analytics/track/{id}", "POST", f"/analytics/track/{user_id}?action={action}"
+    return "GET /messages/{id}", "GET", f"/messages/{user_id}"
+
+
+async def _client(client, users: int, deadline: float, latencies, errors, seed: int) -> None:
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        label, method, path = _request(rng, users)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path)
+            ok = response.status_code < 500
+        except Exception:
+            ok = False
+        latencies[label].append(time.perf_counter() - start)
+        if not ok:
+            errors[label] += 1
+
+
+async def run(url, clients: int, duration: float, users: int) -> None:
+    import httpx
+
+    if url:
+        transport = None
+        base_url = url
+    else:
+        from backend.app import app
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            _client(client, users, deadline, latencies, errors, seed) for seed in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+
+    rows = []
+    everything = []
+    for label in sorted(latencies):
+        values = latencies[label]
+        everything.extend(values)
+        rows.append((label, len(values), errors[label], percentile(values, 50) * 1000, percentile(values, 99) * 1000, len(values) / elapsed))
+    rows.append(("all", len(everything), sum(errors.values()), percentile(everything, 50) * 1000, percentile(everything, 99) * 1000, len(everything) / elapsed))
+
+    print(f"{clients} clients for {elapsed:.1f}s against {url or 'in-process app'}")
+    print_table(("endpoint", "requests", "errors", "p50 ms", "p99 ms", "req/s"), rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--users", type=int, default=10_000, help="Users to seed, or present on --url")
+    args = parser.parse_args()
+
+    if not args.url:
+        use_temp_database()
+        _seed(args.users)
+
+    asyncio.run(run(args.url, args.clients, args.duration, args.users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+EngagementMetrics on large frames: per-type boolean masks vs one groupby.
+
+Builds a synthetic message frame of --rows rows and times the original
+metrics_by_message_type (one boolean mask over the whole frame per type)
+against the vectorized groupby, with object and categorical dtypes.
+
+    python -m benchmarks.metrics_groupby --rows 10000000
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analytics.metrics import EngagementMetrics
+from benchmarks.common import measure, median_ms, print_table
+
+MESSAGE_TYPES = ["flirty", "utility", "reminder", "welcome_back", "broadcast", "promo", "survey", "digest"]
+SEGMENTS = ["dormant", "loyal", "normal", "at_risk"]
+
+
+def masked_metrics_by_message_type(df: pd.DataFrame) -> dict:
+    """The original implementation: O(types x rows)."""
+    results = {}
+    for msg_type in df["message_type"].unique():
+        subset = df[df["message_type"] == msg_type]
+
+        total_sent = subset["sent"].sum()
+        total_opened = subset["opened"].sum()
+        total_clicked = subset["clicked"].sum()
+        total_reactivated = subset["reactivated"].sum()
+
+        open_rate = total_opened / total_sent if total_sent else 0
+        ctr = total_clicked / total_opened if total_opened else 0
+        reactivation = total_reactivated / total_sent if total_sent else 0
+
+        results[msg_type] = {
+            "open_rate": round(open_rate, 3),
+            "ctr": round(ctr, 3),
+            "reactivation_rate": round(reactivation, 3),
+            "engagement_score": round(0.4 * open_rate + 0.3 * ctr + 0.3 * reactivation, 3)
+        }
+    return results
+
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    opened = rng.random(rows) < 0.35
+    return pd.DataFrame({
+        "message_type": rng.choice(MESSAGE_TYPES, rows),
+        "segment": rng.choice(SEGMENTS, rows),
+        "sent": np.ones(rows, dtype=np.int8),
+        "opened": opened.astype(np.int8),
+        "clicked": (opened & (rng.random(rows) < 0.2)).astype(np.int8),
+        "reactivated": (rng.random(rows) < 0.05).astype(np.int8)
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows)
+    plain = EngagementMetrics(df)
+    categorical = EngagementMetrics(df, categorical=True)
+
+    expected = masked_metrics_by_message_type(df)
+    assert plain.metrics_by_message_type() == expected
+    assert categorical.metrics_by_message_type() == expected
+
+    def memory_mb(metrics: EngagementMetrics) -> float:
+        return metrics.df.memory_usage(deep=True).sum() / 2**20
+
+    rows = [
+        ("per-type masks", "object", median_ms(measure(lambda: masked_metrics_by_message_type(df), args.repeat)), memory_mb(plain)),
+        ("groupby", "object", median_ms(measure(plain.metrics_by_message_type, args.repeat)), memory_mb(plain)),
+        ("groupby", "category", median_ms(measure(categorical.metrics_by_message_type, args.repeat)), memory_mb(categorical)),
+        ("groupby type+segment", "category", median_ms(measure(lambda: categorical.metrics_by("message_type", "segment"), args.repeat)), memory_mb(categorical)),
+    ]
+
+    print(f"{args.rows:,} rows, {len(MESSAGE_TYPES)} message types, median of {args.repeat} runs")
+    print_table(("implementation", "dtype", "ms", "frame MB"), rows)
+
+
+if __name__ == "__main__":
+    main()
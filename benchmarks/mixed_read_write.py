@@ -0,0 +1,110 @@
+"""
+Mixed read/write throughput: bare SQLite engine vs the tuned engine factory.
+
+--writers threads commit small write transactions (one last_active_at
+UPDATE each, like activity/tracking writes) while --readers threads run
+dashboard-style reads, for --duration seconds. Each configuration gets
+its own freshly seeded database file:
+
+    bare   create_engine() defaults (rollback journal, one engine)
+    tuned  make_engine(): WAL, synchronous=NORMAL, busy_timeout, cache/mmap,
+           separate read-only engine for the readers
+
+    python -m benchmarks.mixed_read_write --readers 8 --writers 4 --duration 10
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import print_table, seed_users, use_temp_database
+
+READ_QUERY = (
+    "SELECT u.id, u.name, u.last_active_at, count(m.id) FROM users u "
+    "LEFT JOIN message_logs m ON m.user_id = u.id "
+    "WHERE u.last_active_at < :cutoff GROUP BY u.id ORDER BY u.last_active_at LIMIT 100"
+)
+WRITE_QUERY = "UPDATE users SET last_active_at = :now WHERE id = :user_id"
+
+
+def run_mix(write_engine, read_engine, users: int, readers: int, writers: int, duration: float):
+    from sqlalchemy import text
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def bump(key: str) -> None:
+        with lock:
+            counts[key] += 1
+
+    def reader(seed: int) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            cutoff = datetime.utcnow() - timedelta(minutes=rng.randint(0, 60 * 24 * 14))
+            try:
+                with read_engine.connect() as conn:
+                    conn.execute(text(READ_QUERY), {"cutoff": cutoff}).all()
+                bump("reads")
+            except Exception:
+                bump("errors")
+
+    def writer(seed: int) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            try:
+                with write_engine.begin() as conn:
+                    conn.execute(text(WRITE_QUERY), {"now": datetime.utcnow(), "user_id": rng.randint(1, users)})
+                bump("writes")
+            except Exception:
+                bump("errors")
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    directory = os.path.dirname(use_temp_database())
+    from sqlalchemy import create_engine
+
+    from backend.database import make_engine
+
+    def bare(path):
+        engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        return engine, engine
+
+    def tuned(path):
+        url = f"sqlite:///{path}"
+        return make_engine(url), make_engine(url, read_only=True)
+
+    rows = []
+    for name, factory in (("bare", bare), ("tuned", tuned)):
+        write_engine, read_engine = factory(os.path.join(directory, f"{name}.db"))
+        seed_users(write_engine, args.users)
+        counts, elapsed = run_mix(write_engine, read_engine, args.users, args.readers, args.writers, args.duration)
+        rows.append((name, counts["reads"] / elapsed, counts["writes"] / elapsed, counts["errors"]))
+        write_engine.dispose()
+        read_engine.dispose()
+
+    print(f"{args.users:,} users, {args.readers} readers + {args.writers} writers for {args.duration:.0f}s")
+    print_table(("engine", "reads/s", "writes/s", "errors"), rows)
+
+
+if __name__ == "__main__":
+    main()
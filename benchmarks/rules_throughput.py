@@ -0,0 +1,75 @@
+"""
+Segmentation rule engine throughput on large rule sets.
+
+Compiles random rule sets of each --rules size (every rule tests one or two
+features with a random operator) and times RuleSet.classify per user
+against RuleSet.classify_arrays over --users users. Thresholds are drawn so
+that most users fall through most rules, the worst case for a decision list.
+
+    python -m benchmarks.rules_throughput --rules 10 50 100 --users 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import measure, median_ms, print_table
+from engagement_agent.rules import FEATURES, RuleSet
+
+# Operators that rarely match on continuous features, so users reach late rules
+SELECTIVE = (">=", ">", "<=", "<", "==")
+
+
+def random_rule_set(size: int, rng) -> RuleSet:
+    scales = {"minutes_inactive": 120.0, "account_age_minutes": 600.0, "churn_risk_score": 1.0}
+    rules = []
+    for index in range(size):
+        when = {}
+        for feature in rng.choice(FEATURES, rng.integers(1, 3), replace=False):
+            symbol = SELECTIVE[rng.integers(len(SELECTIVE))]
+            # Upper / lower tail of the feature's range, so each rule matches ~5% of users
+            quantile = 0.05 if symbol in ("<=", "<") else 0.95
+            when[str(feature)] = {symbol: round(scales[feature] * quantile, 3)}
+        rules.append({"segment": f"segment_{index}", "tone": f"tone_{index % 4}", "when": when})
+    return RuleSet({"default": {"segment": "normal", "tone": "neutral"}, "rules": rules})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--scalar-sample", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    features = {
+        "minutes_inactive": rng.random(args.users) * 120,
+        "account_age_minutes": rng.random(args.users) * 600,
+        "churn_risk_score": rng.random(args.users)
+    }
+    sample = min(args.scalar_sample, args.users)
+    rows = [{feature: float(values[i]) for feature, values in features.items()} for i in range(sample)]
+
+    results = []
+    for size in args.rules:
+        rules = random_rule_set(size, rng)
+
+        start = time.perf_counter()
+        scalar = [rules.classify(row) for row in rows]
+        scalar_rate = sample / (time.perf_counter() - start)
+
+        codes = rules.classify_arrays(features)
+        vector_s = median_ms(measure(lambda: rules.classify_arrays(features), args.repeat)) / 1000
+        assert [rules.segments[code] for code in codes[:sample].tolist()] == scalar
+
+        default_share = float(np.mean(codes == rules.segment_codes["normal"]))
+        results.append((size, int(scalar_rate), int(args.users / vector_s), vector_s * 1000, default_share))
+
+    print(f"{args.users:,} users ({sample:,} for classify), median of {args.repeat} runs")
+    print_table(("rules", "classify users/s", "classify_arrays users/s", "classify_arrays ms", "default share"), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Segmentation at scale: per-user determine_user_segment vs segment_users.
+
+Builds --users users as datetime64 arrays and segments them with one
+vectorized segment_users call, against determine_user_segment called once
+per user on a --scalar-sample subset (extrapolated; a full 10M-user scalar
+run takes minutes). Both paths must agree on the sample.
+
+    python -m benchmarks.segmentation_batch --users 10000000
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.common import measure, median_ms, peak_rss_mb, print_table
+from engagement_agent import determine_user_segment, get_rule_set
+from engagement_agent.batch_segmentation import segment_users
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000_000)
+    parser.add_argument("--scalar-sample", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rules = get_rule_set()
+    now = datetime.utcnow()
+    rng = np.random.default_rng(0)
+    # Spread around the built-in thresholds (minutes), so every segment occurs
+    inactive = rng.integers(0, 120 * 60 * 10**6, args.users).astype("timedelta64[us]")
+    age = inactive + rng.integers(0, 10 * 60 * 10**6, args.users).astype("timedelta64[us]")
+    reference = np.datetime64(now, "us")
+    last_active_at = reference - inactive
+    created_at = reference - age
+    churn = rng.random(args.users)
+
+    segments, tones = segment_users(created_at, last_active_at, now, churn, rules)
+    vector_s = median_ms(measure(lambda: segment_users(created_at, last_active_at, now, churn, rules), args.repeat)) / 1000
+
+    sample = min(args.scalar_sample, args.users)
+    sample_created = created_at[:sample].tolist()
+    sample_active = last_active_at[:sample].tolist()
+    sample_churn = churn[:sample].tolist()
+    start = time.perf_counter()
+    scalar = [
+        determine_user_segment(sample_created[i], sample_active[i], now, sample_churn[i])
+        for i in range(sample)
+    ]
+    scalar_s = (time.perf_counter() - start) / sample * args.users
+    assert scalar == [rules.segments[code] for code in segments[:sample].tolist()]
+
+    counts = np.bincount(segments, minlength=len(rules.segments))
+    print(f"{args.users:,} users, {len(rules)} rules, segments: " + ", ".join(
+        f"{name} {count:,}" for name, count in zip(rules.segments, counts.tolist())
+    ))
+    print_table(
+        ("path", "seconds", "users/s", "output MB"),
+        [
+            (f"determine_user_segment (from {sample:,})", scalar_s, int(args.users / scalar_s), "-"),
+            ("segment_users", vector_s, int(args.users / vector_s), (segments.nbytes + tones.nbytes) / 2**20),
+        ]
+    )
+    print(f"peak RSS {peak_rss_mb():,.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Message rendering throughput: str.format per call vs compiled templates.
+
+Renders --messages engagement messages (one per synthetic user name) with
+the original approach (random.choice + str.format(**context) per message),
+with generate_message per message, with one render_many call, and with
+allocate_messages (per-user variant choice + render) in engagement-cycle
+sized batches. Also renders the maintenance broadcast with str.format
+against its CompiledTemplate.
+
+    python -m benchmarks.template_render --messages 1000000
+"""
+
+import argparse
+import random
+import time
+from typing import Callable, List
+
+from benchmarks.common import print_table
+from message_generation.prompt_builder import MESSAGE_TEMPLATES, allocate_messages, generate_message, render_many
+from utility_messaging.broadcasts import BROADCAST_TEMPLATES, COMPILED_BROADCAST_TEMPLATES
+
+TONE = "playful"
+MAINTENANCE = {"date": "2024-06-01", "start_time": "02:00", "end_time": "04:00"}
+
+
+def format_per_call(names: List[str]) -> List[str]:
+    """The original generate_message: pick a variant, re-parse it with str.format."""
+    templates = MESSAGE_TEMPLATES[TONE]
+    return [random.choice(templates).format(**{"name": name}) for name in names]
+
+
+def allocate_in_batches(names: List[str], batch_size: int = 1000) -> List[str]:
+    messages = []
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        user_ids = range(start + 1, start + len(batch) + 1)
+        contents, _, _ = allocate_messages(TONE, user_ids, batch, 1, [0] * len(batch))
+        messages.extend(contents)
+    return messages
+
+
+def timed(fn: Callable[[], List[str]]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    count = args.messages
+    names = [f"User {i}" for i in range(count)]
+    maintenance_text = BROADCAST_TEMPLATES["maintenance"]["template"]
+    maintenance = COMPILED_BROADCAST_TEMPLATES["maintenance"]
+    assert maintenance.render(MAINTENANCE) == maintenance_text.format(**MAINTENANCE)
+
+    runs = [
+        ("engagement: str.format per message", lambda: format_per_call(names)),
+        ("engagement: generate_message per message", lambda: [generate_message(TONE, {"name": name}) for name in names]),
+        ("engagement: render_many", lambda: render_many(TONE, names)),
+        ("engagement: allocate_messages, 1000/batch", lambda: allocate_in_batches(names)),
+        ("broadcast: str.format per message", lambda: [maintenance_text.format(**MAINTENANCE) for _ in range(count)]),
+        ("broadcast: CompiledTemplate.render", lambda: [maintenance.render(MAINTENANCE) for _ in range(count)]),
+    ]
+
+    rows = []
+    for label, fn in runs:
+        seconds = timed(fn)
+        rows.append((label, seconds, int(count / seconds)))
+
+    print(f"{count:,} messages each")
+    print_table(("path", "seconds", "messages/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+InactivityIndex at scale: memory per user and cost per tick vs a full scan.
+
+Loads --users users with last activity spread over the index horizon (so
+every one of them has pending transitions), then reports the index's
+resident memory, the cost of record_activity, and the cost of one
+1-second tick against re-checking every user's last_active_at with NumPy.
+
+    python -m benchmarks.timing_wheel_memory --users 10000000
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.common import median_ms, peak_rss_mb, print_table
+from engagement_agent.timing_wheel import InactivityIndex
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000_000)
+    parser.add_argument("--ticks", type=int, default=10)
+    args = parser.parse_args()
+
+    now = datetime.utcnow().replace(microsecond=0)
+    index = InactivityIndex(now=now)
+    horizon = int(index.horizon.total_seconds())
+    rng = np.random.default_rng(0)
+    # Seconds since last activity; every user is inside the horizon
+    idle = rng.integers(0, horizon, args.users)
+    last_active = np.datetime64(now) - idle.astype("timedelta64[s]")
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    for user_id, seconds in enumerate(idle.tolist()):
+        index.record_activity(user_id, now - timedelta(seconds=seconds))
+    build = time.perf_counter() - start
+    rss_after = peak_rss_mb()
+
+    tick_timings, scan_timings, expired = [], [], 0
+    for step in range(1, args.ticks + 1):
+        moment = now + timedelta(seconds=step)
+        start = time.perf_counter()
+        transitions = index.tick(moment)
+        tick_timings.append(time.perf_counter() - start)
+        expired += sum(len(user_ids) for user_ids in transitions.values())
+
+        # The alternative: compare every user's deadlines on every tick
+        start = time.perf_counter()
+        elapsed = np.datetime64(moment) - last_active
+        for threshold in (index.inactive.delay,) + index.thresholds:
+            deadline = np.timedelta64(threshold)
+            np.flatnonzero((elapsed >= deadline) & (elapsed - np.timedelta64(1, "s") < deadline))
+        scan_timings.append(time.perf_counter() - start)
+
+    index_mb = rss_after - rss_before
+    print(
+        f"{args.users:,} users, {len(index.thresholds)} segment thresholds, "
+        f"horizon {horizon:,} s, {expired / args.ticks:,.0f} transitions per 1 s tick"
+    )
+    print_table(
+        ("measure", "value"),
+        [
+            ("index RSS (MB)", index_mb),
+            ("bytes per user", index_mb * 2**20 / args.users),
+            ("record_activity (us)", build / args.users * 1e6),
+            ("tick, median (ms)", median_ms(tick_timings)),
+            ("full scan, median (ms)", median_ms(scan_timings)),
+            ("peak RSS (MB)", rss_after),
+        ]
+    )
+
+
+if __name__ == "__main__":
+    main()
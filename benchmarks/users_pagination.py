@@ -0,0 +1,66 @@
+"""
+GET /users/ page latency by depth: offset (`skip`) vs keyset (`cursor`).
+
+Seeds a throwaway database with --users users, each with one engagement
+message, then fetches a page at increasing depths both ways. Keyset pages
+should cost the same at any depth; offset pages grow with the depth.
+
+    python -m benchmarks.users_pagination --users 200000
+"""
+
+import argparse
+
+from benchmarks.common import measure, median_ms, print_table, seed_users, use_temp_database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    use_temp_database()
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, insert, literal, select
+
+    from backend import models
+    from backend.app import app
+    from backend.database import engine
+
+    seed_users(engine, args.users)
+    with engine.begin() as conn:
+        conn.execute(insert(models.MessageLog).from_select(
+            ["user_id", "type", "content", "sent_at", "status"],
+            select(
+                models.User.id,
+                literal(models.MessageType.CLIENT_ENGAGEMENT_BRAND.name),
+                literal("Hey, we miss you!"),
+                func.datetime("now"),
+                literal("sent")
+            )
+        ))
+
+    # No `with`: the lifespan (background workers) is not needed here
+    client = TestClient(app)
+
+    def fetch(**params):
+        response = client.get("/users/", params={"limit": args.limit, **params})
+        assert response.status_code == 200 and len(response.json()) == args.limit, response.text
+        return response
+
+    rows = []
+    depth = 1
+    while depth * args.limit < args.users:
+        position = (depth - 1) * args.limit
+        offset_ms = median_ms(measure(lambda: fetch(skip=position), args.repeat))
+        keyset_ms = median_ms(measure(lambda: fetch(cursor=position), args.repeat))
+        rows.append((depth, offset_ms, keyset_ms))
+        depth *= 10
+
+    print(f"{args.users:,} users, {args.limit} per page, median of {args.repeat} requests")
+    print_table(("page", "offset ms", "cursor ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,12 +15,29 @@ It ONLY provides decision logic.
 """
 
 from .decision_logic import (
+    EvaluationContext,
     evaluate_user_for_engagement,
+    evaluate_users_for_engagement,
+    summarize_evaluations,
     get_engagement_stats,
+    get_recent_message_times,
+    next_eligible_at,
     is_user_inactive,
     check_message_frequency
 )
 
+from .churn import (
+    ChurnModel,
+    DEFAULT_CHURN_MODEL,
+    churn_features,
+    churn_risk
+)
+
+from .rules import (
+    RuleSet,
+    get_rule_set
+)
+
 from .segmentation import (
     determine_user_segment,
     get_tone_for_segment,
@@ -30,8 +47,13 @@ from .segmentation import (
 
 __all__ = [
     # Decision logic
+    "EvaluationContext",
     "evaluate_user_for_engagement",
+    "evaluate_users_for_engagement",
+    "summarize_evaluations",
     "get_engagement_stats",
+    "get_recent_message_times",
+    "next_eligible_at",
     "is_user_inactive",
     "check_message_frequency",
     
@@ -40,4 +62,14 @@ __all__ = [
     "get_tone_for_segment",
     "calculate_minutes_since_activity",
     "calculate_account_age_minutes",
+    
+    # Rule engine
+    "RuleSet",
+    "get_rule_set",
+    
+    # Churn scoring
+    "ChurnModel",
+    "DEFAULT_CHURN_MODEL",
+    "churn_features",
+    "churn_risk",
 ]
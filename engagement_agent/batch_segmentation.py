@@ -0,0 +1,92 @@
+"""
+Batch Segmentation
+
+Vectorized counterpart of segmentation.determine_user_segment for whole
+populations: timestamps come in as datetime64 arrays (or pandas columns),
+one reference "now" is used for every user, and segments and tones come
+back as compact integer code arrays, evaluated by the same compiled
+RuleSet as the per-user path.
+
+Kept separate from segmentation.py so the per-user path does not import NumPy.
+
+Codes index into the rule set's segment / tone names:
+
+    rules = get_rule_set()
+    segments, tones = segment_users(created_at, last_active_at, rules=rules)
+    rules.segments[segments[0]]  # "dormant"
+"""
+
+from datetime import datetime
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from .rules import RuleSet, get_rule_set
+
+_MINUTE = np.timedelta64(60 * 10**6, "us")
+
+
+def _as_datetime64(values) -> np.ndarray:
+    return np.asarray(values, dtype="datetime64[us]")
+
+
+def segment_codes(
+    created_at,
+    last_active_at,
+    now: Optional[Union[datetime, np.datetime64]] = None,
+    churn_risk_score=None,
+    rules: Optional[RuleSet] = None
+) -> np.ndarray:
+    """
+    Segment code for every user, with the same rules as determine_user_segment.
+
+    Args:
+        created_at: Account creation times (datetime64 array, Series or list of datetimes)
+        last_active_at: Last activity times, same length
+        now: Reference time shared by all users (defaults to utcnow, read once)
+        churn_risk_score: Optional churn risk per user (0 when omitted)
+        rules: Rule set to evaluate (defaults to the current one)
+
+    Returns:
+        Integer array of codes into `rules.segments`. Missing (NaT/NaN) values
+        never satisfy a condition.
+    """
+    rules = rules or get_rule_set()
+    created_at = _as_datetime64(created_at)
+    last_active_at = _as_datetime64(last_active_at)
+    now = np.datetime64(now or datetime.utcnow(), "us")
+
+    if churn_risk_score is None:
+        churn_risk_score = np.zeros(created_at.shape)
+
+    return rules.classify_arrays({
+        "minutes_inactive": (now - last_active_at) / _MINUTE,
+        "account_age_minutes": (now - created_at) / _MINUTE,
+        "churn_risk_score": np.asarray(churn_risk_score, dtype=float)
+    })
+
+
+def tone_codes(segments: np.ndarray, rules: Optional[RuleSet] = None) -> np.ndarray:
+    """Map segment codes to codes into `rules.tones`."""
+    return (rules or get_rule_set()).tone_codes_for(segments)
+
+
+def segment_users(
+    created_at,
+    last_active_at,
+    now: Optional[Union[datetime, np.datetime64]] = None,
+    churn_risk_score=None,
+    rules: Optional[RuleSet] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Segment and tone codes for a population of users in one pass.
+
+    Pass `rules` (e.g. get_rule_set()) to decode the codes against the exact
+    rule set that produced them, even if the config reloads meanwhile.
+
+    Returns:
+        (segment codes, tone codes)
+    """
+    rules = rules or get_rule_set()
+    segments = segment_codes(created_at, last_active_at, now, churn_risk_score, rules)
+    return segments, tone_codes(segments, rules)
@@ -0,0 +1,138 @@
+"""
+Churn-Risk Scoring
+
+A small logistic model that turns a user's activity and message history
+into churn_risk_score (0.0 - 1.0, higher is riskier):
+
+    risk = sigmoid(intercept + sum(weight * feature))
+
+Features (see CHURN_FEATURES):
+- inactivity:    minutes inactive / DORMANT_THRESHOLD_MINUTES, capped
+- account_age:   log(1 + account age in minutes); older accounts churn less
+- messages_sent: log(1 + engagement messages received)
+- open_rate:     opens / messages, smoothed towards 0.5 for few messages
+- click_rate:    clicks / messages, smoothed the same way
+
+The default weights are hand-set (there is no labelled churn data to fit
+them on); pass your own ChurnModel to override them.
+
+score() scores one user in pure Python; score_arrays() scores NumPy
+arrays of users with the same arithmetic, for batch rescoring.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+from .segmentation import DORMANT_THRESHOLD_MINUTES
+
+CHURN_FEATURES = ("inactivity", "account_age", "messages_sent", "open_rate", "click_rate")
+
+# Inactivity beyond this many dormant periods adds no further risk
+MAX_INACTIVITY_RATIO = 4.0
+
+
+@dataclass(frozen=True)
+class ChurnModel:
+    """
+    Logistic churn model.
+
+    Attributes:
+        intercept: Bias term
+        weights: Feature name → weight (features missing here weigh 0)
+    """
+
+    intercept: float
+    weights: Mapping[str, float]
+
+    def score(self, features: Mapping[str, float]) -> float:
+        """Churn risk for one user's features (see churn_features)."""
+        z = self.intercept + sum(weight * features[name] for name, weight in self.weights.items())
+        # Numerically stable sigmoid
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        exp_z = math.exp(z)
+        return exp_z / (1.0 + exp_z)
+
+    def score_arrays(self, features: Mapping[str, Any]):
+        """Churn risk for many users; features are NumPy arrays (churn_feature_arrays)."""
+        import numpy as np
+
+        size = len(next(iter(features.values())))
+        z = np.full(size, self.intercept, dtype=float)
+        for name, weight in self.weights.items():
+            z += weight * features[name]
+        return 0.5 * (1.0 + np.tanh(0.5 * z))  # sigmoid without overflow
+
+
+DEFAULT_CHURN_MODEL = ChurnModel(
+    intercept=-1.0,
+    weights={
+        "inactivity": 2.5,
+        "account_age": -0.15,
+        "messages_sent": 0.3,
+        "open_rate": -2.0,
+        "click_rate": -1.5
+    }
+)
+
+
+def _smoothed_rate(count: float, total: float) -> float:
+    # Beta(1, 1) prior: no history reads as 0.5
+    return (count + 1.0) / (total + 2.0)
+
+
+def churn_features(
+    minutes_inactive: float,
+    account_age_minutes: float,
+    messages_sent: int = 0,
+    messages_opened: int = 0,
+    messages_clicked: int = 0
+) -> dict:
+    """
+    Model features for one user.
+
+    Args:
+        minutes_inactive: Minutes since the user was last active
+        account_age_minutes: Age of the account in minutes
+        messages_sent: Engagement messages the user received
+        messages_opened: How many of them were opened
+        messages_clicked: How many of them were clicked
+    """
+    return {
+        "inactivity": min(max(minutes_inactive, 0.0) / DORMANT_THRESHOLD_MINUTES, MAX_INACTIVITY_RATIO),
+        "account_age": math.log1p(max(account_age_minutes, 0.0)),
+        "messages_sent": math.log1p(messages_sent),
+        "open_rate": _smoothed_rate(messages_opened, messages_sent),
+        "click_rate": _smoothed_rate(messages_clicked, messages_sent)
+    }
+
+
+def churn_feature_arrays(minutes_inactive, account_age_minutes, messages_sent, messages_opened, messages_clicked) -> dict:
+    """churn_features over NumPy arrays (all the same length)."""
+    import numpy as np
+
+    sent = np.asarray(messages_sent, dtype=float)
+    return {
+        "inactivity": np.clip(np.asarray(minutes_inactive, dtype=float) / DORMANT_THRESHOLD_MINUTES, 0.0, MAX_INACTIVITY_RATIO),
+        "account_age": np.log1p(np.maximum(np.asarray(account_age_minutes, dtype=float), 0.0)),
+        "messages_sent": np.log1p(sent),
+        "open_rate": (np.asarray(messages_opened, dtype=float) + 1.0) / (sent + 2.0),
+        "click_rate": (np.asarray(messages_clicked, dtype=float) + 1.0) / (sent + 2.0)
+    }
+
+
+def churn_risk(
+    minutes_inactive: float,
+    account_age_minutes: float,
+    messages_sent: int = 0,
+    messages_opened: int = 0,
+    messages_clicked: int = 0,
+    model: ChurnModel = DEFAULT_CHURN_MODEL
+) -> float:
+    """
+    Churn risk score (0.0 - 1.0) for one user.
+    """
+    return model.score(churn_features(
+        minutes_inactive, account_age_minutes, messages_sent, messages_opened, messages_clicked
+    ))
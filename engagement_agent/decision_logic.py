@@ -16,11 +16,14 @@ It ONLY:
 """
 
 import logging
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, List, Mapping, Optional, Tuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from .segmentation import determine_user_segment, get_tone_for_segment
+from .rules import RuleSet, get_rule_set
+from .segmentation import calculate_account_age_minutes, calculate_minutes_since_activity
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -30,71 +33,222 @@ INACTIVITY_THRESHOLD_SECONDS = 60  # For testing (1 minute)
 MESSAGE_FREQUENCY_MINUTES = 1  # For testing: Can message every minute
 
 
-def is_user_inactive(last_active_at: datetime) -> bool:
+@dataclass(frozen=True)
+class EvaluationContext:
+    """
+    Everything a decision depends on besides the user, fixed for a whole cycle.
+    
+    Every user evaluated with the same context is judged against the same
+    `now` and the same rules, and the clock is read once. Rebuilding a
+    context with a fixed `now` replays a cycle exactly.
+    
+    Attributes:
+        now: Reference time for every check
+        inactive_before: Users last active before this are inactive
+        recent_message_cutoff: Messages sent at or after this count as recent
+        rules: Segmentation rules
+        cycle_id: Identifies the cycle (seeds deterministic template selection)
+        recent_message_times: user ID -> latest recent sent_at, if already loaded
+    """
+    now: datetime
+    inactive_before: datetime
+    recent_message_cutoff: datetime
+    rules: RuleSet
+    cycle_id: int
+    recent_message_times: Optional[Mapping[int, datetime]] = None
+    
+    @classmethod
+    def create(
+        cls,
+        now: Optional[datetime] = None,
+        recent_message_times: Optional[Mapping[int, datetime]] = None,
+        rules: Optional[RuleSet] = None,
+        cycle_id: Optional[int] = None
+    ) -> "EvaluationContext":
+        """
+        Build a context at `now` (defaults to utcnow) with the current rules.
+        
+        cycle_id defaults to `now` in whole seconds since the epoch, so a
+        context rebuilt with the same `now` replays the same cycle.
+        """
+        now = now or datetime.utcnow()
+        if cycle_id is None:
+            cycle_id = int((now - datetime(1970, 1, 1)).total_seconds())
+        return cls(
+            now=now,
+            inactive_before=now - timedelta(seconds=INACTIVITY_THRESHOLD_SECONDS),
+            recent_message_cutoff=now - timedelta(minutes=MESSAGE_FREQUENCY_MINUTES),
+            rules=rules or get_rule_set(),
+            cycle_id=cycle_id,
+            recent_message_times=recent_message_times
+        )
+    
+    def with_recent_message_times(self, recent_message_times: Mapping[int, datetime]) -> "EvaluationContext":
+        return replace(self, recent_message_times=recent_message_times)
+    
+    def is_inactive(self, last_active_at: datetime) -> bool:
+        return last_active_at < self.inactive_before
+    
+    def segment_for(self, user) -> str:
+        return self.rules.classify({
+            "minutes_inactive": calculate_minutes_since_activity(user.last_active_at, self.now),
+            "account_age_minutes": calculate_account_age_minutes(user.created_at, self.now),
+            "churn_risk_score": getattr(user, "churn_risk_score", None) or 0.0
+        })
+
+
+def is_user_inactive(last_active_at: datetime, context: Optional[EvaluationContext] = None) -> bool:
     """
     Check if a user is considered inactive based on the inactivity threshold.
     
     Args:
         last_active_at: User's last activity timestamp
+        context: Evaluation context (a fresh one at utcnow if omitted)
         
     Returns:
         True if user is inactive, False otherwise
     """
-    current_time = datetime.utcnow()
-    time_diff = current_time - last_active_at
+    if context is not None:
+        return context.is_inactive(last_active_at)
+    time_diff = datetime.utcnow() - last_active_at
     return time_diff.total_seconds() > INACTIVITY_THRESHOLD_SECONDS
 
 
-def check_message_frequency(user_id: int, db_session: Session) -> bool:
+def check_message_frequency(
+    user_id: int,
+    db_session: Session,
+    context: Optional[EvaluationContext] = None
+) -> bool:
     """
     Check if the user has received a message recently (within frequency limit).
     
     Args:
         user_id: User's ID
         db_session: Database session
+        context: Evaluation context; its recent-message lookup is used when loaded
         
     Returns:
         True if user was messaged recently (should skip), False otherwise
     """
-    from backend.models import MessageLog
+    from backend.models import BroadcastDelivery, BroadcastJob, MessageLog
+    
+    if context is not None and context.recent_message_times is not None:
+        return user_id in context.recent_message_times
     
     # Calculate cutoff time
-    cutoff_time = datetime.utcnow() - timedelta(minutes=MESSAGE_FREQUENCY_MINUTES)
+    cutoff_time = (
+        context.recent_message_cutoff if context is not None
+        else datetime.utcnow() - timedelta(minutes=MESSAGE_FREQUENCY_MINUTES)
+    )
     
     # Query for recent messages
-    recent_message = db_session.query(MessageLog).filter(
+    recent_message = db_session.query(MessageLog.id).filter(
         MessageLog.user_id == user_id,
         MessageLog.sent_at >= cutoff_time
     ).first()
+    if recent_message is not None:
+        return True
+    
+    # Broadcasts are stored once per job; a delivery counts as a message
+    recent_broadcast = db_session.query(BroadcastDelivery.job_id).join(
+        BroadcastJob, BroadcastJob.id == BroadcastDelivery.job_id
+    ).filter(
+        BroadcastDelivery.user_id == user_id,
+        BroadcastJob.created_at >= cutoff_time
+    ).first()
     
-    return recent_message is not None
+    return recent_broadcast is not None
 
 
-def evaluate_user_for_engagement(user, db_session: Session) -> Dict[str, Any]:
+def next_eligible_at(last_active_at: datetime, last_message_at: Optional[datetime] = None) -> datetime:
     """
-    Evaluate whether a user should receive an engagement message.
+    Earliest time at which a user can become eligible for engagement.
     
-    This is the main decision function that:
-    1. Checks if user is inactive
-    2. Checks message frequency limits
-    3. Determines user segment
-    4. Maps segment to tone
-    5. Returns eligibility decision
+    Both rules are pure time thresholds, so the result only moves later
+    when the user is active again or receives another message.
     
     Args:
-        user: User object from database
-        db_session: Database session for queries
+        last_active_at: User's last activity timestamp
+        last_message_at: Time of the user's latest message, if any
         
     Returns:
-        Dictionary containing:
-        {
-            "eligible": bool,        # Whether to send message
-            "segment": str,          # User segment (dormant/new_user/normal)
-            "tone": str,             # Message tone (playful/warm/neutral)
-            "reason": str            # Explanation for decision
-        }
+        The later of the inactivity deadline and the frequency-limit deadline
+    """
+    eligible_at = last_active_at + timedelta(seconds=INACTIVITY_THRESHOLD_SECONDS)
+    if last_message_at is not None:
+        eligible_at = max(eligible_at, last_message_at + timedelta(minutes=MESSAGE_FREQUENCY_MINUTES))
+    return eligible_at
+
+
+def get_recent_message_times(
+    db_session: Session,
+    user_ids: Optional[Iterable[int]] = None,
+    user_id_range: Optional[Tuple[int, int]] = None,
+    context: Optional[EvaluationContext] = None
+) -> Dict[int, datetime]:
+    """
+    Fetch the latest message time for every user messaged within the frequency limit.
+    
+    This is the set-based counterpart of check_message_frequency: a grouped
+    max(sent_at) query over message_logs and one over broadcast deliveries
+    (timed by their job's created_at) replace one query per user.
+    
+    Args:
+        db_session: Database session
+        user_ids: Optional subset of user IDs to restrict the lookup to
+        user_id_range: Optional inclusive (min_id, max_id) bounds, cheaper than
+            an IN list when evaluating a keyset-ordered chunk of users
+        context: Evaluation context supplying the cutoff (utcnow-based if omitted)
+        
+    Returns:
+        Mapping of user ID -> latest sent_at, only for recently messaged users
+    """
+    from backend.models import BroadcastDelivery, BroadcastJob, MessageLog
+    
+    cutoff_time = (
+        context.recent_message_cutoff if context is not None
+        else datetime.utcnow() - timedelta(minutes=MESSAGE_FREQUENCY_MINUTES)
+    )
+    
+    query = db_session.query(
+        MessageLog.user_id,
+        func.max(MessageLog.sent_at)
+    ).filter(MessageLog.sent_at >= cutoff_time)
+    
+    broadcast_query = db_session.query(
+        BroadcastDelivery.user_id,
+        func.max(BroadcastJob.created_at)
+    ).join(
+        BroadcastJob, BroadcastJob.id == BroadcastDelivery.job_id
+    ).filter(BroadcastJob.created_at >= cutoff_time)
+    
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        query = query.filter(MessageLog.user_id.in_(user_ids))
+        broadcast_query = broadcast_query.filter(BroadcastDelivery.user_id.in_(user_ids))
+    if user_id_range is not None:
+        query = query.filter(MessageLog.user_id.between(*user_id_range))
+        broadcast_query = broadcast_query.filter(BroadcastDelivery.user_id.between(*user_id_range))
+    
+    recent = dict(query.group_by(MessageLog.user_id).all())
+    for user_id, sent_at in broadcast_query.group_by(BroadcastDelivery.user_id):
+        if user_id not in recent or sent_at > recent[user_id]:
+            recent[user_id] = sent_at
+    return recent
+
+
+def _build_evaluation(
+    user,
+    recently_messaged: bool,
+    context: EvaluationContext,
+    segment: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Apply the decision rules to a user whose recent-message status is already known.
+    
+    `segment` is the user's segment when the caller already classified them
+    (batch path); otherwise it is computed here if the user is eligible.
     """
-    # Initialize result
     result = {
         "eligible": False,
         "segment": None,
@@ -103,67 +257,167 @@ def evaluate_user_for_engagement(user, db_session: Session) -> Dict[str, Any]:
     }
     
     # Check 1: Is user inactive?
-    if not is_user_inactive(user.last_active_at):
+    if not context.is_inactive(user.last_active_at):
         result["reason"] = "User is currently active"
-        logger.debug(f"User {user.id} ({user.name}): Skipped - Currently active")
+        logger.debug("User %s (%s): Skipped - Currently active", user.id, user.name)
         return result
     
     # Check 2: Message frequency control
-    if check_message_frequency(user.id, db_session):
+    if recently_messaged:
         result["reason"] = f"User was messaged within last {MESSAGE_FREQUENCY_MINUTES} minutes"
-        logger.debug(f"User {user.id} ({user.name}): Skipped - Recently messaged")
+        logger.debug("User %s (%s): Skipped - Recently messaged", user.id, user.name)
         return result
     
     # User is eligible - determine segment and tone
-    segment = determine_user_segment(user.created_at, user.last_active_at)
-    tone = get_tone_for_segment(segment)
+    if segment is None:
+        segment = context.segment_for(user)
+    tone = context.rules.tone_for(segment)
     
     result["eligible"] = True
     result["segment"] = segment
     result["tone"] = tone
     result["reason"] = f"Eligible for engagement (segment: {segment})"
     
-    logger.info(f"User {user.id} ({user.name}): Eligible - Segment: {segment}, Tone: {tone}")
+    logger.info("User %s (%s): Eligible - Segment: %s, Tone: %s", user.id, user.name, segment, tone)
     
     return result
 
 
-def get_engagement_stats(users, db_session: Session) -> Dict[str, Any]:
+def evaluate_user_for_engagement(
+    user,
+    db_session: Session,
+    context: Optional[EvaluationContext] = None
+) -> Dict[str, Any]:
     """
-    Generate statistics about engagement eligibility for a list of users.
+    Evaluate whether a user should receive an engagement message.
     
-    This is useful for monitoring and analytics.
+    This is the main decision function that:
+    1. Checks if user is inactive
+    2. Checks message frequency limits
+    3. Determines user segment
+    4. Maps segment to tone
+    5. Returns eligibility decision
+    
+    Args:
+        user: User object from database
+        db_session: Database session for queries
+        context: Evaluation context (a fresh one at utcnow if omitted)
+        
+    Returns:
+        Dictionary containing:
+        {
+            "eligible": bool,        # Whether to send message
+            "segment": str,          # User segment (dormant/new_user/normal)
+            "tone": str,             # Message tone (playful/warm/neutral)
+            "reason": str            # Explanation for decision
+        }
+    """
+    context = context or EvaluationContext.create()
+    
+    # Only hit the database when the inactivity check passes
+    recently_messaged = (
+        context.is_inactive(user.last_active_at)
+        and check_message_frequency(user.id, db_session, context)
+    )
+    return _build_evaluation(user, recently_messaged, context)
+
+
+def evaluate_users_for_engagement(
+    users,
+    db_session: Session,
+    context: Optional[EvaluationContext] = None
+) -> List[Dict[str, Any]]:
+    """
+    Evaluate a whole population of users in one pass.
+    
+    Recent-message status for every user is resolved with a single grouped
+    query, so the cost in database round-trips is constant regardless of
+    the number of users. The eligible users are segmented together in one
+    vectorized pass (batch_segmentation.segment_codes) with the context's
+    rules and `now`, giving the same segments as the per-user path.
     
     Args:
         users: List of user objects
         db_session: Database session
+        context: Evaluation context shared by every user (a fresh one at
+            utcnow if omitted); its recent-message lookup is reused when loaded
+        
+    Returns:
+        List of evaluation dictionaries (same shape as evaluate_user_for_engagement),
+        in the same order as `users`
+    """
+    if not users:
+        return []
+    
+    context = context or EvaluationContext.create()
+    if context.recent_message_times is None:
+        user_ids = [user.id for user in users]
+        context = context.with_recent_message_times(get_recent_message_times(
+            db_session, user_id_range=(min(user_ids), max(user_ids)), context=context
+        ))
+    
+    recent_message_times = context.recent_message_times
+    eligible = [
+        user for user in users
+        if context.is_inactive(user.last_active_at) and user.id not in recent_message_times
+    ]
+    segments = dict(zip((user.id for user in eligible), _segment_users(eligible, context)))
+    
+    return [
+        _build_evaluation(user, user.id in recent_message_times, context, segments.get(user.id))
+        for user in users
+    ]
+
+
+def _segment_users(users, context: EvaluationContext) -> List[str]:
+    """Segment names for `users` from one vectorized rule evaluation."""
+    if not users:
+        return []
+    
+    # NumPy is only needed by the batch path
+    from .batch_segmentation import segment_codes
+    
+    codes = segment_codes(
+        [user.created_at for user in users],
+        [user.last_active_at for user in users],
+        context.now,
+        [getattr(user, "churn_risk_score", None) or 0.0 for user in users],
+        context.rules
+    )
+    return [context.rules.segments[code] for code in codes.tolist()]
+
+
+def summarize_evaluations(
+    evaluations: List[Dict[str, Any]],
+    context: Optional[EvaluationContext] = None
+) -> Dict[str, Any]:
+    """
+    Aggregate a list of evaluation results into engagement statistics.
+    
+    Args:
+        evaluations: Evaluation dictionaries, one per user
+        context: Context the evaluations were made with (for its segment list)
         
     Returns:
         Dictionary with engagement statistics
     """
     stats = {
-        "total_users": len(users),
+        "total_users": len(evaluations),
         "eligible": 0,
         "skipped": 0,
-        "by_segment": {
-            "dormant": 0,
-            "loyal": 0,
-            "normal": 0
-        },
+        # Every segment of the active rule set, even those with no users
+        "by_segment": dict.fromkeys((context.rules if context else get_rule_set()).segments, 0),
         "skip_reasons": {
             "active": 0,
             "recently_messaged": 0
         }
     }
     
-    for user in users:
-        evaluation = evaluate_user_for_engagement(user, db_session)
-        
+    for evaluation in evaluations:
         if evaluation["eligible"]:
             stats["eligible"] += 1
             segment = evaluation["segment"]
-            if segment in stats["by_segment"]:
-                stats["by_segment"][segment] += 1
+            stats["by_segment"][segment] = stats["by_segment"].get(segment, 0) + 1
         else:
             stats["skipped"] += 1
             if "active" in evaluation["reason"].lower():
@@ -172,3 +426,25 @@ def get_engagement_stats(users, db_session: Session) -> Dict[str, Any]:
                 stats["skip_reasons"]["recently_messaged"] += 1
     
     return stats
+
+
+def get_engagement_stats(
+    users,
+    db_session: Session,
+    context: Optional[EvaluationContext] = None
+) -> Dict[str, Any]:
+    """
+    Generate statistics about engagement eligibility for a list of users.
+    
+    This is useful for monitoring and analytics.
+    
+    Args:
+        users: List of user objects
+        db_session: Database session
+        context: Evaluation context (a fresh one at utcnow if omitted)
+        
+    Returns:
+        Dictionary with engagement statistics
+    """
+    context = context or EvaluationContext.create()
+    return summarize_evaluations(evaluate_users_for_engagement(users, db_session, context), context)
@@ -0,0 +1,262 @@
+"""
+Segmentation Rule Engine
+
+Segments are defined declaratively and compiled once into a RuleSet that
+serves both the per-user path (determine_user_segment) and the batch path
+(batch_segmentation). Rules are an ordered decision list: the first rule
+whose conditions all hold wins, otherwise the default segment applies.
+
+Config (JSON, at SEGMENT_RULES_PATH):
+
+    {
+        "default": {"segment": "normal", "tone": "neutral"},
+        "rules": [
+            {"segment": "at_risk", "tone": "playful", "when": {"churn_risk_score": {">=": 0.7}}},
+            {"segment": "dormant", "tone": "playful", "when": {"minutes_inactive": {">=": 60}}},
+            {"segment": "loyal", "tone": "warm", "when": {"account_age_minutes": {">=": 5}}}
+        ]
+    }
+
+When the file does not exist the built-in rules (from the thresholds in
+segmentation.py) are used. The file is re-read when its mtime changes, so
+rules can be changed without restarting the server; an invalid file is
+logged and the previous rules are kept.
+"""
+
+import json
+import logging
+import operator
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_RULES_PATH = os.getenv(
+    "SEGMENT_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "segment_rules.json")
+)
+
+# How often (seconds) the config file's mtime is checked
+RELOAD_CHECK_SECONDS = 1.0
+
+# Inputs a rule can test
+FEATURES = ("minutes_inactive", "account_age_minutes", "churn_risk_score")
+
+OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne
+}
+
+Condition = Tuple[str, Callable[[Any, Any], Any], float]
+
+
+def default_config() -> Dict[str, Any]:
+    """Built-in rules, equivalent to the original hardcoded segmentation."""
+    from .segmentation import DORMANT_THRESHOLD_MINUTES, LOYAL_THRESHOLD_MINUTES
+
+    return {
+        "default": {"segment": "normal", "tone": "neutral"},
+        "rules": [
+            {"segment": "dormant", "tone": "playful", "when": {"minutes_inactive": {">=": DORMANT_THRESHOLD_MINUTES}}},
+            {"segment": "loyal", "tone": "warm", "when": {"account_age_minutes": {">=": LOYAL_THRESHOLD_MINUTES}}}
+        ]
+    }
+
+
+class RuleSet:
+    """
+    A compiled, immutable set of segmentation rules.
+
+    Attributes:
+        segments: Segment names; a segment's code is its position
+        tones: Tone names; a tone's code is its position
+        tone_by_segment: Segment name → tone name
+        inactivity_thresholds: Sorted minutes_inactive thresholds the rules
+            test; a user's segment can only change through inactivity when
+            their minutes_inactive crosses one of them
+    """
+
+    def __init__(self, config: Mapping[str, Any]):
+        default = config.get("default")
+        if not default or "segment" not in default or "tone" not in default:
+            raise ValueError("Rule config needs a default with 'segment' and 'tone'")
+
+        self.tone_by_segment: Dict[str, str] = {}
+        self._rules: List[Tuple[str, Tuple[Condition, ...]]] = []
+
+        for index, rule in enumerate(config.get("rules", [])):
+            segment = rule.get("segment")
+            if not segment or "tone" not in rule:
+                raise ValueError(f"Rule {index} needs 'segment' and 'tone'")
+            self._add_segment(segment, rule["tone"])
+            self._rules.append((segment, self._compile_conditions(index, rule.get("when", {}))))
+
+        self.default_segment = default["segment"]
+        self._add_segment(self.default_segment, default["tone"])
+
+        self.segments: Tuple[str, ...] = tuple(self.tone_by_segment)
+        self.tones: Tuple[str, ...] = tuple(dict.fromkeys(self.tone_by_segment.values()))
+        self.segment_codes = {segment: code for code, segment in enumerate(self.segments)}
+        self.tone_codes = {tone: code for code, tone in enumerate(self.tones)}
+        self.inactivity_thresholds: Tuple[float, ...] = tuple(sorted({
+            threshold
+            for _, conditions in self._rules
+            for feature, _, threshold in conditions
+            if feature == "minutes_inactive"
+        }))
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def _add_segment(self, segment: str, tone: str) -> None:
+        known = self.tone_by_segment.setdefault(segment, tone)
+        if known != tone:
+            raise ValueError(f"Segment '{segment}' mapped to both '{known}' and '{tone}'")
+
+    @staticmethod
+    def _compile_conditions(index: int, when: Mapping[str, Mapping[str, Any]]) -> Tuple[Condition, ...]:
+        conditions = []
+        for feature, tests in when.items():
+            if feature not in FEATURES:
+                raise ValueError(f"Rule {index}: unknown feature '{feature}' (expected one of {FEATURES})")
+            for symbol, threshold in tests.items():
+                if symbol not in OPERATORS:
+                    raise ValueError(f"Rule {index}: unknown operator '{symbol}'")
+                conditions.append((feature, OPERATORS[symbol], float(threshold)))
+        return tuple(conditions)
+
+    def classify(self, features: Mapping[str, float]) -> str:
+        """
+        Segment for one user.
+
+        Args:
+            features: Values for the features the rules test (see FEATURES).
+                Missing values (None or NaN) never satisfy a condition, as in
+                classify_arrays.
+        """
+        for segment, conditions in self._rules:
+            for feature, test, threshold in conditions:
+                value = features[feature]
+                # NaN != NaN; without this check "!=" would match it
+                if value is None or value != value or not test(value, threshold):
+                    break
+            else:
+                return segment
+        return self.default_segment
+
+    def tone_for(self, segment: str) -> str:
+        return self.tone_by_segment.get(segment, self.tone_by_segment[self.default_segment])
+
+    def classify_arrays(self, features: Mapping[str, Any]):
+        """
+        Segment codes for many users at once.
+
+        Each rule is one vectorized mask over the users not yet assigned, so
+        cost is O(rules x users) in NumPy with an early exit once every user
+        has a segment.
+
+        Args:
+            features: Feature name → NumPy array (all the same length). NaN
+                never satisfies a condition.
+
+        Returns:
+            Integer array of segment codes (index into `segments`)
+        """
+        import numpy as np
+
+        size = len(next(iter(features.values())))
+        codes = np.full(size, self.segment_codes[self.default_segment], dtype=np.min_scalar_type(len(self.segments)))
+        unassigned = np.ones(size, dtype=bool)
+
+        with np.errstate(invalid="ignore"):
+            for segment, conditions in self._rules:
+                mask = unassigned.copy()
+                for feature, test, threshold in conditions:
+                    values = np.asarray(features[feature], dtype=float)
+                    # NaN compares unequal to everything, so mask it out explicitly
+                    mask &= ~np.isnan(values)
+                    mask &= test(values, threshold)
+                codes[mask] = self.segment_codes[segment]
+                unassigned &= ~mask
+                if not unassigned.any():
+                    break
+
+        return codes
+
+    def tone_codes_for(self, segment_codes):
+        """Map an array of segment codes to tone codes."""
+        import numpy as np
+
+        lookup = np.array(
+            [self.tone_codes[self.tone_by_segment[segment]] for segment in self.segments],
+            dtype=np.min_scalar_type(len(self.tones))
+        )
+        return lookup[segment_codes]
+
+
+class RuleSetLoader:
+    """
+    Serves the compiled RuleSet for a config file, recompiling on mtime change.
+    """
+
+    def __init__(self, path: str = SEGMENT_RULES_PATH, check_interval: float = RELOAD_CHECK_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._rule_set: Optional[RuleSet] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def get(self) -> RuleSet:
+        now = time.monotonic()
+        if self._rule_set is None or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if self._rule_set is None or now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    self._reload_if_changed()
+        return self._rule_set
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+
+        if self._rule_set is not None and mtime == self._mtime:
+            return
+
+        try:
+            if mtime is None:
+                config = default_config()
+            else:
+                with open(self.path) as config_file:
+                    config = json.load(config_file)
+            rule_set = RuleSet(config)
+        except Exception:
+            if self._rule_set is None:
+                # Nothing to fall back to but the built-in rules
+                logger.exception(f"Invalid segment rules in {self.path}; using built-in rules")
+                self._rule_set = RuleSet(default_config())
+            else:
+                logger.exception(f"Invalid segment rules in {self.path}; keeping previous rules")
+            self._mtime = mtime
+            return
+
+        if self._rule_set is not None:
+            logger.info(f"Reloaded {len(rule_set)} segment rules from {self.path}")
+        self._rule_set = rule_set
+        self._mtime = mtime
+
+
+_loader = RuleSetLoader()
+
+
+def get_rule_set() -> RuleSet:
+    """The current segmentation rules (reloaded if the config file changed)."""
+    return _loader.get()
@@ -2,68 +2,83 @@
 User Segmentation Module
 
 This module handles rule-based user segmentation for the engagement system.
-It categorizes users based on their activity patterns and account age.
+It categorizes users based on their activity patterns, account age and churn
+risk. The rules themselves live in a compiled RuleSet (see rules.py).
 """
 
 from datetime import datetime, timedelta
-from typing import Literal
+from typing import Optional
 
-# Segment types
-SegmentType = Literal["dormant", "loyal", "normal"]
+from .rules import get_rule_set
+
+# Segment names come from the rule set (built-in: "dormant", "loyal", "normal")
+SegmentType = str
 
 # Segmentation thresholds (in MINUTES for easier testing)
 # In production, these would be DAYS (e.g., 3 days for dormant, 30 days for loyal)
+# Used by the built-in rules when no SEGMENT_RULES_PATH config file exists
 DORMANT_THRESHOLD_MINUTES = 60
 LOYAL_THRESHOLD_MINUTES = 5
 
 
-def calculate_minutes_since_activity(last_active_at: datetime) -> float:
+def calculate_minutes_since_activity(last_active_at: datetime, now: Optional[datetime] = None) -> float:
     """
     Calculate the number of minutes since the user was last active.
     """
-    current_time = datetime.utcnow()
+    current_time = now or datetime.utcnow()
     time_diff = current_time - last_active_at
     return time_diff.total_seconds() / 60
 
 
-def calculate_account_age_minutes(created_at: datetime) -> float:
+def calculate_account_age_minutes(created_at: datetime, now: Optional[datetime] = None) -> float:
     """
     Calculate the age of the user's account in minutes.
     """
-    current_time = datetime.utcnow()
+    current_time = now or datetime.utcnow()
     time_diff = current_time - created_at
     return time_diff.total_seconds() / 60
 
 
-def determine_user_segment(created_at: datetime, last_active_at: datetime) -> SegmentType:
+def segment_for(minutes_inactive: float, account_age_minutes: float, churn_risk_score: float = 0.0) -> SegmentType:
+    """
+    Apply the segmentation rules to already computed features.
+    """
+    return get_rule_set().classify({
+        "minutes_inactive": minutes_inactive,
+        "account_age_minutes": account_age_minutes,
+        "churn_risk_score": churn_risk_score
+    })
+
+
+def determine_user_segment(
+    created_at: datetime,
+    last_active_at: datetime,
+    now: Optional[datetime] = None,
+    churn_risk_score: float = 0.0
+) -> SegmentType:
     """
     Determine user segment based on activity and account age.
     
-    Segmentation Rules (Optimized for fast testing):
-    - If inactive for >= 2 minutes → "dormant" (needs re-engagement)
+    Built-in Segmentation Rules (Optimized for fast testing):
+    - If inactive for >= 60 minutes → "dormant" (needs re-engagement)
     - If account age >= 5 minutes AND active → "loyal" (established user)
     - Otherwise → "normal" (new or casual user)
     
     Args:
         created_at: User's account creation timestamp
         last_active_at: User's last activity timestamp
+        now: Reference time (defaults to utcnow, read once for both checks)
+        churn_risk_score: User's churn risk, for rule sets that test it
         
     Returns:
-        User segment: "dormant", "loyal", or "normal"
+        User segment name from the active rule set
     """
-    minutes_inactive = calculate_minutes_since_activity(last_active_at)
-    account_age_minutes = calculate_account_age_minutes(created_at)
-    
-    # Check dormant first (highest priority)
-    if minutes_inactive >= DORMANT_THRESHOLD_MINUTES:
-        return "dormant"
-    
-    # Check if loyal (established user who is active)
-    if account_age_minutes >= LOYAL_THRESHOLD_MINUTES:
-        return "loyal"
-    
-    # Default to normal (new users or casual active users)
-    return "normal"
+    now = now or datetime.utcnow()
+    return segment_for(
+        calculate_minutes_since_activity(last_active_at, now),
+        calculate_account_age_minutes(created_at, now),
+        churn_risk_score or 0.0
+    )
 
 
 def get_tone_for_segment(segment: SegmentType) -> str:
@@ -74,11 +89,8 @@ def get_tone_for_segment(segment: SegmentType) -> str:
     - dormant → "playful" (re-engagement: "We miss you!")
     - loyal → "warm" (appreciation: "Glad you're here!")
     - normal → "neutral" (standard updates)
-    """
-    tone_mapping = {
-        "dormant": "playful",
-        "loyal": "warm",
-        "normal": "neutral"
-    }
     
-    return tone_mapping.get(segment, "neutral")
+    Segments added by a rule config carry their own tone; unknown
+    segments get the default segment's tone.
+    """
+    return get_rule_set().tone_for(segment)
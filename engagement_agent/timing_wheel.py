@@ -0,0 +1,199 @@
+"""
+Inactivity Timing Wheel
+
+Finding the users who crossed INACTIVITY_THRESHOLD_SECONDS or a segment
+rule's minutes_inactive threshold by calling is_user_inactive /
+determine_user_segment on every user is a full scan. This module keeps users bucketed by the time
+slot in which their deadline expires instead, so each tick only visits the
+slots that elapsed since the previous tick:
+
+- record_activity() moves a user to a new slot: O(1)
+- tick() returns the users whose deadlines expired since the last tick: O(k)
+
+It does NOT:
+- Write to the database
+- Decide eligibility (that stays in decision_logic)
+
+It ONLY:
+- Tracks activity deadlines in memory
+- Reports inactivity and segment-threshold transitions
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Optional, Sequence, Set
+
+from .decision_logic import INACTIVITY_THRESHOLD_SECONDS
+from .rules import get_rule_set
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel over absolute time slots of `resolution_seconds`.
+
+    A key fires on the first tick at or after `start + delay`, never before,
+    and at most `resolution_seconds` late. Each key holds a single deadline;
+    scheduling it again replaces the previous one.
+    """
+
+    def __init__(self, delay_seconds: float, resolution_seconds: float = 1.0, now: Optional[datetime] = None):
+        self.delay = timedelta(seconds=delay_seconds)
+        self.resolution = timedelta(seconds=resolution_seconds)
+        self._buckets: Dict[int, Set[Hashable]] = {}
+        self._slots: Dict[Hashable, int] = {}
+        self._cursor = self._slot(now or datetime.utcnow())
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def _slot(self, moment: datetime) -> int:
+        return (moment - _EPOCH) // self.resolution
+
+    def schedule(self, key: Hashable, start: datetime) -> bool:
+        """
+        (Re)schedule `key` to fire `delay` after `start`.
+
+        Returns:
+            False if that deadline already passed (the key is not tracked)
+        """
+        # Round up to the next slot so keys never fire early
+        slot = self._slot(start + self.delay) + 1
+        self.cancel(key)
+        if slot <= self._cursor:
+            return False
+        self._buckets.setdefault(slot, set()).add(key)
+        self._slots[key] = slot
+        return True
+
+    def cancel(self, key: Hashable) -> None:
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            bucket = self._buckets[slot]
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[slot]
+
+    def advance(self, now: Optional[datetime] = None) -> List[Hashable]:
+        """Remove and return every key whose deadline expired since the last advance."""
+        target = self._slot(now or datetime.utcnow())
+        if target <= self._cursor:
+            return []
+
+        # After a long pause, walking the occupied slots beats walking every elapsed slot
+        if target - self._cursor > len(self._buckets):
+            slots = sorted(slot for slot in self._buckets if slot <= target)
+        else:
+            slots = [slot for slot in range(self._cursor + 1, target + 1) if slot in self._buckets]
+
+        expired: List[Hashable] = []
+        for slot in slots:
+            bucket = self._buckets.pop(slot)
+            for key in bucket:
+                del self._slots[key]
+            expired.extend(bucket)
+
+        self._cursor = target
+        return expired
+
+
+class InactivityIndex:
+    """
+    Tracks every recently active user against the inactivity threshold and
+    the segment rules' minutes_inactive thresholds.
+
+    The segment wheel holds one deadline per user: the next rule threshold
+    their inactivity will cross. After it fires, the caller re-classifies the
+    user and calls schedule_segment_change() again to queue the next one.
+    """
+
+    def __init__(
+        self,
+        inactive_seconds: float = INACTIVITY_THRESHOLD_SECONDS,
+        segment_thresholds_minutes: Optional[Sequence[float]] = None,
+        resolution_seconds: float = 1.0,
+        now: Optional[datetime] = None
+    ):
+        if segment_thresholds_minutes is None:
+            segment_thresholds_minutes = get_rule_set().inactivity_thresholds
+        now = now or datetime.utcnow()
+        self.thresholds = tuple(timedelta(minutes=minutes) for minutes in sorted(set(segment_thresholds_minutes)))
+        self.inactive = TimingWheel(inactive_seconds, resolution_seconds, now)
+        # Zero delay: keys are scheduled at their absolute threshold time
+        self.segments = TimingWheel(0, resolution_seconds, now)
+
+    def __len__(self) -> int:
+        return max(len(self.inactive), len(self.segments))
+
+    @property
+    def horizon(self) -> timedelta:
+        """Inactivity after which a user has no pending transition."""
+        return max(self.thresholds + (self.inactive.delay,))
+
+    def record_activity(self, user_id: int, last_active_at: datetime) -> None:
+        """Restart both deadlines for a user from `last_active_at`."""
+        self.inactive.schedule(user_id, last_active_at)
+        self.schedule_segment_change(user_id, last_active_at)
+
+    def schedule_segment_change(self, user_id: int, last_active_at: datetime) -> bool:
+        """
+        Queue the user for the first segment threshold still ahead of them.
+
+        Returns:
+            False if every threshold already passed (the user is not tracked)
+        """
+        for threshold in self.thresholds:
+            if self.segments.schedule(user_id, last_active_at + threshold):
+                return True
+        self.segments.cancel(user_id)
+        return False
+
+    def remove(self, user_id: int) -> None:
+        self.inactive.cancel(user_id)
+        self.segments.cancel(user_id)
+
+    def tick(self, now: Optional[datetime] = None) -> Dict[str, List[int]]:
+        """
+        Users who crossed a threshold since the previous tick.
+
+        Returns:
+            {"inactive": [user IDs], "segment": [user IDs]}
+        """
+        now = now or datetime.utcnow()
+        return {
+            "inactive": self.inactive.advance(now),
+            "segment": self.segments.advance(now)
+        }
+
+    @classmethod
+    def rebuild(cls, db_session, chunk_size: int = 10000, **kwargs) -> "InactivityIndex":
+        """
+        Build the index from the users table.
+
+        Users inactive for longer than every threshold have no pending
+        transition, so only users active within the horizon are loaded
+        (a range scan on last_active_at).
+
+        Args:
+            db_session: Database session
+            chunk_size: Rows streamed per fetch
+            kwargs: Passed to the constructor (thresholds, resolution)
+
+        Returns:
+            A populated InactivityIndex
+        """
+        from backend.models import User
+
+        index = cls(**kwargs)
+        since = datetime.utcnow() - index.horizon
+
+        rows = db_session.query(User.id, User.last_active_at).filter(
+            User.last_active_at > since
+        ).yield_per(chunk_size)
+        for user_id, last_active_at in rows:
+            index.record_activity(user_id, last_active_at)
+
+        return index
@@ -0,0 +1,87 @@
+"""
+Template Bandit
+
+Thompson-sampling bandit over template variants. Each arm is a
+(segment, tone, template_id) triple with a Beta(1 + successes,
+1 + trials - successes) posterior, where a trial is a sent message and a
+success is an open. Looking up an arm is O(1); choosing among a tone's
+variants draws each variant's posterior once per user.
+
+Draws use the posterior's normal approximation (mean + sd * z) with z
+fixed by (user_id, cycle_id) (variants.variant_normals), so with the same
+arm counts a user gets the same variant in the same cycle, whatever else
+is in the batch.
+
+It does NOT:
+- Persist arm counts (see backend/template_arms.py)
+- Render messages
+
+It ONLY:
+- Keeps arm counts in memory
+- Picks variants by sampling the posteriors
+"""
+
+from typing import Dict, Mapping, Sequence, Tuple
+
+from .variants import variant_normals
+
+ArmKey = Tuple[str, str, int]  # (segment, tone, template_id)
+
+
+class TemplateBandit:
+    """
+    Beta-Bernoulli Thompson sampling over template variants.
+    """
+
+    def __init__(self):
+        # Arm → (trials, successes)
+        self._arms: Dict[ArmKey, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._arms)
+
+    def load(self, arms: Mapping[ArmKey, Tuple[int, int]]) -> None:
+        """Replace all arm counts with (trials, successes) per arm."""
+        loaded = {key: (int(trials), int(successes)) for key, (trials, successes) in arms.items()}
+        # Swapped in whole, so readers never see a half-loaded table
+        self._arms = loaded
+
+    def counts(self, key: ArmKey) -> Tuple[int, int]:
+        return self._arms.get(key, (0, 0))
+
+    @property
+    def arms(self) -> Mapping[ArmKey, Tuple[int, int]]:
+        """Current (trials, successes) per arm (replaced, never mutated, by load)."""
+        return self._arms
+
+    def select_many(self, segment: str, tone: str, template_ids: Sequence[int], blocked, user_ids, cycle_id: int):
+        """
+        Pick a variant for each of a batch of users.
+
+        Args:
+            segment: Users' segment
+            tone: Message tone
+            template_ids: Template IDs of the candidate variants
+            blocked: (users, slots) matrix of variant indexes each user must
+                not get, -1 for none (message_generation.variants.blocked_variants)
+            user_ids: User IDs, aligned with `blocked`
+            cycle_id: Cycle the messages belong to (seeds the draws with user_ids)
+
+        Returns:
+            int64 array of indexes into `template_ids`
+        """
+        import numpy as np
+
+        arms = self._arms
+        counts = np.array([arms.get((segment, tone, template_id), (0, 0)) for template_id in template_ids], dtype=float)
+        alphas = 1 + counts[:, 1]
+        betas = 1 + np.maximum(counts[:, 0] - counts[:, 1], 0)
+        totals = alphas + betas
+        means = alphas / totals
+        deviations = np.sqrt(alphas * betas / (totals * totals * (totals + 1)))
+
+        samples = means + deviations * variant_normals(user_ids, cycle_id, len(template_ids))
+
+        users, slots = np.nonzero(blocked >= 0)
+        samples[users, blocked[users, slots]] = -np.inf
+        return samples.argmax(axis=1)
@@ -4,8 +4,10 @@ Message Generation Module
 Generates engagement message content based on tone and user context.
 """
 
-import random
-from typing import Dict, Any
+from typing import Dict, Any, List, Sequence, Tuple
+
+from .template_engine import TemplateLibrary
+from .variants import MAX_TEMPLATE_ID, blocked_variants, choose_variants, push_history
 
 # Message templates by tone - App-to-User engagement messages
 MESSAGE_TEMPLATES = {
@@ -43,6 +45,15 @@ MESSAGE_TEMPLATES = {
 }
 
 
+# Compiled once at import; a template using any placeholder other than
+# {name} fails here instead of on the first message that picks it
+ENGAGEMENT_TEMPLATES = TemplateLibrary(MESSAGE_TEMPLATES, allowed_fields={"name"}, fallback="neutral")
+
+# Template IDs must fit the per-user history ring
+if sum(len(variants) for variants in MESSAGE_TEMPLATES.values()) > MAX_TEMPLATE_ID + 1:
+    raise ValueError("Too many engagement templates for the recent-template history ring")
+
+
 def generate_message(tone: str, context: Dict[str, Any]) -> str:
     """
     Generate an engagement message based on tone and user context.
@@ -54,13 +65,65 @@ def generate_message(tone: str, context: Dict[str, Any]) -> str:
     Returns:
         Generated message string
     """
-    # Get templates for the specified tone
-    templates = MESSAGE_TEMPLATES.get(tone, MESSAGE_TEMPLATES["neutral"])
+    # Random variant for the tone (neutral for unknown tones), pre-compiled
+    return ENGAGEMENT_TEMPLATES.render(tone, context)
+
+
+def render_many(tone: str, names: Sequence[str]) -> List[str]:
+    """
+    Generate one engagement message per name in a single pass.
     
-    # Select a random template
-    template = random.choice(templates)
+    Args:
+        tone: Message tone
+        names: User names, one message each
+        
+    Returns:
+        Messages in the same order as `names`
+    """
+    return ENGAGEMENT_TEMPLATES.render_many(tone, names)
+
+
+def allocate_messages(
+    tone: str,
+    user_ids: Sequence[int],
+    names: Sequence[str],
+    cycle_id: int,
+    histories: Sequence[int],
+    bandit=None,
+    segment: str = ""
+) -> Tuple[List[str], List[int], List[int]]:
+    """
+    Generate messages for a batch of users, choosing each user's variant.
+    
+    Without a bandit, each user's variant depends only on (user_id, cycle_id).
+    With a bandit, variants are Thompson-sampled from the open rates of
+    (segment, tone, template), with each user's draws seeded by
+    (user_id, cycle_id), so good templates are sent more often and a user's
+    variant depends only on the bandit's arm counts, never on the rest of
+    the batch. Either way the templates in a user's recent-template history
+    are skipped.
     
-    # Format with user context
-    message = template.format(**context)
+    Args:
+        tone: Message tone
+        user_ids: User IDs
+        names: User names, aligned with user_ids
+        cycle_id: Cycle the messages belong to
+        histories: Packed recent-template rings (users.recent_templates)
+        bandit: Optional TemplateBandit (message_generation.bandit)
+        segment: Users' segment, for the bandit's arms
+        
+    Returns:
+        (messages, template IDs, updated histories), all aligned with user_ids
+    """
+    template_ids = ENGAGEMENT_TEMPLATES.template_ids(tone)
+    histories = [history or 0 for history in histories]
+    if bandit is None:
+        choices = choose_variants(user_ids, cycle_id, template_ids, histories).tolist()
+    else:
+        blocked = blocked_variants(histories, template_ids)
+        choices = bandit.select_many(segment, tone, template_ids, blocked, user_ids, cycle_id).tolist()
     
-    return message
+    messages = ENGAGEMENT_TEMPLATES.render_choices(tone, choices, names)
+    chosen_ids = [template_ids[choice] for choice in choices]
+    updated = [push_history(history, template_id) for history, template_id in zip(histories, chosen_ids)]
+    return messages, chosen_ids, updated
@@ -0,0 +1,218 @@
+"""
+Template Engine
+
+Message templates use str.format syntax ("Hi {name}!"). Instead of
+re-parsing a template with str.format on every message, each template is
+parsed once into a CompiledTemplate: its literal text split around known
+placeholder slots. Rendering is then plain string concatenation.
+
+It does NOT:
+- Decide which tone or template family to use
+- Support positional ({0}) or attribute/index ({user.name}) placeholders
+
+It ONLY:
+- Compiles and validates templates at load time
+- Renders single messages and batches of messages
+"""
+
+import random
+from string import Formatter
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+_FORMATTER = Formatter()
+
+_CONVERSIONS = {"s": str, "r": repr, "a": ascii}
+
+
+class CompiledTemplate:
+    """
+    A template parsed once into literal text and placeholder slots.
+
+    Attributes:
+        text: Original template text
+        fields: Placeholder names the template needs in its context
+    """
+
+    __slots__ = ("text", "fields", "_head", "_slots", "_simple")
+
+    def __init__(self, text: str):
+        self.text = text
+
+        slots = []
+        head = ""
+        for literal, field_name, format_spec, conversion in _FORMATTER.parse(text):
+            # Escaped braces ({{ / }}) split the literal text into several chunks
+            if not slots:
+                head += literal
+            elif literal:
+                # Literal text following the previous slot
+                name, spec, conv, tail = slots[-1]
+                slots[-1] = (name, spec, conv, tail + literal)
+
+            if field_name is None:
+                continue
+            if not field_name.isidentifier():
+                raise ValueError(f"Unsupported placeholder '{{{field_name}}}' in template: {text!r}")
+            if format_spec and "{" in format_spec:
+                raise ValueError(f"Nested placeholders are not supported in template: {text!r}")
+            slots.append((field_name, format_spec or "", conversion, ""))
+
+        self._head = head
+        self._slots: Tuple[Tuple[str, str, Optional[str], str], ...] = tuple(slots)
+        self._simple = all(not spec and not conv for _, spec, conv, _ in slots)
+        self.fields: FrozenSet[str] = frozenset(name for name, _, _, _ in slots)
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate({self.text!r})"
+
+    def missing(self, context: Mapping[str, Any]) -> FrozenSet[str]:
+        """Placeholders the context does not provide."""
+        return self.fields.difference(context)
+
+    def render(self, context: Mapping[str, Any]) -> str:
+        """
+        Fill the placeholders from `context` (same output as str.format).
+
+        Raises:
+            KeyError: If a placeholder is missing from the context
+        """
+        out = self._head
+        if self._simple:
+            for name, _, _, tail in self._slots:
+                out += str(context[name]) + tail
+            return out
+
+        for name, spec, conversion, tail in self._slots:
+            value = context[name]
+            if conversion:
+                value = _CONVERSIONS[conversion](value)
+            out += format(value, spec) + tail
+        return out
+
+    def render_values(self, field: str, values: Iterable[Any]) -> List[str]:
+        """
+        Render one message per value of a template's single placeholder.
+
+        Templates without placeholders repeat their text; templates with
+        other placeholders fall back to render().
+        """
+        if not self._slots:
+            # The rendered text, with escaped braces resolved
+            return [self._head for _ in values]
+        if self._simple and len(self._slots) == 1 and self._slots[0][0] == field:
+            head, tail = self._head, self._slots[0][3]
+            return [head + str(value) + tail for value in values]
+        return [self.render({field: value}) for value in values]
+
+
+class TemplateLibrary:
+    """
+    Compiled template variants grouped by key (e.g. tone).
+
+    Every variant also gets a template ID, numbered consecutively in
+    definition order, so IDs stay stable as long as templates are only
+    appended.
+
+    Args:
+        templates: Key → list of template texts
+        allowed_fields: If given, every template may only use these
+            placeholders; anything else is rejected at load time
+        fallback: Key used for unknown keys
+    """
+
+    def __init__(
+        self,
+        templates: Mapping[str, Sequence[str]],
+        allowed_fields: Optional[Iterable[str]] = None,
+        fallback: Optional[str] = None
+    ):
+        allowed = frozenset(allowed_fields) if allowed_fields is not None else None
+
+        self.templates: Dict[str, Tuple[CompiledTemplate, ...]] = {}
+        self._ids: Dict[str, range] = {}
+        next_id = 0
+        for key, texts in templates.items():
+            compiled = tuple(CompiledTemplate(text) for text in texts)
+            if not compiled:
+                raise ValueError(f"No templates for '{key}'")
+            for template in compiled:
+                if allowed is not None and not template.fields <= allowed:
+                    unknown = ", ".join(sorted(template.fields - allowed))
+                    raise ValueError(f"Template for '{key}' uses unknown placeholders ({unknown}): {template.text!r}")
+            self.templates[key] = compiled
+            self._ids[key] = range(next_id, next_id + len(compiled))
+            next_id += len(compiled)
+
+        if fallback is not None and fallback not in self.templates:
+            raise ValueError(f"Fallback '{fallback}' has no templates")
+        self.fallback = fallback
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.templates
+
+    def resolve(self, key: str) -> str:
+        """The key actually used for `key` (the fallback for unknown keys)."""
+        if key in self.templates:
+            return key
+        if self.fallback is None:
+            raise KeyError(key)
+        return self.fallback
+
+    def variants(self, key: str) -> Tuple[CompiledTemplate, ...]:
+        return self.templates[self.resolve(key)]
+
+    def template_ids(self, key: str) -> range:
+        """Template IDs of the variants for `key`, in variant order."""
+        return self._ids[self.resolve(key)]
+
+    def render(self, key: str, context: Mapping[str, Any], rng=random) -> str:
+        """Render a randomly chosen variant for `key`."""
+        return rng.choice(self.variants(key)).render(context)
+
+    def render_many(self, key: str, values: Sequence[Any], field: str = "name", rng=random) -> List[str]:
+        """
+        Render one message per value, each with a randomly chosen variant.
+
+        Messages are grouped by chosen variant, so each variant's slots are
+        looked up once per batch rather than once per message.
+
+        Args:
+            key: Template key (e.g. tone)
+            values: Placeholder values, one message each (e.g. user names)
+            field: Placeholder the values fill
+            rng: Random source (random module or a random.Random instance)
+
+        Returns:
+            Messages in the same order as `values`
+        """
+        variants = self.variants(key)
+        if len(variants) == 1:
+            return variants[0].render_values(field, values)
+
+        choices = rng.choices(range(len(variants)), k=len(values))
+        return self.render_choices(key, choices, values, field)
+
+    def render_choices(self, key: str, choices: Sequence[int], values: Sequence[Any], field: str = "name") -> List[str]:
+        """
+        Render one message per value with an explicitly chosen variant each.
+
+        Args:
+            key: Template key (e.g. tone)
+            choices: Variant index per message, aligned with `values`
+            values: Placeholder values, one message each
+            field: Placeholder the values fill
+
+        Returns:
+            Messages in the same order as `values`
+        """
+        variants = self.variants(key)
+        positions: Dict[int, List[int]] = {}
+        for position, choice in enumerate(choices):
+            positions.setdefault(int(choice), []).append(position)
+
+        messages: List[Optional[str]] = [None] * len(values)
+        for choice, indexes in positions.items():
+            rendered = variants[choice].render_values(field, [values[i] for i in indexes])
+            for i, message in zip(indexes, rendered):
+                messages[i] = message
+        return messages
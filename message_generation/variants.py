@@ -0,0 +1,194 @@
+"""
+Variant Allocation
+
+Picks which template variant a user gets without shared random state:
+
+- The starting variant is a fast 64-bit hash (SplitMix64) of
+  (user_id, cycle_id), so the same user in the same cycle always gets the
+  same variant and allocations can be replayed for A/B analysis.
+- Variants the user received in their last TEMPLATE_HISTORY_SIZE messages
+  are skipped by probing forward to the next variant.
+
+The per-user history is a ring of template IDs packed into one integer
+(TEMPLATE_ID_BITS bits per slot, most recent in the lowest bits, 0 = empty),
+stored in users.recent_templates.
+
+choose_variant and choose_variants implement the same algorithm, per user
+and over NumPy arrays for batch cycles. variant_normals derives random
+draws from the same hash, for the template bandit.
+"""
+
+from typing import List, Sequence
+
+TEMPLATE_HISTORY_SIZE = 3
+TEMPLATE_ID_BITS = 10
+
+# Template IDs are stored +1 so 0 marks an empty slot
+MAX_TEMPLATE_ID = (1 << TEMPLATE_ID_BITS) - 2
+
+_SLOT_MASK = (1 << TEMPLATE_ID_BITS) - 1
+_RING_MASK = (1 << (TEMPLATE_ID_BITS * TEMPLATE_HISTORY_SIZE)) - 1
+_MASK64 = (1 << 64) - 1
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+
+
+# ---------------------------------------------------
+# Hashing
+# ---------------------------------------------------
+
+def variant_hash(user_id: int, cycle_id: int) -> int:
+    """SplitMix64 of (user_id, cycle_id) as an unsigned 64-bit int."""
+    z = (((user_id & 0xFFFFFFFF) << 32) ^ (cycle_id & 0xFFFFFFFF)) + _GOLDEN & _MASK64
+    z = (z ^ (z >> 30)) * _MIX1 & _MASK64
+    z = (z ^ (z >> 27)) * _MIX2 & _MASK64
+    return z ^ (z >> 31)
+
+
+def _mix64(z):
+    import numpy as np
+
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+
+def _variant_hashes(user_ids, cycle_id: int):
+    import numpy as np
+
+    keys = (np.asarray(user_ids, dtype=np.uint64) & np.uint64(0xFFFFFFFF)) << np.uint64(32)
+    return _mix64((keys ^ np.uint64(cycle_id & 0xFFFFFFFF)) + np.uint64(_GOLDEN))
+
+
+def variant_normals(user_ids, cycle_id: int, count: int):
+    """
+    `count` standard normal draws per user, fixed by (user_id, cycle_id).
+
+    Draw j of a user is Box-Muller over SplitMix64(variant_hash + (j + 1) *
+    golden), so it does not depend on the other users in the batch.
+
+    Returns:
+        (users, count) float64 array
+    """
+    import numpy as np
+
+    offsets = np.arange(1, count + 1, dtype=np.uint64) * np.uint64(_GOLDEN)
+    z = _mix64(_variant_hashes(user_ids, cycle_id)[:, None] + offsets[None, :])
+    # Two 32-bit uniforms in (0, 1) per draw
+    u1 = ((z >> np.uint64(32)).astype(np.float64) + 0.5) / 2**32
+    u2 = ((z & np.uint64(0xFFFFFFFF)).astype(np.float64) + 0.5) / 2**32
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+# ---------------------------------------------------
+# History Ring
+# ---------------------------------------------------
+
+def history_ids(history: int) -> List[int]:
+    """Template IDs in a packed history, most recent first."""
+    ids = []
+    for slot in range(TEMPLATE_HISTORY_SIZE):
+        value = (history >> (slot * TEMPLATE_ID_BITS)) & _SLOT_MASK
+        if value:
+            ids.append(value - 1)
+    return ids
+
+
+def push_history(history: int, template_id: int) -> int:
+    """Record `template_id` as the most recent entry, dropping the oldest."""
+    if not 0 <= template_id <= MAX_TEMPLATE_ID:
+        raise ValueError(f"Template ID {template_id} does not fit in the history ring")
+    return (((history or 0) << TEMPLATE_ID_BITS) | (template_id + 1)) & _RING_MASK
+
+
+# ---------------------------------------------------
+# Allocation
+# ---------------------------------------------------
+
+def _blocking_slots(variant_count: int) -> int:
+    # Always leave at least one variant available
+    return min(TEMPLATE_HISTORY_SIZE, variant_count - 1)
+
+
+def choose_variant(user_id: int, cycle_id: int, variant_ids: Sequence[int], history: int = 0) -> int:
+    """
+    Pick a variant for one user.
+
+    Args:
+        user_id: User's ID
+        cycle_id: Cycle the message belongs to
+        variant_ids: Template IDs of the candidate variants (contiguous range)
+        history: User's packed recent-template ring
+
+    Returns:
+        Index into `variant_ids`
+    """
+    count = len(variant_ids)
+    first = variant_ids[0]
+    blocked = {
+        template_id - first
+        for template_id in history_ids(history or 0)[:_blocking_slots(count)]
+        if first <= template_id < first + count
+    }
+
+    index = variant_hash(user_id, cycle_id) % count
+    while index in blocked:
+        index = (index + 1) % count
+    return index
+
+
+def blocked_variants(histories, variant_ids: Sequence[int]):
+    """
+    Variants each user must not get again, from their packed rings.
+
+    Args:
+        histories: Array-like of packed rings
+        variant_ids: Template IDs of the candidate variants (contiguous range)
+
+    Returns:
+        (users, slots) int64 matrix of indexes into `variant_ids`, -1 where
+        a slot is empty or holds a template of another family
+    """
+    import numpy as np
+
+    count = len(variant_ids)
+    first = variant_ids[0]
+    histories = np.asarray(histories, dtype=np.int64)
+
+    slots = _blocking_slots(count)
+    blocked = np.full((len(histories), max(slots, 1)), -1, dtype=np.int64)
+    for slot in range(slots):
+        local = ((histories >> (slot * TEMPLATE_ID_BITS)) & _SLOT_MASK) - 1 - first
+        blocked[:, slot] = np.where((local >= 0) & (local < count), local, -1)
+    return blocked
+
+
+def choose_variants(user_ids, cycle_id: int, variant_ids: Sequence[int], histories):
+    """
+    Vectorized choose_variant for a batch of users (same results).
+
+    Args:
+        user_ids: Array-like of user IDs
+        cycle_id: Cycle the messages belong to
+        variant_ids: Template IDs of the candidate variants (contiguous range)
+        histories: Array-like of packed rings, aligned with user_ids
+
+    Returns:
+        int64 array of indexes into `variant_ids`
+    """
+    import numpy as np
+
+    count = len(variant_ids)
+    slots = _blocking_slots(count)
+    blocked = blocked_variants(histories, variant_ids)
+
+    index = (_variant_hashes(user_ids, cycle_id) % np.uint64(count)).astype(np.int64)
+    # Linear probing past a set of `slots` entries takes at most `slots` steps
+    for _ in range(slots):
+        clash = (blocked == index[:, None]).any(axis=1)
+        if not clash.any():
+            break
+        index = np.where(clash, (index + 1) % count, index)
+    return index
@@ -24,6 +24,17 @@ def reset_for_demo():
     deleted_messages = cursor.rowcount
     print(f"✓ Cleared {deleted_messages} old messages")
     
+    # Broadcast deliveries count as recent messages too
+    cursor.execute("DELETE FROM broadcast_deliveries;")
+    cursor.execute("DELETE FROM broadcast_jobs;")
+    deleted_broadcasts = cursor.rowcount
+    print(f"✓ Cleared {deleted_broadcasts} old broadcasts")
+    
+    # Counters derived from the cleared messages (rebuilt from empty logs = empty)
+    cursor.execute("DELETE FROM engagement_rollups;")
+    cursor.execute("DELETE FROM template_arms;")
+    print("✓ Cleared engagement rollups and template arm counters")
+    
     # Step 2: Make all users inactive (2 minutes ago)
     # This ensures they pass the 60-second inactivity threshold
     cursor.execute("""
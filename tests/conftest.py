@@ -0,0 +1,87 @@
+import os
+import sys
+
+import pytest
+
+# Keep test imports of backend.database off the on-disk development database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_engine():
+    """Fresh in-memory database with the current schema."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    from backend import models  # noqa: F401  (register tables)
+    from backend.database import Base
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    from sqlalchemy.orm import sessionmaker
+
+    return sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def _clear_user_state_cache():
+    # The cache is process-wide; user IDs repeat across test databases
+    yield
+    from backend.user_state import user_state_cache
+    user_state_cache.clear()
+
+
+@pytest.fixture
+def api_client(tmp_path):
+    """TestClient on a file database shared by the sync and async sessions (no lifespan)."""
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from sqlalchemy.orm import sessionmaker
+
+    from backend import database
+    from backend.app import app
+
+    url = f"sqlite:///{tmp_path / 'api.db'}"
+    engine = database.make_engine(url)
+    async_engine = database.make_engine(url, is_async=True)
+    database.Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides = {
+        database.get_db: get_db,
+        database.get_read_db: get_db,
+        database.get_async_db: get_async_db,
+        database.get_async_read_db: get_async_db,
+    }
+    client = TestClient(app)
+    client.session_factory = SessionLocal
+    yield client
+    app.dependency_overrides = {}
+    engine.dispose()
@@ -0,0 +1,142 @@
+"""Activity heartbeats: in-memory coalescing and the dormant -> active path."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.activity import WELCOME_BACK_THRESHOLD_MINUTES, ActivityTracker
+from backend.background import PeriodicWorker
+from engagement_agent.timing_wheel import InactivityIndex
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+
+def test_periodic_worker_requires_flush():
+    class NoFlush(PeriodicWorker):
+        pass
+
+    with pytest.raises(TypeError):
+        NoFlush(1.0)
+
+
+@pytest.fixture
+def tracker(session_factory, db):
+    db.add(models.User(id=1, name="U1", email="u1@example.com", last_active_at=NOW, churn_risk_score=0.7))
+    db.commit()
+    tracker = ActivityTracker(session_factory)
+    tracker.seed(1, NOW)
+    return tracker
+
+
+def test_heartbeats_coalesce_into_one_write(db, tracker):
+    for seconds in (10, 20, 30):
+        assert tracker.heartbeat(1, NOW + timedelta(seconds=seconds))
+
+    assert db.get(models.User, 1).last_active_at == NOW  # Nothing written yet
+    assert tracker.stats()["pending"] == 1
+    assert tracker.flush() == 1
+
+    db.expire_all()
+    user = db.get(models.User, 1)
+    assert (user.last_active_at, user.churn_risk_score) == (NOW + timedelta(seconds=30), 0.0)
+    assert tracker.stats()["heartbeats_absorbed"] == 3
+    assert tracker.flush() == 0
+
+
+def test_flush_never_moves_activity_backwards(db, tracker):
+    tracker.heartbeat(1, NOW + timedelta(seconds=10))
+    # A synchronous /activity write lands first with a later time
+    db.get(models.User, 1).last_active_at = NOW + timedelta(minutes=1)
+    db.commit()
+
+    tracker.flush()
+
+    db.expire_all()
+    assert db.get(models.User, 1).last_active_at == NOW + timedelta(minutes=1)
+
+
+def test_dormant_return_takes_synchronous_path(tracker):
+    threshold = timedelta(minutes=WELCOME_BACK_THRESHOLD_MINUTES)
+
+    assert not tracker.heartbeat(1, NOW + threshold)
+    assert not tracker.heartbeat(2, NOW)  # Unknown user
+    assert tracker.stats()["pending"] == 0
+
+
+def test_observe_supersedes_pending_heartbeat(tracker):
+    tracker.heartbeat(1, NOW + timedelta(seconds=10))
+    tracker.observe(1, NOW + timedelta(seconds=20))
+
+    assert tracker.stats()["pending"] == 0
+    assert tracker.last_seen(1) == NOW + timedelta(seconds=20)
+
+
+def test_heartbeat_endpoint_welcomes_back_once(api_client, monkeypatch):
+    import backend.app
+
+    monkeypatch.setattr(backend.app, "activity_tracker", ActivityTracker(api_client.session_factory))
+    user_id = api_client.post("/users/", json={"name": "Dana", "email": "dana@example.com"}).json()["id"]
+    db = api_client.session_factory()
+    db.get(models.User, user_id).last_active_at = datetime.utcnow() - timedelta(minutes=30)
+    db.commit()
+
+    first = api_client.post(f"/users/{user_id}/heartbeat").json()
+    second = api_client.post(f"/users/{user_id}/heartbeat").json()
+
+    assert first["message_sent"] is not None
+    assert second["message_sent"] is None
+    welcome = db.query(models.MessageLog).filter(models.MessageLog.tone == "welcome_back").all()
+    assert [message.user_id for message in welcome] == [user_id]
+    assert api_client.post("/users/999/heartbeat").status_code == 404
+    db.close()
+
+
+class RecordingScheduler:
+    running = True
+
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule_many(self, user_ids, eligible_at):
+        self.scheduled.append((sorted(user_ids), eligible_at))
+
+
+def test_index_transitions_feed_scheduler_and_segment(db, session_factory):
+    db.add(models.User(id=1, name="U1", email="u1@example.com", created_at=NOW, last_active_at=NOW, segment="normal"))
+    db.commit()
+    scheduler = RecordingScheduler()
+    tracker = ActivityTracker(session_factory, scheduler=scheduler)
+    tracker.index = InactivityIndex(inactive_seconds=60, segment_thresholds_minutes=[30, 60], now=NOW)
+    tracker.seed(1, NOW)
+
+    later = NOW + timedelta(minutes=2)
+    tracker._expire(later)
+    # Inactive: due now, but no segment threshold crossed yet
+    assert scheduler.scheduled == [([1], later)]
+    assert tracker.stats()["segments_updated"] == 0
+
+    # Re-derived from the rules: 31 minutes old and active within the hour
+    tracker._expire(NOW + timedelta(minutes=31))
+    assert db.get(models.User, 1).segment == "loyal"
+    assert 1 in tracker.index.segments  # Queued for the next threshold
+
+    dormant_at = NOW + timedelta(minutes=61)
+    tracker._expire(dormant_at)
+    db.expire_all()
+    assert db.get(models.User, 1).segment == "dormant"
+    assert scheduler.scheduled[-1] == ([1], dormant_at)
+    assert tracker.stats()["segments_updated"] == 2
+    assert 1 not in tracker.index.segments
+
+
+def test_index_follows_rule_thresholds():
+    index = InactivityIndex(inactive_seconds=60, segment_thresholds_minutes=[10, 5], now=NOW)
+    index.record_activity(1, NOW)
+
+    assert index.tick(NOW + timedelta(minutes=4)) == {"inactive": [1], "segment": []}
+    assert index.tick(NOW + timedelta(minutes=6)) == {"inactive": [], "segment": [1]}
+    # Re-queued after the first threshold, it fires again at the next one
+    assert index.schedule_segment_change(1, NOW)
+    assert index.tick(NOW + timedelta(minutes=11))["segment"] == [1]
+    assert not index.schedule_segment_change(1, NOW)
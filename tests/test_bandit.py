@@ -0,0 +1,82 @@
+"""Template bandit: per-user reproducible draws, favours opened templates, frozen per cycle run."""
+
+import numpy as np
+
+from backend import models
+from backend.engagement_cycle import _run_bandit
+from backend.template_arms import bandit_from_snapshot, refresh_template_bandit, snapshot_arms, template_bandit
+from message_generation.bandit import TemplateBandit
+from message_generation.prompt_builder import ENGAGEMENT_TEMPLATES, allocate_messages
+from message_generation.variants import blocked_variants, push_history
+
+TONE = "playful"
+
+
+def _bandit(opened_template=None):
+    bandit = TemplateBandit()
+    bandit.load({
+        ("dormant", TONE, template_id): (1000, 500 if template_id == opened_template else 50)
+        for template_id in ENGAGEMENT_TEMPLATES.template_ids(TONE)
+    })
+    return bandit
+
+
+def _allocate(user_ids, bandit, cycle_id=42, histories=None):
+    histories = histories or [0] * len(user_ids)
+    names = [f"U{user_id}" for user_id in user_ids]
+    _, template_ids, _ = allocate_messages(TONE, user_ids, names, cycle_id, histories, bandit=bandit, segment="dormant")
+    return dict(zip(user_ids, template_ids))
+
+
+def test_variant_does_not_depend_on_the_batch():
+    bandit = _bandit()
+    user_ids = list(range(1, 201))
+
+    together = _allocate(user_ids, bandit)
+    prepended = _allocate([1000] + user_ids[4:], bandit)
+    alone = {user_id: _allocate([user_id], bandit)[user_id] for user_id in user_ids[:20]}
+
+    assert {user_id: prepended[user_id] for user_id in user_ids[4:]} == {user_id: together[user_id] for user_id in user_ids[4:]}
+    assert alone == {user_id: together[user_id] for user_id in user_ids[:20]}
+    # Untried arms are near uniform, so a batch spreads over the variants
+    assert len(set(together.values())) == len(ENGAGEMENT_TEMPLATES.template_ids(TONE))
+
+
+def test_opened_template_is_sent_most():
+    best = ENGAGEMENT_TEMPLATES.template_ids(TONE)[2]
+
+    chosen = list(_allocate(list(range(1, 2001)), _bandit(opened_template=best)).values())
+
+    assert chosen.count(best) > 0.95 * len(chosen)
+
+
+def test_recent_templates_are_never_chosen():
+    template_ids = ENGAGEMENT_TEMPLATES.template_ids(TONE)
+    best = template_ids[2]
+    history = push_history(push_history(0, best), template_ids[0])
+    user_ids = np.arange(1, 501)
+
+    choices = _bandit(opened_template=best).select_many(
+        "dormant", TONE, template_ids, blocked_variants([history] * len(user_ids), template_ids), user_ids, 7
+    )
+
+    assert not set(choices.tolist()) & {0, 2}
+
+
+def test_cycle_run_keeps_its_arm_counts(db):
+    run = models.EngagementCycleRun(status="running", last_user_id=0)
+    arm = models.TemplateArm(segment="dormant", tone=TONE, template_id=0, trials=10, successes=1)
+    db.add_all([run, arm])
+    db.commit()
+    refresh_template_bandit(db, force=True)
+
+    frozen = _run_bandit(db, run)
+    # The shared bandit refreshes while the run is paused; the run does not follow
+    arm.trials, arm.successes = 99, 90
+    db.commit()
+    refresh_template_bandit(db, force=True)
+    db.expire_all()
+    resumed = _run_bandit(db, db.get(models.EngagementCycleRun, run.id))
+
+    assert dict(frozen.arms) == dict(resumed.arms) == {("dormant", TONE, 0): (10, 1)}
+    assert dict(bandit_from_snapshot(snapshot_arms(template_bandit)).arms) == {("dormant", TONE, 0): (99, 90)}
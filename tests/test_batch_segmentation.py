@@ -0,0 +1,72 @@
+"""Batch segmentation and batch evaluation agree with the per-user path."""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from engagement_agent import (
+    EvaluationContext,
+    RuleSet,
+    determine_user_segment,
+    evaluate_user_for_engagement,
+    evaluate_users_for_engagement
+)
+from engagement_agent.batch_segmentation import segment_users
+from engagement_agent.rules import default_config
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+AT_RISK_RULES = {
+    "default": {"segment": "normal", "tone": "neutral"},
+    "rules": [
+        {"segment": "at_risk", "tone": "playful", "when": {"churn_risk_score": {">=": 0.7}, "minutes_inactive": {">": 5}}},
+        {"segment": "dormant", "tone": "playful", "when": {"minutes_inactive": {">=": 60}}},
+        {"segment": "new", "tone": "warm", "when": {"account_age_minutes": {"<": 5}}},
+        {"segment": "loyal", "tone": "warm", "when": {"account_age_minutes": {">=": 5}, "churn_risk_score": {"<": 0.3}}}
+    ]
+}
+
+
+def _population(size: int = 2000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    inactive = rng.integers(0, 120 * 60, size)
+    age = inactive + rng.integers(0, 30 * 60, size)
+    # Exact threshold boundaries for the first users
+    inactive[:4] = [0, 5 * 60, 60 * 60, 60 * 60 - 1]
+    age[:4] = [5 * 60, 5 * 60, 60 * 60, 60 * 60]
+    return [
+        SimpleNamespace(
+            id=index + 1,
+            name=f"U{index}",
+            created_at=NOW - timedelta(seconds=int(age[index])),
+            last_active_at=NOW - timedelta(seconds=int(inactive[index])),
+            churn_risk_score=round(float(rng.random()), 2) if index % 5 else None
+        )
+        for index in range(size)
+    ]
+
+
+def test_segment_users_matches_determine_user_segment():
+    users = _population()
+    rules = RuleSet(default_config())
+
+    segments, tones = segment_users(
+        [user.created_at for user in users], [user.last_active_at for user in users], NOW, rules=rules
+    )
+
+    expected = [determine_user_segment(user.created_at, user.last_active_at, NOW) for user in users]
+    assert [rules.segments[code] for code in segments] == expected
+    assert [rules.tones[code] for code in tones] == [rules.tone_for(segment) for segment in expected]
+
+
+@pytest.mark.parametrize("config", [default_config(), AT_RISK_RULES])
+def test_batch_evaluation_matches_per_user(config):
+    users = _population()
+    context = EvaluationContext.create(NOW, recent_message_times={2: NOW, 7: NOW}, rules=RuleSet(config))
+
+    batch = evaluate_users_for_engagement(users, None, context)
+
+    assert batch == [evaluate_user_for_engagement(user, None, context) for user in users]
+    assert len({evaluation["segment"] for evaluation in batch if evaluation["eligible"]}) > 1
@@ -0,0 +1,52 @@
+"""Incremental churn scoring: only users whose inputs changed since the last run are rescored."""
+
+from datetime import datetime, timedelta
+
+from backend import models
+from backend.churn import refresh_churn_scores
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+
+def _scored_at(db):
+    db.expire_all()
+    return {user.name: user.churn_scored_at for user in db.query(models.User)}
+
+
+def test_rescores_only_changed_users(db):
+    # Inactive for longer than the saturation window, so time alone changes nothing
+    long_ago = NOW - timedelta(days=2)
+    users = [
+        models.User(name=name, email=f"{name}@example.com", created_at=long_ago, last_active_at=long_ago)
+        for name in ("active", "messaged", "opened", "untouched")
+    ]
+    db.add_all(users)
+    db.flush()
+    message = models.MessageLog(user_id=users[2].id, type=models.MessageType.CLIENT_ENGAGEMENT_BRAND, sent_at=long_ago)
+    db.add(message)
+    db.commit()
+
+    assert refresh_churn_scores(db, now=NOW) == 4
+    assert refresh_churn_scores(db, now=NOW + timedelta(minutes=1)) == 0
+
+    later = NOW + timedelta(minutes=2)
+    users[0].last_active_at = later
+    db.add(models.MessageLog(user_id=users[1].id, type=models.MessageType.CLIENT_ENGAGEMENT_BRAND, sent_at=later))
+    message.opened, message.opened_at = True, later
+    db.add(models.User(name="new", email="new@example.com", created_at=later, last_active_at=later))
+    db.commit()
+
+    rescore_at = NOW + timedelta(minutes=3)
+    assert refresh_churn_scores(db, now=rescore_at) == 4
+    scored_at = _scored_at(db)
+    assert scored_at.pop("untouched") == NOW
+    assert set(scored_at.values()) == {rescore_at}
+
+
+def test_full_rescore_ignores_watermark(db):
+    db.add_all(models.User(name=f"U{i}", email=f"u{i}@example.com", last_active_at=NOW - timedelta(days=2)) for i in range(3))
+    db.commit()
+    refresh_churn_scores(db, now=NOW)
+
+    assert refresh_churn_scores(db, now=NOW + timedelta(minutes=1)) == 0
+    assert refresh_churn_scores(db, now=NOW + timedelta(minutes=1), full=True) == 3
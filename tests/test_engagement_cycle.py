@@ -0,0 +1,65 @@
+"""Engagement cycle runs: only runs nobody is executing are resumed."""
+
+from datetime import datetime, timedelta
+
+from backend import models
+from backend.engagement_cycle import ENGAGEMENT_RUN_STALE_SECONDS, _get_or_start_run, run_engagement_cycle
+
+
+def _add_run(db, status, heartbeat_at, last_user_id=10):
+    run = models.EngagementCycleRun(status=status, last_user_id=last_user_id, heartbeat_at=heartbeat_at)
+    db.add(run)
+    db.commit()
+    return run.id
+
+
+def test_running_run_is_not_resumed(db):
+    running_id = _add_run(db, "running", datetime.utcnow())
+
+    run = _get_or_start_run(db, resume=True)
+
+    assert run.id != running_id
+    assert run.last_user_id == 0
+
+
+def test_failed_run_is_resumed_once(session_factory):
+    setup = session_factory()
+    failed_id = _add_run(setup, "failed", datetime.utcnow() - timedelta(seconds=5))
+    setup.close()
+
+    first, second = session_factory(), session_factory()
+    claimed = _get_or_start_run(first, resume=True)
+    # The run is now claimed and fresh; a concurrent caller starts its own run
+    other = _get_or_start_run(second, resume=True)
+
+    assert (claimed.id, claimed.status, claimed.last_user_id) == (failed_id, "running", 10)
+    assert other.id != failed_id and other.last_user_id == 0
+    first.close()
+    second.close()
+
+
+def test_stale_running_run_is_resumed(db):
+    stale = datetime.utcnow() - timedelta(seconds=ENGAGEMENT_RUN_STALE_SECONDS + 60)
+    stale_id = _add_run(db, "running", stale)
+    legacy_id = _add_run(db, "running", None, last_user_id=3)
+
+    # Latest resumable run first; a run from before heartbeats counts as stale
+    assert _get_or_start_run(db, resume=True).id == legacy_id
+    assert _get_or_start_run(db, resume=True).id == stale_id
+
+
+def test_resume_false_always_starts_new_run(db):
+    failed_id = _add_run(db, "failed", None)
+    assert _get_or_start_run(db, resume=False).id != failed_id
+
+
+def test_cycle_completes_and_records_heartbeat(db):
+    db.add_all(models.User(name=f"U{i}", email=f"u{i}@example.com") for i in range(5))
+    db.commit()
+
+    result = run_engagement_cycle(db, chunk_size=2, resume=True)
+
+    run = db.get(models.EngagementCycleRun, result["run_id"])
+    assert run.status == "completed"
+    assert run.heartbeat_at is not None
+    assert result["total_users"] == 5
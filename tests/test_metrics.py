@@ -0,0 +1,77 @@
+"""MetricsAccumulator gives the same metrics as EngagementMetrics on the full frame."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from analytics.metrics import EngagementMetrics, MetricsAccumulator
+
+
+def _history(rows: int = 5000, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    opened = rng.random(rows) < 0.4
+    return pd.DataFrame({
+        "message_type": rng.choice(["flirty", "utility", "reminder"], rows),
+        "segment": rng.choice(["active", "dormant", "new"], rows),
+        "sent": np.ones(rows, dtype=np.int64),
+        "opened": opened.astype(np.int64),
+        "clicked": (opened & (rng.random(rows) < 0.3)).astype(np.int64),
+        "reactivated": (rng.random(rows) < 0.1).astype(np.int64)
+    })
+
+
+def _chunks(df: pd.DataFrame, size: int):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+def _sorted(frame: pd.DataFrame) -> pd.DataFrame:
+    return frame.sort_index()
+
+
+@pytest.mark.parametrize("group_keys", [("message_type",), ("message_type", "segment")])
+@pytest.mark.parametrize("chunk_size", [1, 333, 5000])
+def test_chunked_matches_in_memory(group_keys, chunk_size):
+    df = _history(rows=1000 if chunk_size == 1 else 5000)
+    expected = EngagementMetrics(df)
+
+    accumulator = MetricsAccumulator.from_chunks(_chunks(df, chunk_size), group_keys)
+    actual = accumulator.metrics()
+
+    assert accumulator.rows == len(df)
+    assert actual.overall_summary() == expected.overall_summary()
+    assert_frame_equal(_sorted(actual.metrics_by(*group_keys)), _sorted(expected.metrics_by(*group_keys)))
+
+
+def test_merge_matches_in_memory():
+    df = _history()
+    left = MetricsAccumulator.from_chunks(_chunks(df.iloc[:2000], 500))
+    right = MetricsAccumulator.from_chunks(_chunks(df.iloc[2000:], 700))
+
+    merged = left.merge(right)
+
+    assert merged.rows == len(df)
+    assert merged.metrics().metrics_by_message_type() == EngagementMetrics(df).metrics_by_message_type()
+
+
+def test_process_pool_matches_in_memory():
+    df = _history()
+    accumulator = MetricsAccumulator.from_chunks(_chunks(df, 400), max_workers=2)
+
+    assert accumulator.metrics().metrics_by_message_type() == EngagementMetrics(df).metrics_by_message_type()
+
+
+def test_group_missing_from_some_chunks():
+    df = _history(rows=600)
+    # Only the last chunk has "reminder" rows
+    df = pd.concat([df[df.message_type != "reminder"], df[df.message_type == "reminder"]])
+
+    accumulator = MetricsAccumulator.from_chunks(_chunks(df, 100))
+
+    assert accumulator.metrics().metrics_by_message_type() == EngagementMetrics(df).metrics_by_message_type()
+
+
+def test_empty_stream():
+    summary = MetricsAccumulator.from_chunks([]).metrics().overall_summary()
+    assert summary == {"open_rate": 0, "ctr": 0, "reactivation_rate": 0}
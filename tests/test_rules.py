@@ -0,0 +1,72 @@
+"""RuleSet: missing values never satisfy a condition, and classify agrees with classify_arrays."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from engagement_agent.batch_segmentation import segment_codes
+from engagement_agent.rules import FEATURES, OPERATORS, RuleSet
+
+
+def _rule_set(symbol: str, threshold: float = 0.5) -> RuleSet:
+    return RuleSet({
+        "default": {"segment": "normal", "tone": "neutral"},
+        "rules": [{"segment": "flagged", "tone": "playful", "when": {"churn_risk_score": {symbol: threshold}}}]
+    })
+
+
+@pytest.mark.parametrize("symbol", sorted(OPERATORS))
+def test_nan_never_matches(symbol):
+    rules = _rule_set(symbol)
+    scores = np.array([np.nan, 0.2, 0.5, 0.9])
+
+    codes = rules.classify_arrays({"churn_risk_score": scores})
+
+    assert [rules.segments[code] for code in codes] == [rules.classify({"churn_risk_score": score}) for score in scores]
+    assert rules.classify({"churn_risk_score": np.nan}) == "normal"
+    assert rules.classify({"churn_risk_score": None}) == "normal"
+
+
+def test_scalar_and_array_paths_agree():
+    rng = np.random.default_rng(0)
+    symbols = sorted(OPERATORS)
+    config = {
+        "default": {"segment": "normal", "tone": "neutral"},
+        "rules": [
+            {
+                "segment": f"s{index}",
+                "tone": "playful",
+                "when": {
+                    feature: {symbols[rng.integers(len(symbols))]: float(rng.integers(0, 4))}
+                    for feature in rng.choice(FEATURES, rng.integers(1, 3), replace=False)
+                }
+            }
+            for index in range(60)
+        ]
+    }
+    rules = RuleSet(config)
+    # Small integers so "==" / "!=" conditions hit; NaN in every feature
+    features = {feature: rng.integers(0, 4, 5000).astype(float) for feature in FEATURES}
+    for values in features.values():
+        values[rng.random(5000) < 0.1] = np.nan
+
+    codes = rules.classify_arrays(features)
+
+    scalar = [rules.classify({feature: values[i] for feature, values in features.items()}) for i in range(5000)]
+    assert [rules.segments[code] for code in codes] == scalar
+    assert len(set(scalar)) > 5
+
+
+def test_nat_never_matches_not_equal():
+    rules = RuleSet({
+        "default": {"segment": "normal", "tone": "neutral"},
+        "rules": [{"segment": "flagged", "tone": "playful", "when": {"minutes_inactive": {"!=": 0}}}]
+    })
+    now = datetime(2024, 1, 1, 12, 0)
+    created_at = [now - timedelta(days=1)] * 3
+    last_active_at = np.array([now, now - timedelta(minutes=5), "NaT"], dtype="datetime64[us]")
+
+    codes = segment_codes(created_at, last_active_at, now=now, rules=rules)
+
+    assert [rules.segments[code] for code in codes] == ["normal", "flagged", "normal"]
@@ -0,0 +1,106 @@
+"""Engagement scheduler: due users are engaged, reactivated users re-queued, failed batches retried."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.scheduler import EngagementScheduler
+
+
+def _add_user(db, name, minutes_inactive):
+    now = datetime.utcnow()
+    user = models.User(
+        name=name,
+        email=f"{name.lower()}@example.com",
+        created_at=now - timedelta(days=30),
+        last_active_at=now - timedelta(minutes=minutes_inactive)
+    )
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def _scheduler(session_factory):
+    return EngagementScheduler(session_factory, enabled=True, tick_interval_ms=1000, batch_size=2)
+
+
+def test_due_users_are_engaged_and_requeued(db, session_factory):
+    due_ids = [_add_user(db, f"Due{i}", 120) for i in range(3)]
+    active_id = _add_user(db, "Active", 0)
+    scheduler = _scheduler(session_factory)
+
+    assert scheduler.load() == 4
+    assert scheduler.flush() == 3
+
+    sent = {row.user_id for row in db.query(models.MessageLog)}
+    assert sent == set(due_ids)
+    # Everyone stays scheduled; the messaged users wait out the frequency limit
+    assert scheduler.stats()["queued"] == 4
+    assert scheduler.stats()["messages_sent"] == 3
+    assert all(eligible_at > datetime.utcnow() for eligible_at in scheduler._deadlines.values())
+    assert active_id not in sent
+
+
+def test_new_users_are_discovered_on_later_ticks(db, session_factory):
+    _add_user(db, "First", 0)
+    scheduler = _scheduler(session_factory)
+    scheduler.load()
+
+    new_id = _add_user(db, "Later", 120)
+
+    assert scheduler.flush() == 1
+    assert db.query(models.MessageLog.user_id).scalar() == new_id
+    assert scheduler.stats()["queued"] == 2
+
+
+def test_user_active_since_queued_is_rescheduled(db, session_factory):
+    user_id = _add_user(db, "Back", 120)
+    scheduler = _scheduler(session_factory)
+    scheduler.load()
+
+    db.query(models.User).filter(models.User.id == user_id).update({"last_active_at": datetime.utcnow()})
+    db.commit()
+
+    assert scheduler.flush() == 0
+    assert db.query(models.MessageLog).count() == 0
+    assert scheduler.stats()["rescheduled"] == 1
+    assert scheduler._deadlines[user_id] > datetime.utcnow()
+
+
+def test_failed_batch_is_rolled_back_and_retried(db, session_factory, monkeypatch):
+    user_ids = [_add_user(db, f"Due{i}", 120) for i in range(4)]
+    scheduler = _scheduler(session_factory)
+    scheduler.load()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr("backend.scheduler.engage_users", fail)
+    started = datetime.utcnow()
+    with pytest.raises(RuntimeError):
+        scheduler.flush()
+
+    # Nothing was sent, and every popped user (failed batch and the rest) is back
+    assert db.query(models.MessageLog).count() == 0
+    assert sorted(scheduler._deadlines) == user_ids
+    assert all(eligible_at > started for eligible_at in scheduler._deadlines.values())
+
+    monkeypatch.undo()
+    assert scheduler.flush() == 0
+    # Retried on the next tick once the retry delay has passed
+    scheduler.schedule_many(user_ids, started)
+    assert scheduler.flush() == 4
+
+
+def test_rescheduling_supersedes_the_queued_deadline(db, session_factory):
+    user_id = _add_user(db, "Due", 120)
+    scheduler = _scheduler(session_factory)
+    scheduler.load()
+
+    # Pushed out, then pulled back in: only the latest deadline counts
+    scheduler.schedule(user_id, datetime.utcnow() + timedelta(hours=1))
+    assert scheduler.flush() == 0
+    scheduler.schedule(user_id, datetime.utcnow() - timedelta(seconds=1))
+    assert scheduler.stats()["queued"] == 1
+    assert scheduler.flush() == 1
@@ -0,0 +1,62 @@
+"""CompiledTemplate / TemplateLibrary must render exactly like str.format."""
+
+import random
+
+import pytest
+
+from message_generation.template_engine import CompiledTemplate, TemplateLibrary
+
+CONTEXT = {"name": "Ada", "amount": 1234.5, "date": "2024-01-31", "count": 7}
+
+TEMPLATES = [
+    "Hi {name}!",
+    "{name}",
+    "No placeholders at all",
+    "",
+    "50% off {{today}}!",
+    "{{literal}} then {name}",
+    "{name} then {{literal}}",
+    "{{ {name} }}",
+    "}}{{",
+    "Pay ₹{amount:,.2f} by {date}",
+    "{count:>5}|{count:<5}|{count:05d}",
+    "{name!r} / {name!s} / {name!a}",
+    "{name!r:>12}",
+    "{name}{name}{count}",
+]
+
+
+@pytest.mark.parametrize("text", TEMPLATES)
+def test_render_matches_str_format(text):
+    assert CompiledTemplate(text).render(CONTEXT) == text.format(**CONTEXT)
+
+
+@pytest.mark.parametrize("text", [text for text in TEMPLATES if CompiledTemplate(text).fields <= {"name"}])
+def test_render_values_matches_str_format(text):
+    names = ["Ada", "Grace", "Émile"]
+    expected = [text.format(name=name) for name in names]
+    assert CompiledTemplate(text).render_values("name", names) == expected
+
+
+def test_fields_and_missing():
+    template = CompiledTemplate("{{escaped}} {name} {date:%Y}")
+    assert template.fields == {"name", "date"}
+    assert template.missing({"name": "x"}) == {"date"}
+
+
+@pytest.mark.parametrize("text", ["{0}", "{user.name}", "{items[0]}", "{name:{width}}"])
+def test_unsupported_placeholders_rejected(text):
+    with pytest.raises(ValueError):
+        CompiledTemplate(text)
+
+
+def test_library_render_many_matches_str_format():
+    texts = {"a": ["{{x}} {name}", "Hey {name}!", "static {{}}"]}
+    library = TemplateLibrary(texts, allowed_fields={"name"})
+    names = [f"user{i}" for i in range(50)]
+
+    rng = random.Random(42)
+    choices = random.Random(42).choices(range(3), k=len(names))
+    assert library.render_many("a", names, rng=rng) == [
+        texts["a"][choice].format(name=name) for choice, name in zip(choices, names)
+    ]
@@ -0,0 +1,252 @@
+"""Open/click tracking: set-based apply, broadcast deliveries and the write-behind buffer."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.rollups import rebuild_rollups
+from backend.tracking import InteractionBuffer, InteractionEvent, _encode_event, apply_interactions
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+
+def _rollup_counts(db, message_type):
+    rows = db.query(models.EngagementRollup).filter(models.EngagementRollup.message_type == message_type.value)
+    return sum(row.opened for row in rows), sum(row.clicked for row in rows)
+
+
+def _snapshot(db):
+    return sorted(
+        (row.day, row.message_type, row.tone, row.segment, row.sent, row.opened, row.clicked, row.reactivated)
+        for row in db.query(models.EngagementRollup)
+    )
+
+
+@pytest.fixture
+def users(db):
+    db.add_all(models.User(id=user_id, name=f"U{user_id}", email=f"u{user_id}@example.com") for user_id in (1, 2, 3))
+    db.commit()
+
+
+@pytest.fixture
+def broadcast(db, users):
+    """A broadcast job delivered to users 1 and 2, counted in the rollups."""
+    from backend.rollups import record_broadcast_sent
+
+    job = models.BroadcastJob(broadcast_type="system_update", content="Update", created_at=NOW, recipient_count=2)
+    db.add(job)
+    db.flush()
+    db.add_all(models.BroadcastDelivery(job_id=job.id, user_id=user_id) for user_id in (1, 2))
+    record_broadcast_sent(db, job)
+    db.commit()
+    return job.id
+
+
+def test_broadcast_delivery_open_and_click(db, broadcast):
+    open_event = InteractionEvent(None, "open", NOW + timedelta(minutes=1), broadcast, 1)
+    click_event = InteractionEvent(None, "click", NOW + timedelta(minutes=2), broadcast, 2)
+
+    results = apply_interactions(db, [open_event, click_event])
+    db.commit()
+
+    assert results == ["tracked", "tracked"]
+    first = db.get(models.BroadcastDelivery, (broadcast, 1))
+    second = db.get(models.BroadcastDelivery, (broadcast, 2))
+    assert (first.opened, first.clicked) == (True, False)
+    # A click implies an open
+    assert (second.opened, second.clicked) == (True, True)
+    assert _rollup_counts(db, models.MessageType.USER_UTILITY_SYSTEM) == (2, 1)
+
+
+def test_broadcast_delivery_repeats_are_idempotent(db, broadcast):
+    event = InteractionEvent(None, "click", NOW, broadcast, 1)
+    apply_interactions(db, [event])
+    db.commit()
+
+    assert apply_interactions(db, [event]) == ["duplicate"]
+    db.commit()
+    assert _rollup_counts(db, models.MessageType.USER_UTILITY_SYSTEM) == (1, 1)
+
+
+def test_unknown_delivery_not_found(db, broadcast):
+    events = [
+        InteractionEvent(None, "open", NOW, broadcast, 3),  # Not a recipient
+        InteractionEvent(None, "open", NOW, broadcast + 1, 1)  # No such job
+    ]
+    assert apply_interactions(db, events) == ["not_found", "not_found"]
+
+
+def test_rebuild_matches_incremental_rollups(db, broadcast):
+    db.add(models.MessageLog(
+        id=10, user_id=3, type=models.MessageType.CLIENT_ENGAGEMENT_BRAND, content="Hi", sent_at=NOW
+    ))
+    from backend.rollups import record_messages_sent
+    record_messages_sent(db, [{"sent_at": NOW, "type": models.MessageType.CLIENT_ENGAGEMENT_BRAND}])
+    apply_interactions(db, [
+        InteractionEvent(10, "click", NOW),
+        InteractionEvent(None, "open", NOW, broadcast, 1),
+        InteractionEvent(None, "click", NOW, broadcast, 2)
+    ])
+    db.commit()
+
+    incremental = _snapshot(db)
+    rebuild_rollups(db)
+    db.commit()
+    assert _snapshot(db) == incremental
+
+
+# ---------------------------------------------------
+# Write-behind buffer
+# ---------------------------------------------------
+
+@pytest.fixture
+def message(db, users):
+    from backend.rollups import record_messages_sent
+
+    db.add(models.MessageLog(id=10, user_id=1, type=models.MessageType.CLIENT_ENGAGEMENT_BRAND, content="Hi", sent_at=NOW))
+    record_messages_sent(db, [{"sent_at": NOW, "type": models.MessageType.CLIENT_ENGAGEMENT_BRAND}])
+    db.commit()
+    return 10
+
+
+def _buffer(session_factory, tmp_path, durability="log"):
+    return InteractionBuffer(
+        session_factory, durability=durability, flush_interval_ms=60_000, log_path=str(tmp_path / "events.log")
+    )
+
+
+def _opened(db, message_id):
+    db.expire_all()
+    row = db.get(models.MessageLog, message_id)
+    return row.opened, row.opened_at, row.clicked
+
+
+def test_submit_without_flusher_applies_synchronously(db, session_factory, tmp_path, message):
+    buffer = _buffer(session_factory, tmp_path)
+
+    buffer.submit(InteractionEvent(message, "click", NOW))
+
+    assert _opened(db, message) == (True, NOW, True)
+    assert buffer.stats()["pending"] == 0
+    assert not (tmp_path / "events.log").exists()
+
+
+def test_log_replayed_on_start(db, session_factory, tmp_path, message):
+    log = tmp_path / "events.log"
+    log.write_text(
+        _encode_event(InteractionEvent(message, "open", NOW + timedelta(minutes=1)))
+        + _encode_event(InteractionEvent(message, "click", NOW + timedelta(minutes=2)))
+        + '[10, "cli'  # Torn last line from a crash
+    )
+    buffer = _buffer(session_factory, tmp_path)
+
+    buffer.start()
+    buffer.stop()
+
+    assert _opened(db, message) == (True, NOW + timedelta(minutes=1), True)
+    assert log.read_text() == ""
+    assert _rollup_counts(db, models.MessageType.CLIENT_ENGAGEMENT_BRAND) == (1, 1)
+
+
+def test_replaying_applied_events_is_idempotent(db, session_factory, tmp_path, message):
+    event = InteractionEvent(message, "open", NOW)
+    apply_interactions(db, [event])
+    db.commit()
+    # Crash after the flush committed but before the log was truncated
+    (tmp_path / "events.log").write_text(_encode_event(InteractionEvent(message, "open", NOW + timedelta(hours=1))))
+
+    buffer = _buffer(session_factory, tmp_path)
+    buffer.start()
+    buffer.stop()
+
+    assert _opened(db, message) == (True, NOW, False)
+    assert _rollup_counts(db, models.MessageType.CLIENT_ENGAGEMENT_BRAND) == (1, 0)
+
+
+def test_buffered_repeats_coalesce(db, session_factory, tmp_path, message, broadcast):
+    buffer = _buffer(session_factory, tmp_path, durability="memory")
+    buffer.start()
+    for minute in range(3):
+        buffer.submit(InteractionEvent(message, "open", NOW + timedelta(minutes=minute)))
+        buffer.submit(InteractionEvent(None, "open", NOW + timedelta(minutes=minute), broadcast, 1))
+    assert buffer.stats()["pending"] == 6
+    buffer.stop()
+
+    assert buffer.stats() == {"pending": 0, "received": 6, "flushed": 6, "flushes": 1}
+    assert _opened(db, message) == (True, NOW, False)
+    assert _rollup_counts(db, models.MessageType.CLIENT_ENGAGEMENT_BRAND) == (1, 0)
+    assert _rollup_counts(db, models.MessageType.USER_UTILITY_SYSTEM) == (1, 0)
+
+
+def test_delivery_events_round_trip_through_log(session_factory, tmp_path):
+    event = InteractionEvent(None, "click", NOW, 3, 7)
+    (tmp_path / "events.log").write_text(_encode_event(event))
+
+    assert _buffer(session_factory, tmp_path)._read_log() == [event]
+
+
+# ---------------------------------------------------
+# Per-event outcomes (batch tracking)
+# ---------------------------------------------------
+
+def test_each_event_reports_its_own_action(db, message):
+    apply_interactions(db, [InteractionEvent(message, "open", NOW)])
+    db.commit()
+
+    # The open repeats an earlier one; only the click changes the row
+    outcomes = apply_interactions(db, [
+        InteractionEvent(message, "open", NOW + timedelta(minutes=1)),
+        InteractionEvent(message, "click", NOW + timedelta(minutes=2))
+    ])
+    assert outcomes == ["duplicate", "tracked"]
+
+
+def test_repeats_in_one_batch_credit_the_earliest_event(db, message):
+    outcomes = apply_interactions(db, [
+        InteractionEvent(message, "open", NOW + timedelta(minutes=5)),
+        InteractionEvent(message, "open", NOW + timedelta(minutes=1)),
+        InteractionEvent(message, "open", NOW + timedelta(minutes=1))
+    ])
+    assert outcomes == ["duplicate", "tracked", "duplicate"]
+    assert _opened(db, message) == (True, NOW + timedelta(minutes=1), False)
+
+
+def test_click_that_opens_first_takes_both_transitions(db, message):
+    outcomes = apply_interactions(db, [
+        InteractionEvent(message, "open", NOW + timedelta(minutes=3)),
+        InteractionEvent(message, "click", NOW + timedelta(minutes=2))
+    ])
+    assert outcomes == ["duplicate", "tracked"]
+    assert _opened(db, message) == (True, NOW + timedelta(minutes=2), True)
+
+
+def test_invalid_and_missing_events(db, message, broadcast):
+    outcomes = apply_interactions(db, [
+        InteractionEvent(message, "share", NOW),
+        InteractionEvent(None, "open", NOW),
+        InteractionEvent(None, "open", NOW, broadcast, None),
+        InteractionEvent(999, "open", NOW),
+        InteractionEvent(message, "open", NOW)
+    ])
+    assert outcomes == ["invalid", "invalid", "invalid", "not_found", "tracked"]
+
+
+def test_batch_endpoint_results(api_client):
+    db = api_client.session_factory()
+    db.add(models.User(id=1, name="U1", email="u1@example.com"))
+    db.add(models.MessageLog(id=10, user_id=1, type=models.MessageType.CLIENT_ENGAGEMENT_BRAND, content="Hi", sent_at=NOW, opened=True))
+    db.commit()
+    db.close()
+
+    response = api_client.post("/analytics/track/batch", json={"events": [
+        {"message_id": 10, "action": "open"},
+        {"message_id": 10, "action": "click"},
+        {"message_id": 10, "action": "click"},
+        {"message_id": 11, "action": "open"},
+        {"message_id": 10, "action": "share"},
+        {"action": "open"}
+    ]})
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "tracked", "received": 6, "tracked": 1, "results": [0, 1, 0, -1, -2, -2]}
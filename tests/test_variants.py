@@ -0,0 +1,63 @@
+"""choose_variants (NumPy) agrees with choose_variant and skips recent templates."""
+
+import numpy as np
+import pytest
+
+from message_generation.variants import (
+    MAX_TEMPLATE_ID, TEMPLATE_HISTORY_SIZE, choose_variant, choose_variants, history_ids, push_history
+)
+
+
+def _random_histories(rng, users: int, template_ids) -> list:
+    histories = []
+    for _ in range(users):
+        history = 0
+        # Mix this family's templates with other families' and partly filled rings
+        for _ in range(rng.integers(0, TEMPLATE_HISTORY_SIZE + 2)):
+            if rng.random() < 0.8:
+                template_id = int(rng.choice(template_ids))
+            else:
+                template_id = int(rng.integers(0, MAX_TEMPLATE_ID + 1))
+            history = push_history(history, template_id)
+        histories.append(history)
+    return histories
+
+
+@pytest.mark.parametrize("variant_count", [1, 2, 3, 4, 7])
+@pytest.mark.parametrize("cycle_id", [0, 1, 12345, 2**32 + 5])
+def test_vectorized_matches_scalar(variant_count, cycle_id):
+    rng = np.random.default_rng(variant_count * 1000 + cycle_id % 1000)
+    first = int(rng.integers(0, MAX_TEMPLATE_ID - variant_count))
+    variant_ids = list(range(first, first + variant_count))
+
+    user_ids = rng.integers(1, 2**40, size=500).tolist() + [1, 2**32 - 1, 2**32]
+    histories = _random_histories(rng, len(user_ids), variant_ids)
+
+    expected = [
+        choose_variant(user_id, cycle_id, variant_ids, history)
+        for user_id, history in zip(user_ids, histories)
+    ]
+    assert choose_variants(user_ids, cycle_id, variant_ids, histories).tolist() == expected
+
+
+@pytest.mark.parametrize("variant_count", [2, 3, 4, 7])
+def test_recent_variants_excluded(variant_count):
+    rng = np.random.default_rng(variant_count)
+    variant_ids = list(range(40, 40 + variant_count))
+    user_ids = list(range(1, 301))
+    histories = _random_histories(rng, len(user_ids), variant_ids)
+
+    choices = choose_variants(user_ids, 99, variant_ids, histories)
+
+    for history, index in zip(histories, choices.tolist()):
+        # At least one variant always stays available
+        recent = history_ids(history)[:min(TEMPLATE_HISTORY_SIZE, variant_count - 1)]
+        assert variant_ids[index] not in recent
+
+
+def test_empty_history_is_deterministic():
+    user_ids = list(range(1, 101))
+    first = choose_variants(user_ids, 7, [10, 11, 12], [0] * len(user_ids))
+    again = choose_variants(user_ids, 7, [10, 11, 12], [0] * len(user_ids))
+    assert first.tolist() == again.tolist()
+    assert set(first.tolist()) == {0, 1, 2}
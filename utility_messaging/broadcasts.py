@@ -12,6 +12,8 @@ Features:
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from message_generation.template_engine import CompiledTemplate
+
 # ---------------------------------------------------
 # Broadcast Template Library
 # ---------------------------------------------------
@@ -41,6 +43,12 @@ BROADCAST_TEMPLATES = {
     }
 }
 
+# Parsed once; `fields` lists the context_data keys each broadcast needs
+COMPILED_BROADCAST_TEMPLATES = {
+    broadcast_type: CompiledTemplate(config["template"])
+    for broadcast_type, config in BROADCAST_TEMPLATES.items()
+}
+
 
 # ---------------------------------------------------
 # Channel Selector
@@ -62,14 +70,14 @@ def generate_broadcast_message(broadcast_type: str, context_data: Dict = None) -
     if not config:
         return None
 
-    try:
-        if context_data:
-            message = config["template"].format(**context_data)
-        else:
-            message = config["template"]
-    except KeyError as e:
-        # Handles case where template expects data but none provided
-        return None
+    template = COMPILED_BROADCAST_TEMPLATES[broadcast_type]
+    if context_data:
+        # Template expects data that was not provided
+        if template.missing(context_data):
+            return None
+        message = template.render(context_data)
+    else:
+        message = template.text
 
     return {
         "message": message,
@@ -110,18 +118,26 @@ def create_broadcast_payloads(users: List, broadcast_type: str, context_data: Di
         if getattr(user, "broadcast_opt_out", False):
             continue
 
-        payloads.append({
-            "user_id": user.id, # Using .id to match our SQLAlchemy model
-            "category": "utility",
-            "type": broadcast_type,
-            "channel": channel,
-            "priority": broadcast_data["priority"],
-            "message": broadcast_data["message"],
-            "status": "pending",
-            "created_at": datetime.now(),
-            "metadata": {
-                "source": "broadcast_engine"
-            }
-        })
+        payloads.append(build_broadcast_payload(user.id, broadcast_type, broadcast_data, channel))
 
     return payloads
+
+
+def build_broadcast_payload(user_id: int, broadcast_type: str, broadcast_data: Dict, channel: str) -> Dict:
+    """
+    Builds the dispatch payload for a single recipient of an already-rendered broadcast.
+    """
+    return {
+        "user_id": user_id, # Using .id to match our SQLAlchemy model
+        "category": "utility",
+        "type": broadcast_type,
+        "channel": channel,
+        "priority": broadcast_data["priority"],
+        "message": broadcast_data["message"],
+        "status": "pending",
+        "created_at": datetime.now(),
+        "metadata": {
+            "source": "broadcast_engine"
+        }
+    }
+
@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 from typing import Dict, Optional
 
+from message_generation.template_engine import CompiledTemplate
+
 # ---------------------------------------------------
 # Reminder Configuration
 # ---------------------------------------------------
@@ -28,6 +30,12 @@ REMINDER_TEMPLATES = {
     }
 }
 
+# Parsed once; `fields` lists the context_data keys each reminder needs
+COMPILED_REMINDER_TEMPLATES = {
+    reminder_type: CompiledTemplate(config["template"])
+    for reminder_type, config in REMINDER_TEMPLATES.items()
+}
+
 
 # ---------------------------------------------------
 # Eligibility Check
@@ -84,12 +92,14 @@ def generate_reminder_message(reminder_type: str, context_data: Dict) -> Optiona
     if not config:
         return None
 
-    try:
-        message = config["template"].format(**context_data)
-    except KeyError as e:
-        print(f"Missing data for template: {e}")
+    template = COMPILED_REMINDER_TEMPLATES[reminder_type]
+    missing = template.missing(context_data)
+    if missing:
+        print(f"Missing data for template: {', '.join(sorted(missing))}")
         return None
 
+    message = template.render(context_data)
+
     return {
         "message": message,
         "priority": config["priority"],